@@ -1,79 +1,436 @@
 import os.path
+import math
 import time
+import functools
+import itertools
+import heapq
+import hashlib
+import random
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import pandas as pd
-from datetime import datetime
+from datetime import date
 from tqdm import tqdm
+from manifest import Manifest
+from checkpoint import Checkpoint
+from schema import prune_records, compact_frame, concat_frames
+from decoder import loads, records_to_frame
+from metrics import RunMetrics
+from single_flight import SingleFlight
+from sinks import CsvSink, ShardedCsvSink, ParquetSink, open_sink
+from category_tree import leaf_paths, aggregate_tree
+from date_windows import date_windows, day_label, period_label
 import warnings
 warnings.filterwarnings('ignore')
 
+# response statuses which are retried with backoff
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# page keys of revenue band b of a window start from b * BAND_ROWS (see requ_Mpstats._plan_bands)
+BAND_ROWS = 10 ** 9
+
 def progress_bar(func):
-    """Function for progress bar"""
+    """
+        Decorator for requ_Mpstats methods: shows tqdm bar of loaded pages or items while the method runs. The bar
+        is driven by progress notifications of the instance, the method is called once.
+    """
 
-    def wrapper(*args, **kwargs):
-        with tqdm(total=100) as pbar:
-            for i in range(100):
-                pbar.update(1)
-                result = func(*args, **kwargs)
-        return result
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        previous = self.progress
+        with tqdm() as pbar:
+            def update(info):
+                pbar.total = info['total']
+                pbar.n = info['done']
+                if 'rows' in info:
+                    pbar.set_postfix(rows=info['rows'], refresh=False)
+                pbar.refresh()
+                if previous is not None:
+                    previous(info)
+
+            self.progress = update
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                self.progress = previous
 
     return wrapper
 
 
+class LoadCancelled(Exception):
+    """Raised inside running load after requ_Mpstats.cancel()"""
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiter, can be shared between several requ_Mpstats instances"""
+
+    def __init__(self, rate=1.0, capacity=1, budget=None):
+        """
+            Args:
+                rate (float): tokens added per second. 0 or None means no rate limit.
+                capacity (int): maximal number of tokens (burst size).
+                budget (int): total number of requests allowed (remaining API quota). None means unlimited.
+        """
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.budget = budget
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """
+            Try to take one token without waiting.
+            Raises RuntimeError if the API quota budget is exhausted.
+
+            Returns:
+                pause (float): 0 if token is taken, else seconds to wait before the next try.
+        """
+        with self._lock:
+            if self.budget is not None and self.budget <= 0:
+                raise RuntimeError('Mpstats API quota is exhausted')
+            if not self.rate:
+                pause = 0
+            else:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                pause = (1 - self.tokens) / self.rate
+            if pause <= 0:
+                self.tokens -= 1
+                if self.budget is not None:
+                    self.budget -= 1
+                return 0
+            return pause
+
+    def acquire(self):
+        """Take one token, waiting until it is available"""
+        pause = self.take()
+        while pause > 0:
+            time.sleep(pause)
+            pause = self.take()
+
+    async def acquire_async(self):
+        """Take one token, waiting in event loop until it is available"""
+        pause = self.take()
+        while pause > 0:
+            await asyncio.sleep(pause)
+            pause = self.take()
+
+
 class requ_Mpstats:
     """Main class for loading data from Mpstats api"""
 
-    def __init__(self, request='wb'):
+    def __init__(self, request='wb', max_workers=1, rate_limit=1.0, limiter=None, retries=5, backoff=1.0,
+                 timeout=60, pool_size=10, cache=None, compact=False, metrics=None, single_flight=None):
         self.url = 'https://mpstats.io/api/'
         self.request = request
         with open('token.txt', "r", encoding='utf8') as f:
             token = f.readline()
-            print(token)
         # necessary headers for correct work
         self.headers = {
             'X-Mpstats-TOKEN': token,
-            'Content-Type': 'application/json'
+            'Content-Type': 'application/json',
+            'Accept-Encoding': 'gzip, deflate'
         }
+        # keep-alive session with connection pool, reused by all requests of the instance
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, max_workers))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         # filter parameters
         self.filter = {'sales': {'filterType': 'number', 'type': 'greaterThanOrEqual', 'filter': 10, 'filterTo': None}}
         # sorting parameters
         self.sort = [{'colId': 'revenue', 'sort': 'desc'}]
+        # filter parameters for brand requests
+        self.brand_filter = {'sales': {'filterType': 'number', 'type': 'greaterThanOrEqual', 'filter': 1,
+                                       'filterTo': None}}
         self.dates = []
         self.temp_frame = pd.DataFrame()
+        # concurrency parameters: number of parallel requests and average pause between requests (seconds)
+        self.max_workers = max_workers
+        self.page_size = 5000
+        # results with more rows are not kept in memory for xlsx file but streamed into csv shards of shard_rows
+        # rows or shard_bytes bytes (None - no size limit)
+        self.xlsx_rows = 250000
+        self.shard_rows = 1000000
+        self.shard_bytes = None
+        # pagination limit: category windows with more rows are split into revenue bands (see _plan_bands),
+        # None to load every window by pages
+        self.max_window_rows = None
+        # maximal number of items in one items/batch request
+        self.info_batch_size = 200
+        if limiter is None:
+            limiter = TokenBucket(rate=1 / rate_limit if rate_limit else 0, capacity=max_workers)
+        self.limiter = limiter
+        # retry parameters for 429 and 5xx responses
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        # response_cache.ResponseCache for responses of closed date windows, None to disable
+        self.cache = cache
+        # if true graph and group columns are dropped while parsing, frames get compact dtypes (see schema module)
+        self.compact = compact
+        # metrics.RunMetrics of requests, parsing and writing, may be shared by several clients
+        if metrics is None:
+            metrics = RunMetrics()
+        self.metrics = metrics
+        # single_flight.SingleFlight coalescing identical requests in flight, by default one for the whole process
+        if single_flight is None:
+            single_flight = SingleFlight.default()
+        self.single_flight = single_flight
+        # callable getting progress dicts (see _notify) and event stopping running loads (see cancel)
+        self.progress = None
+        self.cancelled = threading.Event()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """Close the http session and its pooled connections"""
+        self.session.close()
+
+    def cancel(self):
+        """
+            Stop running loads of the instance from any thread: requests which are not sent yet and retry pauses
+            raise LoadCancelled, so the load method exits with it. Data written before stays in place (with
+            checkpoint_directory the load can be continued later). Call self.cancelled.clear() to use the instance
+            again.
+        """
+        self.cancelled.set()
+
+    def _notify(self, **info):
+        """
+            Send progress to self.progress callback if it is set. Info keys: unit ('page' or 'item'), done, total
+            (number of known pages or items, grows while windows are loaded), rows, windows_done, windows.
+        """
+        if self.progress is not None:
+            self.progress(info)
+
+    def _execute(self, method, url, **kwargs):
+        """
+            Central request executor: waits for the rate limiter, sends the request and retries it with exponential
+            backoff and jitter on 429/5xx responses and connection errors. Retry-After header is respected.
+            Args:
+                method (str): 'GET' or 'POST'.
+                url (str): request url.
+                **kwargs: arguments for requests.Session.request.
+
+            Returns:
+                response (requests.Response): successful response.
+        """
+        kwargs.setdefault('headers', self.headers)
+        kwargs.setdefault('timeout', self.timeout)
+        endpoint = self._endpoint_name(url)
+        target = (kwargs.get('params') or {}).get('path')
+        if target is not None:
+            target = self.request + '/' + target
+        attempt = 0
+        while True:
+            if self.cancelled.is_set():
+                raise LoadCancelled('Loading is cancelled')
+            with self.metrics.timer('limiter'):
+                self.limiter.acquire()
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                seconds = time.perf_counter() - start
+                self.metrics.add_time('network', seconds)
+                self.metrics.request(endpoint, None, seconds, target=target)
+                if attempt >= self.retries:
+                    raise
+                response = None
+            if response is not None:
+                seconds = time.perf_counter() - start
+                self.metrics.add_time('network', seconds)
+                self.metrics.request(endpoint, response.status_code, seconds, len(response.content), target)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    response.raise_for_status()
+                    return response
+            pause = self._retry_after(response)
+            if pause is None:
+                pause = self.backoff * 2 ** attempt
+                pause = pause + random.uniform(0, pause)
+            self.metrics.retry(endpoint)
+            with self.metrics.timer('backoff'):
+                # waiting on the event lets cancel() interrupt long pauses
+                self.cancelled.wait(pause)
+            attempt += 1
+
+    def _endpoint_name(self, url):
+        """
+            Get endpoint name of request url for metrics: url without api address, item numbers are replaced
+            with {sku}.
+            Args:
+                url (str): request url.
+
+            Returns:
+                endpoint (str): endpoint name, e.g. 'wb/get/item/{sku}/sales'.
+        """
+        if url.startswith(self.url):
+            url = url[len(self.url):]
+        return '/'.join('{sku}' if part.isdigit() else part for part in url.split('/'))
+
+    def _cached_request(self, method, url, d2, **kwargs):
+        """
+            Execute request through the response cache if it is enabled, identical requests in flight share one
+            network call (see _coalesced).
+            Args:
+                method (str): 'GET' or 'POST'.
+                url (str): request url.
+                d2 (str): end date of the requested window.
+                **kwargs: arguments for requests.Session.request.
+
+            Returns:
+                content (bytes): response body.
+        """
+        key = {'url': url, 'params': kwargs.get('params'), 'data': kwargs.get('data')}
+        if self.cache is not None:
+            content = self.cache.get(key, d2)
+            if content is not None:
+                self.metrics.cache_hit(self._endpoint_name(url))
+                return content
+
+        def load():
+            if self.cache is not None and self.single_flight.lock_directory is not None:
+                # the response may be loaded by another process which held the lock file before
+                content = self.cache.get(key, d2)
+                if content is not None:
+                    return content
+            content = self._execute(method, url, **kwargs).content
+            if self.cache is not None:
+                self.cache.set(key, content)
+            return content
+
+        return self._coalesced(url, key, load)
+
+    def _coalesced(self, url, key, load, cross_process=True):
+        """
+            Execute load once for all identical requests in flight (of all clients sharing self.single_flight and
+            having the same headers, so the same token). Results are shared between the callers and must not be
+            modified.
+            Args:
+                url (str): request url.
+                key (dict): request parameters identifying the request.
+                load: function without arguments executing the request.
+                cross_process (bool): coalesce with other processes through lock file (if lock_directory is set).
+
+            Returns:
+                result of load.
+        """
+        # clients with other token or headers (another account) don't share responses
+        headers = hashlib.sha1(json.dumps(self.headers, sort_keys=True).encode('utf8')).hexdigest()
+        result, shared = self.single_flight.do(json.dumps(dict(key, headers=headers), sort_keys=True,
+                                                          ensure_ascii=False), load,
+                                               retry_on=(LoadCancelled,), cross_process=cross_process)
+        if shared:
+            self.metrics.coalesced(self._endpoint_name(url))
+        return result
+
+    def _retry_after(self, response):
+        """
+            Get pause in seconds from Retry-After header of the response.
+            Args:
+                response (requests.Response): response with 429 or 5xx status, or None.
+
+            Returns:
+                pause (float): seconds to wait or None if header is absent.
+        """
+        if response is None or not response.headers.get('Retry-After'):
+            return None
+        value = response.headers['Retry-After']
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                return None
+
+    def get_api_limit(self):
+        """
+            Load current API quota of the account from user/report_api_limit.
+
+            Returns:
+                limits (dict): api response.
+        """
+        response = self._execute('GET', self.url + 'user/report_api_limit')
+        return response.json()
+
+    def tune_to_api_limit(self, period=None):
+        """
+            Tune the limiter to the remaining API quota of the account: the budget is set to the remaining quota
+            (a smaller budget set before is kept), so the jobs stop before the quota is exhausted instead of
+            failing on every request. With period the rate is lowered, so the quota lasts for the period. The
+            limiter is shared by all clients created with it.
+            Args:
+                period (float): seconds the remaining quota must last (e.g. until the daily quota is reset), None to
+                    keep the rate.
+
+            Returns:
+                remaining (int): remaining number of requests, None if the response has no quota (limiter is not
+                    changed).
+        """
+        remaining = self._remaining_quota(self.get_api_limit())
+        if remaining is None:
+            print('API quota is not found in user/report_api_limit response, limiter is not changed')
+            return None
+        if self.limiter.budget is None or remaining < self.limiter.budget:
+            self.limiter.budget = remaining
+        if period:
+            rate = remaining / period
+            if not self.limiter.rate or rate < self.limiter.rate:
+                self.limiter.rate = rate
+        return remaining
+
+    @staticmethod
+    def _remaining_quota(limits):
+        """
+            Get remaining number of requests from user/report_api_limit response.
+            Args:
+                limits: api response, dict with 'limit' and 'used' or 'remaining' keys, or list of such dicts.
+
+            Returns:
+                remaining (int): the smallest remaining quota, None if it is not found.
+        """
+        if isinstance(limits, list):
+            values = [requ_Mpstats._remaining_quota(item) for item in limits]
+            values = [value for value in values if value is not None]
+            return min(values) if values else None
+        if not isinstance(limits, dict):
+            return None
+        if isinstance(limits.get('remaining'), (int, float)):
+            return max(0, int(limits['remaining']))
+        if isinstance(limits.get('limit'), (int, float)):
+            return max(0, int(limits['limit'] - (limits.get('used') or 0)))
+        return None
 
     def _date_list(self, start_date='2021-03-01', end_date='2023-03-01', interval=32):
         """
-            Create list of pairs of dates from start to end with one month step
+            Create list of windows from start to end: calendar months, weeks from monday (last week ends at
+            end_date) or windows of interval days starting from start_date (see date_windows module).
             Args:
                 start_date (str): start date for list range.
                 end_date (str): end date for list range.
-                interval (int): base interval for generating dates
-
-            Returns:
-                dates (list): list of dates between start and end.
-        """
-        from datetime import datetime, timedelta
-        dates = []
-        current_date = datetime.strptime(start_date, '%Y-%m-%d')
-        end_date = datetime.strptime(end_date, '%Y-%m-%d')
-        while current_date <= end_date:
-            if interval==32:
-                first_day = datetime(current_date.year, current_date.month, 1)
-                last_day = datetime(current_date.year, current_date.month, 1) + timedelta(days=32)
-                last_day = last_day.replace(day=1) - timedelta(days=1)
-                dates.append((first_day.strftime('%Y-%m-%d'), last_day.strftime('%Y-%m-%d')))
-                current_date = last_day + timedelta(days=1)
-            elif interval==6:
-                week_start = current_date - timedelta(days=current_date.weekday())
-                week_end = week_start + timedelta(days=6)
-
-                if week_end > end_date:
-                    week_end = end_date
-
-                dates.append((week_start.strftime('%Y-%m-%d'), week_end.strftime('%Y-%m-%d')))
-                current_date = week_end + timedelta(days=1)
-        return dates
+                interval (int): base interval for generating dates: 32 - months, 6 - weeks, other - number of days
+                    in one window.
+
+            Returns:
+                dates (list): list of date_windows.Window, pairs of dates between start and end.
+        """
+        if interval == 32:
+            return date_windows(start_date, end_date, 'month')
+        elif interval == 6:
+            return date_windows(start_date, end_date, 'week', clip_end=True)
+        return date_windows(start_date, end_date, 'day', size=interval, clip_end=True)
 
     def _get_sku_info(self, sku):
         """
@@ -87,13 +444,52 @@ class requ_Mpstats:
         url = self.url + self.request + "/get/items/batch"
         # str(sku)
         params = {'ids': sku}
-        response = requests.post(url=url, headers=self.headers, data=json.dumps(params))
-        print(response.status_code)
-        json_data = response.json()
-        df = pd.json_normalize(json_data)
-        df['photos'] = df['photos'][0][0]['f']
+        data = json.dumps(params)
+        content = self._coalesced(url, {'url': url, 'data': data},
+                                  lambda: self._execute('POST', url, data=data).content)
+        with self.metrics.timer('parse'):
+            df = records_to_frame(loads(content))
+            if 'photos' in df.columns:
+                df['photos'] = df['photos'].map(lambda photos: photos[0]['f'] if isinstance(photos, list) and photos
+                                                else None)
         return df
 
+    def _plan_batches(self, sku_list):
+        """
+            Split items into batches for items/batch request. Duplicates are removed, order is kept.
+            Args:
+                sku_list (list): list of target items.
+
+            Returns:
+                batches (list): list of lists of items, no more than info_batch_size items in each.
+        """
+        sku_list = list(dict.fromkeys(sku_list))
+        return [sku_list[index:index + self.info_batch_size]
+                for index in range(0, len(sku_list), self.info_batch_size)]
+
+    def load_sku_info(self, sku_list):
+        """
+            Load current info about any number of items, batches are requested concurrently (up to max_workers
+            at once).
+            Args:
+                sku_list (list): list of target items.
+
+            Returns:
+                df (pd.Dataframe): frame of data about target items in order of the batches.
+        """
+        batches = self._plan_batches(sku_list)
+        items = sum(len(batch) for batch in batches)
+        done = 0
+        frames = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for batch, frame in zip(batches, executor.map(self._get_sku_info, batches)):
+                frames.append(frame)
+                done = done + len(batch)
+                self._notify(unit='item', done=done, total=items)
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
     def _get_sku_sales(self, sku, d1, d2):
         """
             Load sales for one item (sku) from date 1 to date 2
@@ -110,12 +506,62 @@ class requ_Mpstats:
             'd1': d1,
             'd2': d2
         }
-        response = requests.get(url=url, headers=self.headers, params=params)
-        print(response.status_code)
-        json_data = response.json()
-        df = pd.json_normalize(json_data)
+        content = self._cached_request('GET', url, d2, params=params)
+        with self.metrics.timer('parse'):
+            df = records_to_frame(loads(content))
         return df
 
+    def iter_pages(self, kind, d1, d2, path, startRow=0, page_size=None, as_frames=False):
+        """
+            Generator of category or brand data pages from d1 to d2. Each page is requested only when the previous
+            one is consumed, so callers can write pages to file or database keeping one page in memory.
+            Args:
+                kind (str): 'category' or 'brand'.
+                d1 (str): start date for sales count.
+                d2 (str): end date for sales count.
+                path (str): category or brand name as it exists on the marketplace.
+                startRow (int): first row to load.
+                page_size (int): rows in one request (no more than 5000). Default self.page_size.
+                as_frames (bool): if true pages are yielded as frames with date column, else as raw records.
+
+            Yields:
+                page (list or pd.Dataframe): rows of one page.
+        """
+        if page_size is None:
+            page_size = self.page_size
+        total = startRow + 1
+        while startRow < total:
+            data, total = self._page_request(kind, d1, d2, path, startRow, startRow + page_size)
+            if as_frames:
+                yield self._window_frame(kind, d2, data)
+            else:
+                yield data
+            if not data:
+                break
+            startRow = startRow + page_size
+
+    def _window_frame(self, kind, d2, records):
+        """
+            Make frame from loaded rows of one window: flatten records, add date column and clean brand columns.
+            Args:
+                kind (str): 'category' or 'brand'.
+                d2 (str): end date of the window.
+                records (list): loaded rows.
+
+            Returns:
+                frame (pd.Dataframe): frame of window data.
+        """
+        with self.metrics.timer('parse'):
+            if self.compact:
+                frame = compact_frame(records_to_frame(prune_records(records)))
+                frame['date'] = pd.Timestamp(d2)
+            else:
+                frame = records_to_frame(records)
+                frame['date'] = day_label(d2)
+            if kind == 'brand':
+                frame = self._clean_brand_frame(frame)
+        return frame
+
     # @progress_bar
     def category_request(self, d1='2023-03-01', d2='2023-03-30', category_string='Зоотовары/Для собак', startRow=0,
                          endRow=5000, save=True):
@@ -133,37 +579,11 @@ class requ_Mpstats:
             Returns:
                 None
         """
-        category_string = category_string
-
-        url = self.url + self.request + "/get/category"
-        params = {
-            'd1': d1,
-            'd2': d2,
-            'path': category_string
-        }
-        time.sleep(1)
-        data = {
-            'startRow': startRow,
-            'endRow': endRow,
-            'filterModel': self.filter,
-            'sortModel': self.sort
-        }
-        response = requests.post(url, headers=self.headers, params=params, data=json.dumps(data))
-        print(response.status_code)
-        if response.status_code == 200:
-            data = json.loads(response.text)['data']
-        if endRow < json.loads(response.text)['total']:
-            temp_frame = pd.json_normalize(data)
-            self.temp_frame = pd.concat([temp_frame, self.temp_frame], ignore_index=True)
-            self.category_request(d1=d1, d2=d2, category_string=category_string, save=save, startRow=startRow + 5000,
-                                  endRow=endRow + 5000)
-        else:
-            temp_frame = pd.json_normalize(data)
-            self.temp_frame = pd.concat([temp_frame, self.temp_frame], ignore_index=True)
-
-        date_obj1 = datetime.strptime(d2, '%Y-%m-%d')
-        new_d2 = date_obj1.strftime('%d.%m.%Y')
-        self.temp_frame['date'] = new_d2
+        records = []
+        for page in self.iter_pages('category', d1, d2, category_string, startRow=startRow,
+                                    page_size=endRow - startRow):
+            records.extend(page)
+        self.temp_frame = self._window_frame('category', d2, records)
 
         if save:
             self.temp_frame.to_excel(category_string + ' ' + d1 + '-' + d2 + '.xlsx')
@@ -187,56 +607,454 @@ class requ_Mpstats:
                 None
 
         """
-        brand_string = brand_string
+        records = []
+        for page in self.iter_pages('brand', d1, d2, brand_string, startRow=startRow, page_size=endRow - startRow):
+            records.extend(page)
+        self.temp_frame = self._window_frame('brand', d2, records)
 
-        url = self.url + self.request + "/get/brand"
+        if save:
+            self.temp_frame.to_excel(brand_string + ' ' + d1 + '-' + d2 + '.xlsx')
+            # print(df)
+        elif db_conn:
+            return self.temp_frame
+
+    def _page_request(self, kind, d1, d2, path, startRow, endRow, band=None):
+        """
+            Load one page of category or brand data from d1 to d2.
+            Args:
+                kind (str): 'category' or 'brand'.
+                d1 (str): start date for sales count.
+                d2 (str): end date for sales count.
+                path (str): category or brand name as it exists on the marketplace.
+                startRow (int): request parameter (no more than 5000 rows in one request)
+                endRow (int): request parameter (no more than 5000 rows in one request)
+                band (tuple): (low, high) revenue bounds of the rows, (value, value) for revenue equal to value,
+                    (None, None) for rows without revenue, None for all rows.
+
+            Returns:
+                data (list), total (int): loaded rows and total number of rows in the window (or band).
+        """
+        url, params, data = self._page_params(kind, d1, d2, path, startRow, endRow, band)
+        data = json.dumps(data)
+
+        def load():
+            content = self._cached_request('POST', url, d2, params=params, data=data)
+            with self.metrics.timer('parse'):
+                json_data = loads(content)
+            return json_data['data'], json_data['total']
+
+        # identical pages in flight share one request and one parsed result
+        records, total = self._coalesced(url, {'parsed': True, 'url': url, 'params': params, 'data': data}, load,
+                                         cross_process=False)
+        self.metrics.page(self._endpoint_name(url), len(records))
+        return records, total
+
+    def _page_params(self, kind, d1, d2, path, startRow, endRow, band=None):
+        """
+            Make url, query parameters and body of category or brand page request.
+            Args:
+                kind (str): 'category' or 'brand'.
+                d1 (str): start date for sales count.
+                d2 (str): end date for sales count.
+                path (str): category or brand name as it exists on the marketplace.
+                startRow (int): request parameter (no more than 5000 rows in one request)
+                endRow (int): request parameter (no more than 5000 rows in one request)
+                band (tuple): (low, high) revenue bounds of the rows, (value, value) for revenue equal to value,
+                    (None, None) for rows without revenue, None for all rows.
+
+            Returns:
+                url (str), params (dict), data (dict): request url, query parameters and body.
+        """
+        url = self.url + self.request + "/get/" + kind
         params = {
             'd1': d1,
             'd2': d2,
-            'path': brand_string
+            'path': path
         }
-        time.sleep(1)
-
         data = {
             'startRow': startRow,
-            'endRow': endRow,
-            'filterModel': {'sales': {'filterType': 'number', 'type': 'greaterThanOrEqual', 'filter': 1, 'filterTo': None}}
+            'endRow': endRow
         }
+        if kind == 'category':
+            data['filterModel'] = self.filter
+            data['sortModel'] = self.sort
+        else:
+            data['filterModel'] = self.brand_filter
+        if band is not None:
+            if band[0] is None:
+                revenue = {'filterType': 'number', 'type': 'blank'}
+            elif band[0] == band[1]:
+                revenue = {'filterType': 'number', 'type': 'equals', 'filter': band[0]}
+            else:
+                # bounds are half-integers, so integer revenue is never on the bound and bands don't overlap
+                revenue = {'filterType': 'number', 'type': 'inRange', 'filter': band[0], 'filterTo': band[1]}
+            data['filterModel'] = dict(data['filterModel'], revenue=revenue)
+        return url, params, data
+
+    def _load_page(self, kind, d1, d2, path, startRow, endRow, checkpoint=None, band=None):
+        """
+            Load one page of category or brand data, saved page of the checkpoint is used if it exists.
+            Args:
+                kind (str): 'category' or 'brand'.
+                d1 (str): start date for sales count.
+                d2 (str): end date for sales count.
+                path (str): category or brand name as it exists on the marketplace.
+                startRow (int): request parameter (no more than 5000 rows in one request)
+                endRow (int): request parameter (no more than 5000 rows in one request)
+                checkpoint (Checkpoint): spill directory of loaded pages, None to disable.
+                band (tuple): (number, low, high) revenue band of the rows (see _plan_bands), None for all rows.
+
+            Returns:
+                data (list), total (int): loaded rows and total number of rows in the window (or band).
+        """
+        key = startRow if band is None else band[0] * BAND_ROWS + startRow
+        if checkpoint is not None:
+            page = checkpoint.load(d1, d2, key)
+            if page is not None:
+                return page
+        data, total = self._page_request(kind, d1, d2, path, startRow, endRow,
+                                         None if band is None else band[1:])
+        if checkpoint is not None:
+            checkpoint.save(d1, d2, key, data, total)
+        return data, total
 
-        response = requests.post(url, headers=self.headers, params=params,data=json.dumps(data))
-        print(response.status_code)
-        if response.status_code == 200:
-            data = json.loads(response.text)['data']
-        if endRow < json.loads(response.text)['total']:
-            temp_frame = pd.json_normalize(data)
-            self.temp_frame = pd.concat([temp_frame, self.temp_frame], ignore_index=True)
-            self.brand_request(d1=d1, d2=d2, brand_string=brand_string, save=save, startRow=startRow + 5000,
-                                  endRow=endRow + 5000)
+    def _plan_bands(self, kind, d1, d2, path, total, top):
+        """
+            Split window which has more rows than self.max_window_rows into revenue bands of no more than
+            max_window_rows rows, bands are loaded by pages like separate windows. Rows of a band are counted with
+            one-row request, bounds are bisected on log scale because few products have most of the revenue.
+            Empty bands are skipped. Rows with revenue exactly on a bound get their own 'equals' band, rows
+            without revenue a 'blank' band, rows which are still not covered (e.g. negative revenue) are reported.
+            Args:
+                kind (str): 'category' or 'brand'.
+                d1 (str): start date for sales count.
+                d2 (str): end date for sales count.
+                path (str): category or brand name as it exists on the marketplace.
+                total (int): number of rows in the window.
+                top (float): largest revenue in the window, None if it is not known.
+
+            Returns:
+                bands (list): (low, high, total) of non-empty bands from the highest revenue, low == high for
+                    rows with revenue equal to low, (None, None, total) for rows without revenue.
+        """
+        if top is None:
+            # no revenue on the first page (rows without revenue go first), bisection finds the top in few steps
+            top = 10 ** 12
+        high = math.floor(top) + 1.5
+        count = self._page_request(kind, d1, d2, path, 0, 1, (-0.5, high))[1]
+        bands = []
+        stack = [(-0.5, high, count)]
+        while stack:
+            low, high, count = stack.pop()
+            if count == 0:
+                continue
+            if count <= self.max_window_rows or high - low <= 1:
+                bands.append((low, high, count))
+                continue
+            middle = math.floor(math.sqrt(max(low, 1) * high)) + 0.5
+            if not low < middle < high:
+                middle = math.floor((low + high) / 2) + 0.5
+            lower = self._page_request(kind, d1, d2, path, 0, 1, (low, middle))[1]
+            upper = self._page_request(kind, d1, d2, path, 0, 1, (middle, high))[1]
+            if lower + upper < count:
+                bands.append((middle, middle, count - lower - upper))
+            stack.append((low, middle, lower))
+            stack.append((middle, high, upper))
+        bands = sorted(bands, reverse=True)
+        rest = total - sum(band[2] for band in bands)
+        if rest > 0:
+            blank = self._page_request(kind, d1, d2, path, 0, 1, (None, None))[1]
+            if blank:
+                bands.append((None, None, blank))
+            if rest > blank:
+                print(str(rest - blank) + ' rows of ' + path + ' ' + d1 + ' - ' + d2 + ' are not in revenue bands '
+                      'and are not loaded')
+        return bands
+
+    def _iter_loaded_pages(self, kind, path, dates, checkpoint=None, paths=None):
+        """
+            Generator of loaded pages of category or brand data for every pair of dates. Windows and pages are
+            requested concurrently (up to max_workers at once, pages of earlier windows first, no more than
+            max_workers windows are started from the first incomplete one) and yielded in order of arrival.
+            Category windows with more than self.max_window_rows rows are loaded by revenue bands (see
+            _plan_bands), their first page is only used to plan the bands.
+            Args:
+                kind (str): 'category' or 'brand'.
+                path (str): category or brand name as it exists on the marketplace.
+                dates (list): list of pairs of dates.
+                checkpoint (Checkpoint): spill directory of loaded pages, None to disable.
+                paths (list): path of every pair of dates, used instead of path to load windows of several
+                    targets in one pool.
+
+            Yields:
+                n (int), startRow (int), data (list), last (bool): window number, first row of the page (pages of
+                revenue band b start from b * BAND_ROWS), loaded rows and true if all pages of the window are
+                loaded.
+        """
+        # number of pages left to load for every window, None until the first page is loaded
+        left = [None] * len(dates)
+        # progress counters: first pages of all windows are known from the start, the rest after first pages
+        pages = len(dates)
+        pages_done = 0
+        windows_done = 0
+        rows = 0
+        # windows are opened in date order, no more than max_workers windows from the first incomplete one, and
+        # queued pages of earlier windows are sent first, so consumers holding pages until their window is
+        # complete keep only few windows in memory
+        queue = []
+        sequence = itertools.count()
+        opened = 0
+        first_open = 0
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            futures = {}
+            while True:
+                while opened < len(dates) and opened < first_open + self.max_workers:
+                    d1, d2 = dates[opened]
+                    heapq.heappush(queue, (opened, 0, next(sequence), 0, self._load_page,
+                                           (kind, d1, d2, path if paths is None else paths[opened], 0,
+                                            self.page_size, checkpoint)))
+                    opened = opened + 1
+                while queue and len(futures) < self.max_workers:
+                    n, _, _, startRow, function, args = heapq.heappop(queue)
+                    futures[executor.submit(function, *args)] = (n, startRow)
+                if not futures:
+                    break
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    n, startRow = futures.pop(future)
+                    d1, d2 = dates[n]
+                    target = path if paths is None else paths[n]
+                    if startRow is None:
+                        # bands of the large window are planned, request their pages
+                        left[n] = 0
+                        for number, (low, high, count) in enumerate(future.result(), 1):
+                            for row in range(0, count, self.page_size):
+                                key = number * BAND_ROWS + row
+                                heapq.heappush(queue, (n, key, next(sequence), key, self._load_page,
+                                                       (kind, d1, d2, target, row, row + self.page_size,
+                                                        checkpoint, (number, low, high))))
+                                left[n] = left[n] + 1
+                        pages = pages + left[n]
+                        if left[n] == 0:
+                            windows_done = windows_done + 1
+                            while first_open < len(dates) and left[first_open] == 0:
+                                first_open = first_open + 1
+                            yield n, 0, [], True
+                        continue
+                    data, total = future.result()
+                    pages_done = pages_done + 1
+                    if startRow == 0 and kind == 'category' and self.max_window_rows is not None \
+                            and total > self.max_window_rows and data:
+                        # window is larger than pagination allows, rows are sorted by revenue desc
+                        top = max((row['revenue'] for row in data if isinstance(row.get('revenue'), (int, float))),
+                                  default=None)
+                        heapq.heappush(queue, (n, 0, next(sequence), None, self._plan_bands,
+                                               (kind, d1, d2, target, total, top)))
+                        self._notify(unit='page', done=pages_done, total=pages, rows=rows,
+                                     windows_done=windows_done, windows=len(dates))
+                        continue
+                    # first page of the window gives total number of rows, request the rest pages
+                    if startRow == 0:
+                        next_rows = range(self.page_size, total, self.page_size)
+                        left[n] = len(next_rows)
+                        pages = pages + len(next_rows)
+                        for next_row in next_rows:
+                            heapq.heappush(queue, (n, next_row, next(sequence), next_row, self._load_page,
+                                                   (kind, d1, d2, target, next_row, next_row + self.page_size,
+                                                    checkpoint)))
+                    else:
+                        left[n] = left[n] - 1
+                    rows = rows + len(data)
+                    if left[n] == 0:
+                        windows_done = windows_done + 1
+                        while first_open < len(dates) and left[first_open] == 0:
+                            first_open = first_open + 1
+                    self._notify(unit='page', done=pages_done, total=pages, rows=rows, windows_done=windows_done,
+                                 windows=len(dates))
+                    yield n, startRow, data, left[n] == 0
+        finally:
+            # pages which are not sent yet are dropped if a page fails or the consumer stops the generator
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _iter_windows(self, kind, path, dates, checkpoint=None):
+        """
+            Generator of category or brand data for every pair of dates. Frames are yielded in date order as soon
+            as the window and all windows before it are loaded.
+            Args:
+                kind (str): 'category' or 'brand'.
+                path (str): category or brand name as it exists on the marketplace.
+                dates (list): list of pairs of dates.
+                checkpoint (Checkpoint): spill directory of loaded pages, None to disable.
+
+            Yields:
+                frame (pd.Dataframe): frame of one pair of dates.
+        """
+        pages = {}
+        loaded = set()
+        next_window = 0
+        for n, startRow, data, last in self._iter_loaded_pages(kind, path, dates, checkpoint):
+            pages[(n, startRow)] = data
+            if last:
+                loaded.add(n)
+            while next_window in loaded:
+                yield self._pop_window(kind, pages, next_window, dates[next_window][1])
+                next_window = next_window + 1
+
+    def _pop_window(self, kind, pages, n, d2):
+        """
+            Remove loaded pages of window n from pages dict and make frame of them in page order.
+            Args:
+                kind (str): 'category' or 'brand'.
+                pages (dict): loaded pages by (window number, start row).
+                n (int): window number.
+                d2 (str): end date of the window.
+
+            Returns:
+                frame (pd.Dataframe): frame of window data.
+        """
+        records = []
+        for key in sorted(key for key in pages if key[0] == n):
+            records.extend(pages.pop(key))
+        return self._window_frame(kind, d2, records)
+
+    def _clean_brand_frame(self, frame):
+        """
+            Rename sku column and drop graph and group columns from brand data.
+            Args:
+                frame (pd.Dataframe): frame of brand data.
+
+            Returns:
+                frame (pd.Dataframe): cleaned frame.
+        """
+        frame = frame.rename(columns={'id': 'sku'})
+        columns_with_group = [col for col in frame.columns if 'group' in col]
+        frame = frame.drop(columns=['category_graph', 'graph', 'stocks_graph', 'product_visibility_graph',
+                                    'price_graph'] + columns_with_group, errors='ignore')
+        return frame
+
+    def _collect_windows(self, kind, path, name, save_path, save_directory=None, separate_files=False,
+                         stream=False, sink=None, checkpoint=None, in_memory=False):
+        """
+            Load all pairs of dates from self.dates and collect them into self.final_frame in date order. Window
+            frames are kept in a list and concatenated once at the end. When collected data grows larger than
+            self.xlsx_rows rows it can't be saved into xlsx, so collected windows and all next windows are
+            streamed into csv shards of self.shard_rows rows (see sinks.ShardedCsvSink) and self.final_frame is
+            None.
+            Args:
+                kind (str): 'category' or 'brand'.
+                path (str): category or brand name as it exists on the marketplace.
+                name (str): category or brand name for file names.
+                save_path (str): path of the result file without extension.
+                save_directory (str): path to directory to save separate files.
+                separate_files (bool): if true each window data saved in separate files. Default False
+                stream (bool): if true each window is appended to the csv result file as soon as it is loaded and
+                    is not kept in memory. Columns of the first window are used for the whole file. Default False
+                sink: output sink from sinks module, loaded data is written to it instead of self.final_frame.
+                checkpoint (Checkpoint): spill directory of loaded pages, None to disable.
+                in_memory (bool): if true all windows are kept in self.final_frame whatever its size (e.g. for
+                    database upload). Default False
+
+            Returns:
+                formater (str): extension of the result file.
+        """
+        self.final_frame = None
+        if stream and sink is None:
+            sink = CsvSink(save_path + '.csv')
+        if sink is not None:
+            self._write_windows(kind, path, sink, checkpoint)
+            return None
+        frames = []
+        rows = 0
+        shards = None
+        i = 1
+        for date, frame in zip(self.dates, self._iter_windows(kind, path, self.dates, checkpoint)):
+            if separate_files:
+                with self.metrics.timer('write'):
+                    frame.to_excel(save_directory + '/' + name + ' ' + date.label + '.xlsx', engine='openpyxl')
+            elif frame.shape[0] == 0:
+                print('No data from' + date[0] + ' ' + date[1])
+                i = i + 1
+                continue
+            else:
+                frame = frame.loc[:, ~frame.columns.duplicated(keep='last')]
+                if shards is not None:
+                    with self.metrics.timer('write'):
+                        shards.write(frame, date)
+                else:
+                    frames.append((date, frame))
+                    rows = rows + frame.shape[0]
+                    if rows > self.xlsx_rows and not in_memory:
+                        print('More than ' + str(self.xlsx_rows) + ' rows, writing csv shards ' + save_path + '_N.csv')
+                        shards = ShardedCsvSink(save_path, max_rows=self.shard_rows, max_bytes=self.shard_bytes)
+                        with self.metrics.timer('write'):
+                            for window, collected in frames:
+                                shards.write(collected, window)
+                        frames = []
+            print('#' + str(i) + ' Done!')
+            i = i + 1
+        if shards is not None:
+            with self.metrics.timer('write'):
+                shards.close()
+            return '.csv'
+        if frames:
+            self.final_frame = concat_frames([frame for window, frame in frames], downcast=self.compact)
+        return '.csv' if rows > self.xlsx_rows else '.xlsx'
+
+    def _write_windows(self, kind, path, sink, checkpoint=None):
+        """
+            Load all pairs of dates from self.dates and write them to the output sink. Ordered sinks get whole
+            windows in date order, other sinks get every page as soon as it is loaded.
+            Args:
+                kind (str): 'category' or 'brand'.
+                path (str): category or brand name as it exists on the marketplace.
+                sink: output sink from sinks module.
+                checkpoint (Checkpoint): spill directory of loaded pages, None to disable.
+
+            Returns:
+                None
+        """
+        i = 1
+        if sink.ordered:
+            for date, frame in zip(self.dates, self._iter_windows(kind, path, self.dates, checkpoint)):
+                with self.metrics.timer('write'):
+                    sink.write(frame.loc[:, ~frame.columns.duplicated(keep='last')], date)
+                print('#' + str(i) + ' Done!')
+                i = i + 1
         else:
-            temp_frame = pd.json_normalize(data)
-            self.temp_frame = pd.concat([temp_frame, self.temp_frame], ignore_index=True)
-
-        date_obj1 = datetime.strptime(d2, '%Y-%m-%d')
-        new_d2 = date_obj1.strftime('%d.%m.%Y')
-        self.temp_frame['date'] = new_d2
-        self.temp_frame.rename(columns={'id': 'sku'}, inplace=True)
-        columns_with_group = [col for col in  self.temp_frame.columns if 'group' in col]
-        self.temp_frame.drop(columns=['category_graph','graph','stocks_graph','product_visibility_graph','price_graph'],
-                             inplace=True)
-        if len(columns_with_group)>0:
-            self.temp_frame.drop(columns=columns_with_group, inplace=True)
+            for n, startRow, data, last in self._iter_loaded_pages(kind, path, self.dates, checkpoint):
+                frame = self._window_frame(kind, self.dates[n][1], data)
+                with self.metrics.timer('write'):
+                    sink.write(frame, self.dates[n], startRow)
+                if last:
+                    print('#' + str(i) + ' Done!')
+                    i = i + 1
+        with self.metrics.timer('write'):
+            sink.close()
 
-        if save:
-            self.temp_frame.to_excel(brand_string + ' ' + d1 + '-' + d2 + '.xlsx')
-            # print(df)
-        elif db_conn:
-            return self.temp_frame
+    def _save_frame(self, frame, save_path, formater):
+        """
+            Save frame to csv or xlsx file.
+            Args:
+                frame (pd.Dataframe): frame to save.
+                save_path (str): path of the file without extension.
+                formater (str): '.csv' or '.xlsx'.
+
+            Returns:
+                None
+        """
+        with self.metrics.timer('write'):
+            if formater == '.csv':
+                frame.to_csv(save_path + formater, sep=';', encoding='utf-8-sig')
+            else:
+                frame.to_excel(save_path + formater, engine='openpyxl')
 
-    def get_cat_by_dates(self, category_string, start_date, end_date, save_directory=None,separate_files=False):
+    def get_cat_by_dates(self, category_string, start_date, end_date, save_directory=None, separate_files=False,
+                         stream=False, output=None, checkpoint_directory=None):
         """
             Loading selected category from start to end date with step 1 month. Results save into 1 file and saved
-            in target save directory. If loaded data is larger than 250000 rows save format is csv, else - xlsx.
-            If result file is larger than 1000000 rows - it splits in two files.
+            in target save directory. If loaded data is larger than 250000 rows it is streamed into csv shards of
+            1000000 rows (name_1.csv, name_2.csv, ... listed in 'name shards.json'), else saved to xlsx file.
 
             Args:
                 category_string (str): category name as it exists on the marketplace.
@@ -244,6 +1062,12 @@ class requ_Mpstats:
                 end_date (str): end date for sales count.
                 save_directory (str): path to directory to save result file.
                 separate_files (bool): if true each month data sawed in separate files. Default False
+                stream (bool): if true each month is appended to csv file as soon as it is loaded, without holding
+                    all data in memory. Default False
+                output (str): 'parquet', 'csv' or 'xlsx' to write data through output sink as it is loaded
+                    (parquet dataset is partitioned by marketplace and month). Default None
+                checkpoint_directory (str): directory to save every loaded page, rerun with the same arguments
+                    after failure continues from the first page which is not loaded. Default None
 
             Returns:
                 None
@@ -252,72 +1076,35 @@ class requ_Mpstats:
          """
         self.dates = self._date_list(start_date=start_date, end_date=end_date)
         self.final_frame = None
-        date_obj1 = datetime.strptime(start_date, '%Y-%m-%d')
-        new_date_start = date_obj1.strftime('%d.%m.%Y')
-        date_obj1 = datetime.strptime(end_date, '%Y-%m-%d')
-        new_date_end = date_obj1.strftime('%d.%m.%Y')
-        save_date = new_date_start + '-' + new_date_end
-        i = 1
-        formater = '.xlsx'
-        if category_string.find('/') > 0:
-            category = category_string.split(sep='/')[-2] + ' ' + category_string.split(sep='/')[-1]
-        else:
-            category = category_string
+        save_date = period_label(start_date, end_date)
+        category = self._category_name(category_string)
         if save_directory is not None:
             save_path = save_directory + '/' + category + ' ' + save_date
         else:
             save_path = category + ' ' + save_date
-        for date in self.dates:
-            self.category_request(d1=date[0], d2=date[1], category_string=category_string, save=False)
-            if separate_files:
-                date0=datetime.strptime(date[0], '%Y-%m-%d').strftime('%d.%m.%Y')
-                date1 = datetime.strptime(date[1], '%Y-%m-%d').strftime('%d.%m.%Y')
-                self.temp_frame.to_excel(save_directory + '/' + category + ' '+date0 +'-'+ date1 + formater, engine='openpyxl')
-                print('#' + str(i) + ' Done!')
-                i = i + 1
-                self.temp_frame = None
-            else:
-                if self.final_frame is None:
-                    if self.temp_frame.shape[0] != 0:
-                        self.final_frame = self.temp_frame
-                        print('#' + str(i) + ' Done!')
-                        self.colunm_list = [column for column in self.final_frame]
-                        i = i + 1
-                    else:
-                        i = i + 1
-                        print('No data from' + date[0] + ' ' + date[1])
-                else:
-                    # temp_colums = [column for column in self.temp_frame]
-                    # for final_colum, temp_colum in zip(self.colunm_list, temp_colums):
-                    #     if final_colum != temp_colum:
-                    #         self.temp_frame.rename(columns={temp_colum: final_colum}, inplace=True)
-                    self.temp_frame = self.temp_frame.loc[:, ~self.temp_frame.columns.duplicated(keep='last')]
-                    self.final_frame.reset_index(drop=True, inplace=True)
-                    self.final_frame = pd.concat([self.temp_frame, self.final_frame], sort=False, axis=0, ignore_index=True)
-                    print('#' + str(i) + ' Done!')
-                    i = i + 1
-                    self.temp_frame = None
-
-                    if self.final_frame.shape[0] > 250000:
-                        formater = '.csv'
-                    else:
-                        formater = '.xlsx'
-                    if self.final_frame.shape[0] > 1000000:
-                        self.final_frame.to_csv(save_path + '_1' + formater, sep=';', encoding='utf-8-sig')
-                        self.final_frame = None
+        sink = None
+        if output is not None:
+            sink = open_sink(output, save_path, marketplace=self.request)
+        checkpoint = None
+        if checkpoint_directory is not None:
+            checkpoint = Checkpoint(checkpoint_directory, self.request + '/category/' + category_string + ' ' +
+                                    start_date + ' ' + end_date)
+        formater = self._collect_windows('category', category_string, category, save_path,
+                                         save_directory=save_directory, separate_files=separate_files, stream=stream,
+                                         sink=sink, checkpoint=checkpoint)
         if self.final_frame is not None:
-            if formater == '.csv':
-                self.final_frame.to_csv(save_path + formater, sep=';', encoding='utf-8-sig')
-            else:
-                self.final_frame.to_excel(save_path + formater, engine='openpyxl')
+            self._save_frame(self.final_frame, save_path, formater)
+        if checkpoint is not None:
+            checkpoint.clear()
         print('Finished')
 
 
-    def get_brand_by_dates(self, brand_string, start_date, end_date, save_directory=None, separate_files=False, db_connect=False):
+    def get_brand_by_dates(self, brand_string, start_date, end_date, save_directory=None, separate_files=False,
+                           db_connect=False, stream=False, output=None, checkpoint_directory=None):
         """
             Loading selected category from start to end date with step 1 month. Results save into 1 file and saved
-            in target save directory. If loaded data is larger than 250000 rows save format is csv, else - xlsx.
-            If result file is larger than 1000000 rows - it splits in two files.
+            in target save directory. If loaded data is larger than 250000 rows it is streamed into csv shards of
+            1000000 rows (name_1.csv, name_2.csv, ... listed in 'name shards.json'), else saved to xlsx file.
 
             Args:
                 brand_string (str): brand name as it exists on the marketplace.
@@ -325,6 +1112,13 @@ class requ_Mpstats:
                 end_date (str): end date for sales count.
                 save_directory (str): path to directory to save result file.
                 separate_files (bool): if true each month data sawed in separate files. Default False
+                db_connect (bool): if true loaded data is returned instead of saving. Default False
+                stream (bool): if true each week is appended to csv file as soon as it is loaded, without holding
+                    all data in memory. Ignored with db_connect. Default False
+                output (str): 'parquet', 'csv' or 'xlsx' to write data through output sink as it is loaded
+                    (parquet dataset is partitioned by marketplace and week). Ignored with db_connect. Default None
+                checkpoint_directory (str): directory to save every loaded page, rerun with the same arguments
+                    after failure continues from the first page which is not loaded. Default None
 
             Returns:
                 None
@@ -333,74 +1127,267 @@ class requ_Mpstats:
          """
         self.dates = self._date_list(start_date=start_date, end_date=end_date, interval=6)
         self.final_frame = None
-        date_obj1 = datetime.strptime(start_date, '%Y-%m-%d')
-        new_date_start = date_obj1.strftime('%d.%m.%Y')
-        date_obj1 = datetime.strptime(end_date, '%Y-%m-%d')
-        new_date_end = date_obj1.strftime('%d.%m.%Y')
-        save_date = new_date_start + '-' + new_date_end
-        i = 1
+        save_date = period_label(start_date, end_date)
         if db_connect:
-            separate_files=False
-        elif separate_files:
-            db_connect=False
+            separate_files = False
+            stream = False
+            output = None
 
-        formater = '.xlsx'
         if save_directory is not None:
             save_path = save_directory + '/' + brand_string + ' ' + save_date
         else:
             save_path = brand_string + ' ' + save_date
-        for date in self.dates:
-            self.brand_request(d1=date[0], d2=date[1], brand_string=brand_string, save=False)
-            if separate_files:
-                date0=datetime.strptime(date[0], '%Y-%m-%d').strftime('%d.%m.%Y')
-                date1 = datetime.strptime(date[1], '%Y-%m-%d').strftime('%d.%m.%Y')
-                self.temp_frame.to_excel(save_directory + '/' + brand_string + ' '+date0 +'-'+ date1 + formater, engine='openpyxl')
-                print('#' + str(i) + ' Done!')
-                i = i + 1
-                self.temp_frame = None
-            else:
-                if self.final_frame is None:
-                    if self.temp_frame.shape[0] != 0:
-                        self.final_frame = self.temp_frame
-                        print('#' + str(i) + ' Done!')
-                        self.colunm_list = [column for column in self.final_frame]
-                    else:
-                        i = i + 1
-                        print('No data from' + date[0] + ' ' + date[1])
-                else:
-                    # temp_colums = [column for column in self.temp_frame]
-                    # for final_colum, temp_colum in zip(self.colunm_list, temp_colums):
-                    #     if final_colum != temp_colum:
-                    #         self.temp_frame.rename(columns={temp_colum: final_colum}, inplace=True)
-                    self.temp_frame = self.temp_frame.loc[:, ~self.temp_frame.columns.duplicated(keep='last')]
-                    self.final_frame.reset_index(drop=True, inplace=True)
-                    self.final_frame = pd.concat([self.temp_frame, self.final_frame], sort=False, axis=0, ignore_index=True)
-                    print('#' + str(i) + ' Done!')
-                    i = i + 1
-                    self.temp_frame = None
+        sink = None
+        if output is not None:
+            sink = open_sink(output, save_path, marketplace=self.request)
+        checkpoint = None
+        if checkpoint_directory is not None:
+            checkpoint = Checkpoint(checkpoint_directory, self.request + '/brand/' + brand_string + ' ' +
+                                    start_date + ' ' + end_date)
+        formater = self._collect_windows('brand', brand_string, brand_string, save_path,
+                                         save_directory=save_directory, separate_files=separate_files, stream=stream,
+                                         sink=sink, checkpoint=checkpoint, in_memory=db_connect)
+        if self.final_frame is not None and not db_connect:
+            self._save_frame(self.final_frame, save_path, formater)
+        if checkpoint is not None:
+            checkpoint.clear()
+        print('Finished')
+        if db_connect:
+            return self.final_frame
 
-                    if self.final_frame.shape[0] > 250000:
-                        formater = '.csv'
-                    else:
-                        formater = '.xlsx'
-                    if self.final_frame.shape[0] > 1000000:
-                        self.final_frame.to_csv(save_path + '_1' + formater, sep=';', encoding='utf-8-sig')
-                        self.final_frame = None
-        if self.final_frame is not None:
-            if db_connect:
-                print('Finished')
-                return self.final_frame
-            else:
-                if formater == '.csv':
-                    self.final_frame.to_csv(save_path + formater, sep=';', encoding='utf-8-sig')
-                else:
-                    self.final_frame.to_excel(save_path + formater, engine='openpyxl')
+
+
+    def _category_name(self, category_string):
+        """
+            Make short category name for file names from the last two levels of category path.
+            Args:
+                category_string (str): category name as it exists on the marketplace.
+
+            Returns:
+                category (str): short category name.
+        """
+        if category_string.find('/') > 0:
+            return category_string.split(sep='/')[-2] + ' ' + category_string.split(sep='/')[-1]
+        return category_string
+
+    def get_categories(self):
+        """
+            Load category tree of the marketplace (cached as response of the current day if cache is enabled).
+
+            Returns:
+                paths (list): paths of all categories ('Дом/Кухня/Посуда').
+        """
+        url = self.url + self.request + '/get/categories'
+        content = self._cached_request('GET', url, date.today().isoformat())
+        return [item['path'] if isinstance(item, dict) else item for item in loads(content)]
+
+    def get_tree_by_dates(self, category_string, start_date, end_date, save_directory=None, output='parquet'):
+        """
+            Loading all leaf categories of selected category from start to end date with step 1 month. Leaves
+            are found in the category tree of the marketplace, their windows are loaded in one pool and saved once
+            with path column. Aggregates of the category and all its subcategories (revenue, sales, number of
+            sku) are computed from leaf data, parent categories are not requested. Aggregates are saved into
+            xlsx file next to the data.
+
+            Args:
+                category_string (str): category name as it exists on the marketplace.
+                start_date (str): start date for sales count.
+                end_date (str): end date for sales count.
+                save_directory (str): path to directory to save result files.
+                output (str): 'parquet', 'csv' or 'xlsx' format of leaf data. Default 'parquet'
+
+            Returns:
+                aggregates (pd.Dataframe): aggregates of every category of the subtree by month, None if there
+                    is no data.
+        """
+        leaves = leaf_paths(self.get_categories(), category_string)
+        if not leaves:
+            raise ValueError('Category is not found in category tree: ' + category_string)
+        dates = self._date_list(start_date=start_date, end_date=end_date)
+        # every leaf gets all windows, leaf of the window is given by paths
+        windows = [window for leaf in leaves for window in dates]
+        paths = [leaf for leaf in leaves for window in dates]
+        save_date = period_label(start_date, end_date)
+        save_path = self._category_name(category_string) + ' tree ' + save_date
+        if save_directory is not None:
+            save_path = save_directory + '/' + save_path
+        sink = open_sink(output, save_path, marketplace=self.request)
+        pages = {}
+        keys = []
+        i = 1
+        for n, startRow, data, last in self._iter_loaded_pages('category', None, windows, paths=paths):
+            pages[(n, startRow)] = data
+            if not last:
+                continue
+            frame = self._pop_window('category', pages, n, windows[n][1])
+            if frame.shape[0] != 0:
+                frame.insert(0, 'path', paths[n])
+                frame = frame.loc[:, ~frame.columns.duplicated(keep='last')]
+                # windows of different leaves are written as they are loaded, part number keeps leaves apart
+                with self.metrics.timer('write'):
+                    sink.write(frame, windows[n], n)
+                key_frame = frame[[col for col in ('path', 'id', 'revenue', 'sales') if col in frame.columns]]
+                keys.append(key_frame.assign(window=windows[n][1]))
+            print('#' + str(i) + ' Done!')
+            i = i + 1
+        with self.metrics.timer('write'):
+            sink.close()
+        if not keys:
+            print('Finished')
+            return None
+        aggregates = aggregate_tree(pd.concat(keys, ignore_index=True), category_string)
+        self._save_frame(aggregates, save_path + ' aggregates', '.xlsx')
         print('Finished')
+        return aggregates
 
+    def sync_by_dates(self, path, start_date, end_date, save_directory, kind='category', manifest=None):
+        """
+            Incremental loading of category or brand: only closed windows (month for category, week for brand)
+            which are not recorded in the manifest are loaded and appended to the csv file of the target.
+            Windows touching today are skipped until they are closed, so every window is appended once.
+
+            Args:
+                path (str): category or brand name as it exists on the marketplace.
+                start_date (str): start date for sales count.
+                end_date (str): end date for sales count.
+                save_directory (str): path to directory with result file and manifest.
+                kind (str): 'category' or 'brand'. Default 'category'
+                manifest (Manifest): manifest of loaded windows. Default mpstats_manifest.json in save_directory.
+
+            Returns:
+                dates (list): list of loaded pairs of dates.
+        """
+        if manifest is None:
+            manifest = Manifest(save_directory + '/mpstats_manifest.json')
+        if kind == 'category':
+            interval = 32
+            name = self._category_name(path)
+        else:
+            interval = 6
+            name = path
+        target = self.request + '/' + kind + '/' + path
+        done = manifest.get(target)
+        today = date.today().isoformat()
+        dates = [window for window in self._date_list(start_date=start_date, end_date=end_date, interval=interval)
+                 if window[1] < today and window[0] + ' ' + window[1] not in done]
+        sink = CsvSink(save_directory + '/' + name + ' ' + self.request + '.csv', append=True)
+        i = 1
+        for window, frame in zip(dates, self._iter_windows(kind, path, dates)):
+            with self.metrics.timer('write'):
+                sink.write(frame.loc[:, ~frame.columns.duplicated(keep='last')], window)
+            manifest.add(target, window[0] + ' ' + window[1])
+            print('#' + str(i) + ' Done!')
+            i = i + 1
+        sink.close()
+        print('Finished')
+        return dates
+
+    def _iter_sku_sales(self, sku_list, d1, d2):
+        """
+            Generator of sales of several items loaded concurrently (up to max_workers at once).
+            Args:
+                sku_list (list): list of target items.
+                d1 (str): start date for sales count.
+                d2 (str): end date for sales count.
+
+            Yields:
+                sku, frame (pd.Dataframe): item and its sales with sku column, in order of arrival.
+        """
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            # only a few items per worker are submitted ahead, frames are released as soon as they are yielded
+            items = iter(sku_list)
+            futures = {}
+            for sku in itertools.islice(items, self.max_workers * 2):
+                futures[executor.submit(self._get_sku_sales, sku, d1, d2)] = sku
+            done_items = 0
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                while done:
+                    future = done.pop()
+                    sku = futures.pop(future)
+                    frame = future.result()
+                    frame.insert(0, 'sku', sku)
+                    for next_sku in itertools.islice(items, 1):
+                        futures[executor.submit(self._get_sku_sales, next_sku, d1, d2)] = next_sku
+                    done_items = done_items + 1
+                    self._notify(unit='item', done=done_items, total=len(sku_list))
+                    yield sku, frame
+        finally:
+            # stop waiting requests if loading is interrupted
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def load_sales(self, sku_list, start_date, end_date, save_path, output='parquet', batch_size=500,
+                   manifest=None):
+        """
+            Load sales of all items into one long table (sku, date, metrics) written by batches to parquet dataset
+            or csv file. Written items are recorded in the manifest, so interrupted loading is resumed from the
+            items which are not written yet.
+
+            Args:
+                sku_list (list): list of target items.
+                start_date (str): start date for sales count.
+                end_date (str): end date for sales count.
+                save_path (str): path of the result without extension (directory for parquet).
+                output (str): 'parquet' or 'csv'. Default 'parquet'
+                batch_size (int): number of items written at once.
+                manifest (Manifest): manifest of written items. Default save_path + '_manifest.json'.
+
+            Returns:
+                rows (int): number of written rows.
+        """
+        if manifest is None:
+            manifest = Manifest(save_path + '_manifest.json')
+        target = self.request + '/sales/' + start_date + ' ' + end_date
+        done = manifest.get(target)
+        sku_list = [sku for sku in dict.fromkeys(sku_list) if str(sku) not in done]
+        if output == 'parquet':
+            # part of the batch which was written but not recorded in the manifest is overwritten on resume
+            sink = ParquetSink(save_path, marketplace=self.request)
+        else:
+            # rows appended after the last manifest save are cut off, their items are loaded again
+            sink = CsvSink(save_path + '.csv', append=len(done) > 0, size=manifest.get_offset(target))
+        # part numbers continue after already written items, so resumed batches don't overwrite old ones
+        part = len(done)
+        frames = []
+        skus = []
+        for sku, frame in tqdm(self._iter_sku_sales(sku_list, start_date, end_date), total=len(sku_list)):
+            frames.append(frame)
+            skus.append(str(sku))
+            if len(skus) >= batch_size:
+                self._write_sales(sink, frames, skus, (start_date, end_date), part, manifest, target)
+                part = part + len(skus)
+                frames = []
+                skus = []
+        if skus:
+            self._write_sales(sink, frames, skus, (start_date, end_date), part, manifest, target)
+        with self.metrics.timer('write'):
+            sink.close()
+        return sink.rows
+
+    def _write_sales(self, sink, frames, skus, window, part, manifest, target):
+        """
+            Write batch of item sales and record its items in the manifest. Csv file size is saved with the items,
+            so resumed loading drops rows which were written but not recorded.
+            Args:
+                sink: CsvSink or ParquetSink of the result.
+                frames (list): sales frames of the items.
+                skus (list): items of the batch as strings.
+                window (tuple): pair of dates of the sales.
+                part (int): number of items written before the batch.
+                manifest (Manifest): manifest of written items.
+                target (str): manifest target of the load.
 
+            Returns:
+                None
+        """
+        with self.metrics.timer('write'):
+            sink.write(pd.concat(frames, ignore_index=True), window, part)
+        offset = os.path.getsize(sink.file) if isinstance(sink, CsvSink) and os.path.isfile(sink.file) else None
+        manifest.add_many(target, skus, offset=offset)
 
     def load_by_SKU(self, save_directory, start_date, end_date, sku_list, load_info=False, load_sales=False,
-                    db_connect=False):
+                    db_connect=False, output=None):
         """
             Loading selected data - bace info or/and sales - obout sku in provided file or single sku.
 
@@ -411,10 +1398,13 @@ class requ_Mpstats:
                 sku_list (): path to file with sku or single sku item.
                 load_info (bool): if true load info about sku. Default False.
                 load_sales (bool) if true load sales to sku. Default False.
-                db_connect (bool) if true load sales to sku. Default False.
+                db_connect (bool) if true loaded data is returned instead of saving. Default False.
+                output (str): 'parquet' or 'csv' to save sales of all sku into one resumable table
+                    (see load_sales), None - one xlsx file for every sku. Default None.
 
             Returns:
-                None
+                info_frame, sales_info (pd.Dataframe): with db_connect info and sales of all sku (None if they
+                    are not loaded), else None.
 
          """
         if os.path.isfile(sku_list):
@@ -428,29 +1418,28 @@ class requ_Mpstats:
             sku_list = []
             sku_list.append(sku_item)
 
+        info_frame = None
+        sales_info = None
         if load_info:
-            index = 0
-            step = 199
-            info_frame = pd.DataFrame()
-            while index < len(sku_list):
-                temp_list = sku_list[index:index + step]
-                temp = self._get_sku_info(temp_list)
-                info_frame = pd.concat([info_frame, temp], ignore_index=True)
-                index = index + step + 1
-                if (index + step + 1) > len(sku_list):
-                    step = len(sku_list) - index
-            if db_connect:
-                return info_frame
-            else:
-                info_frame.to_excel(save_directory + '/SKU\'s info.xlsx')
+            info_frame = self.load_sku_info(sku_list)
+            if not db_connect:
+                with self.metrics.timer('write'):
+                    info_frame.to_excel(save_directory + '/SKU\'s info.xlsx')
 
         if load_sales:
-            save_directory = save_directory + '\\sales'
-            if not os.path.exists(os.path.normpath(save_directory)):
+            save_directory = os.path.join(save_directory, 'sales')
+            if not db_connect and not os.path.exists(os.path.normpath(save_directory)):
                 os.makedirs(save_directory)
-            for sku in sku_list:
-                sales_info = self._get_sku_sales(sku=sku, d1=start_date, d2=end_date)
-                sales_info.to_excel(save_directory + '/' + str(sku) + '_sale.xlsx')
+            if db_connect:
+                sales_info = pd.concat([frame for sku, frame in self._iter_sku_sales(sku_list, start_date, end_date)],
+                                       ignore_index=True)
+            elif output is not None:
+                self.load_sales(sku_list, start_date, end_date, save_directory + '/sales ' + start_date + '-' +
+                                end_date, output=output)
+            else:
+                for sku, sales_info in self._iter_sku_sales(sku_list, start_date, end_date):
+                    with self.metrics.timer('write'):
+                        sales_info.drop(columns='sku').to_excel(save_directory + '/' + str(sku) + '_sale.xlsx')
         if db_connect:
             return info_frame, sales_info
 
@@ -1,18 +1,45 @@
 import tkinter as tk
 import os
+import time
+import queue
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import filedialog
 from tkinter import messagebox
-from API_Mpstats import requ_Mpstats
+from tkinter import ttk
+from API_Mpstats import requ_Mpstats, TokenBucket, LoadCancelled
 from tkcalendar import DateEntry
-from db_wb import update_brands
+
+
+class LoadJob:
+    """One background load: its api client, widgets and last progress"""
+
+    def __init__(self, title, api):
+        self.title = title
+        self.api = api
+        self.future = None
+        self.state = 'waiting'
+        self.started = None
+        self.info = {}
+        self.progressbar = None
+        self.status_label = None
+        self.cancel_button = None
 
 
 class App(tk.Frame):
-    def __init__(self, master):
+    def __init__(self, master, max_loads=3):
         super().__init__(master)
         self.master = master
+        # loads are executed by background workers, so the window is not frozen while data is loading.
+        # Workers send progress and state to the queue, main thread reads it and updates the widgets.
+        self.executor = ThreadPoolExecutor(max_workers=max_loads)
+        self.events = queue.Queue()
+        self.jobs = []
+        self.loads_window = None
+        # one limiter for all loads keeps the api rate when several loads run at once
+        self.limiter = TokenBucket(rate=1.0, capacity=max_loads)
         self.grid()
         self.create_widgets()
+        self.after(200, self.poll_events)
 
     def create_widgets(self):
         """Main window with load from api and load from files blocks"""
@@ -59,7 +86,7 @@ class App(tk.Frame):
         self.sep_files_checkbox.grid(row=1, column=4, sticky=tk.W)
 
         # quit button
-        self.quit_button = tk.Button(self, text="Quit", command=self.master.destroy)
+        self.quit_button = tk.Button(self, text="Quit", command=self.quit_app)
         self.quit_button.grid(row=3, column=2)
 
         # button for new window for sku loading
@@ -185,13 +212,11 @@ class App(tk.Frame):
         d1 = self.date_entry_start.get()
         d2 = self.date_entry_end.get()
         sep_files = self.sep_files_var.get()
-        if self.wb_oz_var.get() == 'wb':
-            api_connect = requ_Mpstats()
-        else:
-            api_connect = requ_Mpstats(request='oz')
         if category is not None:
-            api_connect.get_cat_by_dates(category_string=category, start_date=d1, end_date=d2,
-                                         save_directory=save_directory, separate_files=sep_files)
+            self.submit_load('Category ' + category + ' ' + d1 + ' - ' + d2, self.wb_oz_var.get(),
+                             lambda api: api.get_cat_by_dates(category_string=category, start_date=d1, end_date=d2,
+                                                              save_directory=save_directory,
+                                                              separate_files=sep_files))
 
     def browse_save_directory(self):
         """Get dir to save loaded files"""
@@ -211,16 +236,18 @@ class App(tk.Frame):
         d2 = self.date_entry_end.get()
         save_directory = self.save_entry.get()
         wb_oz_var=self.wb_oz_var.get()
-        if wb_oz_var == 'wb':
-            api_connect = requ_Mpstats()
-        else:
-            api_connect = requ_Mpstats(request='oz')
         if brand is not None:
             if db_connect:
-                update_brands(table_name="brand_"+brand,brand_string=brand, startdate=d1, enddate=d2,wb_oz_var=wb_oz_var)
+                # database module connects to database.txt, it is imported only for database loads
+                from db_wb import update_brands
+                self.submit_load('Brand ' + brand + ' to database', wb_oz_var,
+                                 lambda api: update_brands(table_name="brand_" + brand, brand_string=brand,
+                                                           startdate=d1, enddate=d2, wb_oz_var=wb_oz_var, api=api))
             else:
-                api_connect.get_brand_by_dates(brand_string=brand, start_date=d1, end_date=d2,
-                                               save_directory=save_directory, db_connect=db_connect)
+                self.submit_load('Brand ' + brand + ' ' + d1 + ' - ' + d2, wb_oz_var,
+                                 lambda api: api.get_brand_by_dates(brand_string=brand, start_date=d1, end_date=d2,
+                                                                    save_directory=save_directory,
+                                                                    db_connect=db_connect))
 
     def browse_SKU_file(self):
         """Get file with list of SKU to load from api"""
@@ -232,35 +259,170 @@ class App(tk.Frame):
 
     def load_SKU(self):
         """Load SKU info from api. Requires file with SKU list or single SKU. """
-        save_directory = self.save_entry.get() + '\\SKU_list'
+        save_directory = os.path.join(self.save_entry.get(), 'SKU_list')
         if not os.path.exists(os.path.normpath((save_directory))):
             os.makedirs(save_directory)
         SKU_list = self.SKU_entry.get()
         db_connect = self.db_connect_var.get()
         d1 = self.date_entry_start.get()
         d2 = self.date_entry_end.get()
-        if self.wb_oz_var.get() == 'wb':
-            api_connect = requ_Mpstats()
-        else:
-            api_connect = requ_Mpstats(request='oz')
-        if SKU_list is not None:
+        load_info = self.load_info_var.get()
+        load_sales = self.load_sales_var.get()
+
+        def load(api_connect):
             if db_connect:
                 self.frame = api_connect.load_by_SKU(sku_list=SKU_list, start_date=d1, end_date=d2,
-                                                     save_directory=save_directory, load_info=self.load_info_var.get(),
-                                                     load_sales=self.load_sales_var.get(), db_connect=db_connect)
+                                                     save_directory=save_directory, load_info=load_info,
+                                                     load_sales=load_sales, db_connect=db_connect)
             else:
                 api_connect.load_by_SKU(sku_list=SKU_list, start_date=d1, end_date=d2, save_directory=save_directory,
-                                        load_info=self.load_info_var.get(), load_sales=self.load_sales_var.get())
-        print('Finished')
+                                        load_info=load_info, load_sales=load_sales)
+            print('Finished')
 
-
-
-root = tk.Tk()
-root.title("Data Processing App")
-root.geometry("550x100")
-root.resizable(False, False)
-root.columnconfigure(3, minsize=50, weight=1)
-root.columnconfigure(1, minsize=50, weight=1)
-
-app = App(master=root)
-app.mainloop()
+        if SKU_list is not None:
+            self.submit_load('SKU ' + os.path.basename(SKU_list) + ' ' + d1 + ' - ' + d2, self.wb_oz_var.get(), load)
+
+    def submit_load(self, title, marketplace, load):
+        """
+            Run load in background worker and add it to the loads window.
+            Args:
+                title (str): load name in the loads window.
+                marketplace (str): 'wb' or 'oz'.
+                load: function getting requ_Mpstats client and loading the data.
+
+            Returns:
+                job (LoadJob): submitted load.
+        """
+        api = requ_Mpstats(request=marketplace, max_workers=4, limiter=self.limiter)
+        job = LoadJob(title, api)
+        # progress callback is called in worker threads, so it only puts progress to the queue
+        api.progress = lambda info: self.events.put((job, 'progress', info))
+        self.jobs.append(job)
+        self.add_job_row(job)
+        job.future = self.executor.submit(self.run_load, job, load)
+        return job
+
+    def run_load(self, job, load):
+        """Execute load in worker thread and report its state to the queue"""
+        self.events.put((job, 'state', 'running'))
+        try:
+            load(job.api)
+        except LoadCancelled:
+            self.events.put((job, 'state', 'cancelled'))
+        except Exception as e:
+            self.events.put((job, 'error', repr(e)))
+        else:
+            self.events.put((job, 'state', 'done'))
+        finally:
+            job.api.close()
+
+    def open_loads_window(self):
+        """Window with progress, throughput and cancel button of every load"""
+        if self.loads_window is None or not self.loads_window.winfo_exists():
+            self.loads_window = tk.Toplevel(self.master)
+            self.loads_window.title("Loads")
+            self.loads_window.columnconfigure(2, minsize=300, weight=1)
+            for row, job in enumerate(self.jobs):
+                self.create_job_widgets(job, row)
+        return self.loads_window
+
+    def add_job_row(self, job):
+        """Add widgets of the new load to the loads window"""
+        if self.loads_window is None or not self.loads_window.winfo_exists():
+            self.open_loads_window()
+        else:
+            self.create_job_widgets(job, len(self.jobs) - 1)
+        self.loads_window.lift()
+
+    def create_job_widgets(self, job, row):
+        """Title, progress bar, status and cancel button of the load in row of the loads window"""
+        tk.Label(self.loads_window, text=job.title).grid(row=row, column=0, sticky=tk.W)
+        job.progressbar = ttk.Progressbar(self.loads_window, length=200, mode='determinate')
+        job.progressbar.grid(row=row, column=1)
+        job.status_label = tk.Label(self.loads_window, text=job.state, anchor=tk.W)
+        job.status_label.grid(row=row, column=2, sticky=tk.W)
+        job.cancel_button = tk.Button(self.loads_window, text="Cancel", command=lambda: self.cancel_load(job))
+        job.cancel_button.grid(row=row, column=3)
+        self.update_job_widgets(job)
+
+    def cancel_load(self, job):
+        """Cancel waiting or running load"""
+        if job.future is not None and job.future.cancel():
+            job.state = 'cancelled'
+        elif job.state in ('waiting', 'running'):
+            job.api.cancel()
+            job.state = 'cancelling'
+        self.update_job_widgets(job)
+
+    def poll_events(self):
+        """Read progress and states of loads from the queue and update the loads window"""
+        changed = set()
+        while True:
+            try:
+                job, event, value = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if event == 'progress':
+                job.info = value
+            elif event == 'error':
+                job.state = 'failed'
+                messagebox.showerror("Load failed", job.title + '\n' + value)
+            else:
+                if value == 'running':
+                    job.started = time.monotonic()
+                job.state = value
+            changed.add(job)
+        for job in changed:
+            self.update_job_widgets(job)
+        self.after(200, self.poll_events)
+
+    def update_job_widgets(self, job):
+        """Show state, progress and throughput of the load"""
+        if job.status_label is None or not job.status_label.winfo_exists():
+            return
+        info = job.info
+        text = job.state
+        if info:
+            job.progressbar['maximum'] = max(info['total'], 1)
+            job.progressbar['value'] = info['done']
+            text = text + ': ' + str(info['done']) + '/' + str(info['total']) + ' ' + info['unit'] + 's'
+            if 'windows' in info:
+                text = text + ', ' + str(info['windows_done']) + '/' + str(info['windows']) + ' periods'
+            if 'rows' in info:
+                text = text + ', ' + str(info['rows']) + ' rows'
+            if job.started is not None and job.state == 'running':
+                seconds = max(time.monotonic() - job.started, 1e-6)
+                if 'rows' in info:
+                    text = text + ', ' + str(round(info['rows'] / seconds)) + ' rows/s'
+                else:
+                    text = text + ', ' + str(round(info['done'] / seconds, 1)) + ' ' + info['unit'] + 's/s'
+        job.status_label['text'] = text
+        if job.state not in ('waiting', 'running'):
+            job.cancel_button['state'] = tk.DISABLED
+
+    def quit_app(self):
+        """Cancel all loads and close the application"""
+        for job in self.jobs:
+            if job.state in ('waiting', 'running'):
+                job.future.cancel()
+                job.api.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.master.destroy()
+
+
+
+def main():
+    """Create main window and run the application"""
+    root = tk.Tk()
+    root.title("Data Processing App")
+    root.geometry("550x100")
+    root.resizable(False, False)
+    root.columnconfigure(3, minsize=50, weight=1)
+    root.columnconfigure(1, minsize=50, weight=1)
+
+    app = App(master=root)
+    app.mainloop()
+
+
+if __name__ == '__main__':
+    main()
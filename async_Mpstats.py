@@ -0,0 +1,297 @@
+import json
+import time
+import random
+import asyncio
+import aiohttp
+import pandas as pd
+from API_Mpstats import requ_Mpstats, LoadCancelled, RETRY_STATUSES
+from decoder import loads, records_to_frame
+
+
+class AsyncMpstats(requ_Mpstats):
+    """
+        Asyncio client for Mpstats api. Shares parameters, limiter, cache and frame processing with requ_Mpstats,
+        requests go through one aiohttp connection pool and no more than max_concurrency of them are sent at once.
+
+        Usage:
+            async with AsyncMpstats(max_concurrency=50) as api:
+                frame = await api.cat_by_dates('Дом/Кухня', '2023-01-01', '2023-03-31')
+    """
+
+    def __init__(self, request='wb', max_concurrency=20, **kwargs):
+        """
+            Args:
+                request (str): marketplace, 'wb' or 'oz'.
+                max_concurrency (int): maximal number of requests in flight.
+                **kwargs: other requ_Mpstats parameters (rate_limit, limiter, retries, backoff, timeout, cache).
+        """
+        super().__init__(request=request, max_workers=max_concurrency, **kwargs)
+        self.max_concurrency = max_concurrency
+        self.http = None
+        self.semaphore = None
+        # futures of requests in flight by request key, identical requests await the same future
+        self._in_flight = {}
+
+    async def __aenter__(self):
+        self._open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    def _open(self):
+        """Create aiohttp session and semaphore in the running event loop"""
+        if self.http is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self.http = aiohttp.ClientSession(connector=connector, headers=self.headers,
+                                              timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def aclose(self):
+        """Close aiohttp session and the http session of the base class"""
+        if self.http is not None:
+            await self.http.close()
+            self.http = None
+        self.close()
+
+    async def _execute_async(self, method, url, params=None, data=None):
+        """
+            Async version of requ_Mpstats._execute: waits for the limiter and semaphore, retries 429/5xx responses
+            and connection errors with exponential backoff and jitter, respects Retry-After header.
+            Args:
+                method (str): 'GET' or 'POST'.
+                url (str): request url.
+                params (dict): query parameters.
+                data (str): request body.
+
+            Returns:
+                content (bytes): response body.
+        """
+        self._open()
+        endpoint = self._endpoint_name(url)
+        target = (params or {}).get('path')
+        if target is not None:
+            target = self.request + '/' + target
+        attempt = 0
+        while True:
+            if self.cancelled.is_set():
+                raise LoadCancelled('Loading is cancelled')
+            with self.metrics.timer('limiter'):
+                await self.limiter.acquire_async()
+            pause = None
+            try:
+                async with self.semaphore:
+                    start = time.perf_counter()
+                    try:
+                        async with self.http.request(method, url, params=params, data=data) as response:
+                            content = await response.read()
+                    except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                        self.metrics.request(endpoint, None, time.perf_counter() - start, target=target)
+                        raise
+                    seconds = time.perf_counter() - start
+                    self.metrics.add_time('network', seconds)
+                    self.metrics.request(endpoint, response.status, seconds, len(content), target)
+                    if response.status not in RETRY_STATUSES or attempt >= self.retries:
+                        response.raise_for_status()
+                        return content
+                    pause = self._retry_after(response)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= self.retries:
+                    raise
+            if pause is None:
+                pause = self.backoff * 2 ** attempt
+                pause = pause + random.uniform(0, pause)
+            self.metrics.retry(endpoint)
+            with self.metrics.timer('backoff'):
+                await asyncio.sleep(pause)
+            attempt += 1
+
+    async def _cached_request_async(self, method, url, d2, params=None, data=None):
+        """
+            Execute request through the response cache if it is enabled, identical requests in flight share one
+            network call.
+            Args:
+                method (str): 'GET' or 'POST'.
+                url (str): request url.
+                d2 (str): end date of the requested window.
+                params (dict): query parameters.
+                data (str): request body.
+
+            Returns:
+                content (bytes): response body.
+        """
+        key = {'url': url, 'params': params, 'data': data}
+        if self.cache is not None:
+            content = self.cache.get(key, d2)
+            if content is not None:
+                self.metrics.cache_hit(self._endpoint_name(url))
+                return content
+        flight_key = json.dumps(key, sort_keys=True, ensure_ascii=False)
+        if flight_key in self._in_flight:
+            content = await asyncio.shield(self._in_flight[flight_key])
+            self.metrics.coalesced(self._endpoint_name(url))
+            return content
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[flight_key] = future
+        try:
+            content = await self._execute_async(method, url, params=params, data=data)
+            if self.cache is not None:
+                self.cache.set(key, content)
+            future.set_result(content)
+            return content
+        except BaseException as e:
+            future.set_exception(e)
+            # error is raised by the caller, retrieving it here avoids warning if nobody else awaits the future
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[flight_key]
+
+    async def sku_info(self, sku):
+        """
+            Load current info about provided SKU (up to 200 items)
+            Args:
+                sku (list): list of target items.
+
+            Returns:
+                df (pd.Dataframe): frame of data about target items.
+        """
+        url = self.url + self.request + "/get/items/batch"
+        content = await self._execute_async('POST', url, data=json.dumps({'ids': sku}))
+        with self.metrics.timer('parse'):
+            df = records_to_frame(loads(content))
+            if 'photos' in df.columns:
+                df['photos'] = df['photos'].map(lambda photos: photos[0]['f'] if isinstance(photos, list) and photos
+                                                else None)
+        return df
+
+    async def load_sku_info(self, sku_list):
+        """
+            Load current info about any number of items, all batches are requested concurrently.
+            Args:
+                sku_list (list): list of target items.
+
+            Returns:
+                df (pd.Dataframe): frame of data about target items in order of the batches.
+        """
+        frames = await asyncio.gather(*[self.sku_info(batch) for batch in self._plan_batches(sku_list)])
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    async def sku_sales(self, sku, d1, d2):
+        """
+            Load sales for one item (sku) from date 1 to date 2
+            Args:
+                sku (int): SKU of target item.
+                d1 (str): start date for sales count.
+                d2 (str): end date for sales count.
+
+            Returns:
+                df (pd.Dataframe): frame of item sales with sku column.
+        """
+        url = self.url + self.request + "/get/item/" + str(sku) + '/sales'
+        content = await self._cached_request_async('GET', url, d2, params={'d1': d1, 'd2': d2})
+        with self.metrics.timer('parse'):
+            df = records_to_frame(loads(content))
+        df.insert(0, 'sku', sku)
+        return df
+
+    async def sales_by_sku(self, sku_list, d1, d2):
+        """
+            Load sales of all items into one long table.
+            Args:
+                sku_list (list): list of target items.
+                d1 (str): start date for sales count.
+                d2 (str): end date for sales count.
+
+            Returns:
+                df (pd.Dataframe): frame of sales (sku, date, metrics).
+        """
+        frames = await asyncio.gather(*[self.sku_sales(sku, d1, d2) for sku in dict.fromkeys(sku_list)])
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    async def _page_request_async(self, kind, d1, d2, path, startRow, endRow):
+        """
+            Load one page of category or brand data from d1 to d2.
+
+            Returns:
+                data (list), total (int): loaded rows and total number of rows in the window.
+        """
+        url, params, data = self._page_params(kind, d1, d2, path, startRow, endRow)
+        content = await self._cached_request_async('POST', url, d2, params=params, data=json.dumps(data))
+        with self.metrics.timer('parse'):
+            json_data = loads(content)
+        self.metrics.page(self._endpoint_name(url), len(json_data['data']))
+        return json_data['data'], json_data['total']
+
+    async def window(self, kind, d1, d2, path):
+        """
+            Load all pages of category or brand data from d1 to d2, pages after the first are requested
+            concurrently.
+            Args:
+                kind (str): 'category' or 'brand'.
+                d1 (str): start date for sales count.
+                d2 (str): end date for sales count.
+                path (str): category or brand name as it exists on the marketplace.
+
+            Returns:
+                frame (pd.Dataframe): frame of window data with date column.
+        """
+        records, total = await self._page_request_async(kind, d1, d2, path, 0, self.page_size)
+        pages = await asyncio.gather(*[self._page_request_async(kind, d1, d2, path, row, row + self.page_size)
+                                       for row in range(self.page_size, total, self.page_size)])
+        for data, _ in pages:
+            records.extend(data)
+        return self._window_frame(kind, d2, records)
+
+    async def category(self, d1, d2, category_string):
+        """Load products of the category from d1 to d2, same frame as requ_Mpstats.category_request"""
+        return await self.window('category', d1, d2, category_string)
+
+    async def brand(self, d1, d2, brand_string):
+        """Load products of the brand from d1 to d2, same frame as requ_Mpstats.brand_request"""
+        return await self.window('brand', d1, d2, brand_string)
+
+    async def _by_dates(self, kind, path, dates):
+        """
+            Load all windows concurrently and concatenate them in date order.
+
+            Returns:
+                frame (pd.Dataframe): data of all windows, None if there is no data.
+        """
+        frames = await asyncio.gather(*[self.window(kind, d1, d2, path) for d1, d2 in dates])
+        frames = [frame for frame in frames if frame.shape[0] != 0]
+        if not frames:
+            return None
+        return pd.concat(frames, sort=False, axis=0, ignore_index=True)
+
+    async def cat_by_dates(self, category_string, start_date, end_date):
+        """
+            Load category from start to end date with step 1 month.
+            Args:
+                category_string (str): category name as it exists on the marketplace.
+                start_date (str): start date for sales count.
+                end_date (str): end date for sales count.
+
+            Returns:
+                frame (pd.Dataframe): data of all months, None if there is no data.
+        """
+        dates = self._date_list(start_date=start_date, end_date=end_date)
+        return await self._by_dates('category', category_string, dates)
+
+    async def brand_by_dates(self, brand_string, start_date, end_date):
+        """
+            Load brand from start to end date with step 1 week.
+            Args:
+                brand_string (str): brand name as it exists on the marketplace.
+                start_date (str): start date for sales count.
+                end_date (str): end date for sales count.
+
+            Returns:
+                frame (pd.Dataframe): data of all weeks, None if there is no data.
+        """
+        dates = self._date_list(start_date=start_date, end_date=end_date, interval=6)
+        return await self._by_dates('brand', brand_string, dates)
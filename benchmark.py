@@ -0,0 +1,316 @@
+import os
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+import io
+import pandas as pd
+import requests
+from API_Mpstats import requ_Mpstats
+from decoder import loads, records_to_frame
+from schema import prune_records, compact_frame, concat_frames
+from mock_server import MockMpstats
+from single_flight import SingleFlight
+from sinks import open_sink
+
+
+def measure(name, mock, function, memory=False):
+    """
+        Run function and measure wall time, requests to the mock server and optionally peak of python memory.
+        Args:
+            name (str): benchmark name.
+            mock (MockMpstats): running mock server.
+            function: function without arguments to run.
+            memory (bool): trace python allocations (several times slower, times are not comparable then).
+
+        Returns:
+            result (dict): name, seconds, peak memory in MB (None without memory) and request counts by endpoint.
+    """
+    counts = dict(mock.counts)
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    # status codes and progress bars of requ_Mpstats are not needed in benchmark output
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        function()
+    seconds = time.perf_counter() - start
+    peak = None
+    if memory:
+        peak = round(tracemalloc.get_traced_memory()[1] / 1024 ** 2, 1)
+        tracemalloc.stop()
+    requests = {key: value - counts.get(key, 0) for key, value in mock.counts.items() if value != counts.get(key, 0)}
+    return {'name': name, 'seconds': round(seconds, 3), 'peak_mb': peak,
+            'requests': requests}
+
+
+def run(total=12000, latency=0.02, error_rate=0.0, months=6, skus=1000, workers=(1, 8), output=None,
+        memory=False):
+    """
+        Run end-to-end benchmarks of get_cat_by_dates, get_brand_by_dates and load_by_SKU against local mock server.
+        Args:
+            total (int): rows in every category/brand window.
+            latency (float): delay of every mock response in seconds.
+            error_rate (float): share of 429 responses.
+            months (int): number of monthly windows of category and brand loads.
+            skus (int): number of sku for load_by_SKU.
+            workers (tuple): max_workers values to compare.
+            output (str): output format of category and brand loads (None - default xlsx/csv files).
+            memory (bool): measure peak of python memory with tracemalloc.
+
+        Returns:
+            results (list): list of benchmark results.
+    """
+    results = []
+    start_date = '2023-01-01'
+    end_date = (pd.Timestamp(start_date) + pd.DateOffset(months=months) - pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+    with MockMpstats(total=total, latency=latency, error_rate=error_rate) as mock, \
+            tempfile.TemporaryDirectory() as directory:
+        sku_file = os.path.join(directory, 'sku.csv')
+        pd.DataFrame({'sku': range(1, skus + 1)}).to_csv(sku_file, sep=';', index=False)
+        for max_workers in workers:
+            api = requ_Mpstats(max_workers=max_workers, rate_limit=0, backoff=0.05)
+            api.url = mock.url
+            suffix = ' workers=' + str(max_workers)
+            # every run writes into its own directory, otherwise resumable loads skip items saved by previous run
+            save_directory = os.path.join(directory, 'workers_' + str(max_workers))
+            os.makedirs(save_directory)
+            results.append(measure('get_cat_by_dates' + suffix, mock, lambda: api.get_cat_by_dates(
+                'Bench/Category', start_date, end_date, save_directory=save_directory, output=output), memory))
+            results.append(measure('get_brand_by_dates' + suffix, mock, lambda: api.get_brand_by_dates(
+                'Bench', start_date, end_date, save_directory=save_directory, output=output), memory))
+            results.append(measure('load_by_SKU info' + suffix, mock, lambda: api.load_by_SKU(
+                save_directory, start_date, end_date, sku_file, load_info=True), memory))
+            results.append(measure('load_by_SKU sales' + suffix, mock, lambda: api.load_by_SKU(
+                save_directory, start_date, end_date, sku_file, load_sales=True, output='csv'), memory))
+            api.close()
+    for result in results:
+        count = sum(result['requests'].values())
+        result['requests_per_second'] = round(count / result['seconds'], 1) if result['seconds'] else None
+    return results
+
+
+def run_items(skus=10000, latency=0.02, workers=(1, 8), batch_size=200):
+    """
+        Benchmark of load_sku_info (items/batch requests) against local mock server.
+        Args:
+            skus (int): number of items to load.
+            latency (float): delay of every mock response in seconds.
+            workers (tuple): max_workers values to compare.
+            batch_size (int): items in one request.
+
+        Returns:
+            results (list): list of benchmark results with items per second.
+    """
+    results = []
+    with MockMpstats(latency=latency) as mock:
+        for max_workers in workers:
+            api = requ_Mpstats(max_workers=max_workers, rate_limit=0, single_flight=SingleFlight())
+            api.url = mock.url
+            api.info_batch_size = batch_size
+            result = measure('load_sku_info workers=' + str(max_workers), mock,
+                             lambda: api.load_sku_info(list(range(1, skus + 1))))
+            result['items_per_second'] = round(skus / result['seconds'], 1) if result['seconds'] else None
+            results.append(result)
+            api.close()
+    return results
+
+
+def fixture_page(rows=5000, graph_points=30):
+    """
+        Generate category page like api response: flat fields, nested seller and subject, graph lists.
+        Args:
+            rows (int): number of rows in the page.
+            graph_points (int): length of graph lists.
+
+        Returns:
+            content (bytes): encoded json page.
+    """
+    data = []
+    for i in range(rows):
+        graph = [(i + point) % 31 for point in range(graph_points)]
+        data.append({'id': 10000000 + i, 'name': 'Product ' + str(i), 'brand': 'Brand ' + str(i % 97),
+                     'seller': {'id': i % 389, 'name': 'Seller ' + str(i % 389)},
+                     'subject': {'id': i % 13, 'name': 'Subject ' + str(i % 13)},
+                     'price': 100 + i % 4900, 'rating': 4 + (i % 10) / 10, 'comments': i % 2000,
+                     'sales': i % 500, 'revenue': (i % 500) * (100 + i % 4900), 'balance': i % 1000,
+                     'graph': graph, 'price_graph': graph})
+    return json.dumps({'total': rows, 'data': data}, ensure_ascii=False).encode('utf8')
+
+
+def run_decode(rows=5000, repeat=10):
+    """
+        Microbenchmark of response decoding and frame building on generated fixture page: json.loads and
+        pd.json_normalize against decoder.loads and decoder.records_to_frame.
+        Args:
+            rows (int): number of rows in the page.
+            repeat (int): number of runs, mean time is reported.
+
+        Returns:
+            results (list): list of benchmark results with mean milliseconds.
+    """
+    content = fixture_page(rows)
+    cases = [('decode json.loads', lambda: json.loads(content)),
+             ('decode ' + loads.__module__ + '.loads', lambda: loads(content)),
+             ('frame json.loads + json_normalize', lambda: pd.json_normalize(json.loads(content)['data'])),
+             ('frame loads + records_to_frame', lambda: records_to_frame(loads(content)['data']))]
+    results = []
+    for name, function in cases:
+        function()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            function()
+        seconds = time.perf_counter() - start
+        results.append({'name': name, 'seconds': round(seconds, 3), 'ms': round(seconds / repeat * 1000, 1),
+                        'page_mb': round(len(content) / 1024 ** 2, 2)})
+    return results
+
+
+def run_session(count=300, latency=0.0):
+    """
+        Benchmark of per-request latency of sequential sales requests to local mock server: new connection for
+        every request (requests.get) against pooled keep-alive connection of requests.Session used by
+        requ_Mpstats.
+        Args:
+            count (int): number of requests of every case.
+            latency (float): delay of every mock response in seconds.
+
+        Returns:
+            results (list): list of benchmark results with mean milliseconds per request.
+    """
+    results = []
+    with MockMpstats(latency=latency) as mock, requests.Session() as session:
+        url = mock.url + 'wb/get/item/1/sales'
+        params = {'d1': '2023-01-01', 'd2': '2023-01-07'}
+        for name, get in (('sales requests.get', requests.get), ('sales session.get', session.get)):
+            get(url, params=params).raise_for_status()
+            start = time.perf_counter()
+            for _ in range(count):
+                get(url, params=params).raise_for_status()
+            seconds = time.perf_counter() - start
+            results.append({'name': name, 'seconds': round(seconds, 3),
+                            'ms_per_request': round(seconds / count * 1000, 2)})
+    return results
+
+
+def synthetic_frame(rows):
+    """Frame of generated product rows with 8 columns of mixed types"""
+    index = pd.RangeIndex(rows)
+    return pd.DataFrame({'id': 10000000 + index, 'name': 'Product ' + index.astype(str),
+                         'brand': 'Brand ' + (index % 97).astype(str), 'price': 100 + index % 4900,
+                         'rating': 4 + (index % 10) / 10, 'sales': index % 500,
+                         'revenue': (index % 500) * (100 + index % 4900), 'date': '31.01.2023'})
+
+
+def _size(path):
+    """Size of file or of all files in directory in bytes"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(folder, file)) for folder, _, files in os.walk(path) for file in files)
+
+
+def run_sinks(rows=200000, page_size=5000, formats=('csv', 'parquet', 'xlsx')):
+    """
+        Benchmark of output sinks: frame is written page by page as by get_cat_by_dates(output=...), time of all
+        writes and close and size of the result are measured.
+        Args:
+            rows (int): number of rows of generated frame.
+            page_size (int): rows in one written page.
+            formats (tuple): sink formats (see sinks.open_sink), xlsx is much slower than the others.
+
+        Returns:
+            results (list): list of benchmark results with result size in MB.
+    """
+    frame = synthetic_frame(rows)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for output in formats:
+            save_path = os.path.join(directory, 'bench')
+            sink = open_sink(output, save_path)
+            window = ('2023-01-01', '2023-01-31')
+            start = time.perf_counter()
+            for row in range(0, rows, page_size):
+                sink.write(frame.iloc[row:row + page_size], window, row)
+            sink.close()
+            seconds = time.perf_counter() - start
+            path = save_path if output == 'parquet' else save_path + '.' + output
+            results.append({'name': 'sink ' + output + ' rows=' + str(rows), 'seconds': round(seconds, 3),
+                            'size_mb': round(_size(path) / 1024 ** 2, 1)})
+    return results
+
+
+def run_compact(rows=50000, page_size=5000):
+    """
+        Benchmark of memory of loaded data with default and compact dtypes (requ_Mpstats(compact=True)): pages of
+        generated fixture are converted to frames and concatenated, memory is measured with
+        memory_usage(deep=True).
+        Args:
+            rows (int): total number of rows.
+            page_size (int): rows in one page.
+
+        Returns:
+            results (list): list of benchmark results with bytes per row.
+    """
+    pages = [loads(fixture_page(min(page_size, rows - row)))['data'] for row in range(0, rows, page_size)]
+    cases = [('frame default', lambda: concat_frames([records_to_frame(page) for page in pages])),
+             ('frame compact', lambda: concat_frames([compact_frame(records_to_frame(prune_records(page)))
+                                                      for page in pages], downcast=True))]
+    results = []
+    for name, function in cases:
+        start = time.perf_counter()
+        frame = function()
+        seconds = time.perf_counter() - start
+        size = frame.memory_usage(index=True, deep=True).sum()
+        results.append({'name': name + ' rows=' + str(rows), 'seconds': round(seconds, 3),
+                        'bytes_per_row': round(size / frame.shape[0], 1), 'mb': round(size / 1024 ** 2, 1)})
+    return results
+
+
+def print_results(results):
+    """Print benchmark results, one line per result"""
+    for result in results:
+        fields = ['{0}={1}'.format(key, value) for key, value in result.items() if key not in ('name', 'seconds')]
+        print('{0:<40} {1:>9.3f} s  {2}'.format(result['name'], result['seconds'], '  '.join(fields)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='End-to-end benchmarks of requ_Mpstats against local mock api')
+    parser.add_argument('--total', type=int, default=12000, help='rows in every category/brand window')
+    parser.add_argument('--latency', type=float, default=0.02, help='delay of every response, seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of 429 responses')
+    parser.add_argument('--months', type=int, default=6, help='number of months to load')
+    parser.add_argument('--skus', type=int, default=1000, help='number of sku to load')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 8], help='max_workers values to compare')
+    parser.add_argument('--output', default=None, help='parquet, csv or xlsx')
+    parser.add_argument('--memory', action='store_true', help='measure peak of python memory (slow)')
+    parser.add_argument('--items', action='store_true',
+                        help='benchmark load_sku_info of --skus items instead of end-to-end loads')
+    parser.add_argument('--decode', action='store_true',
+                        help='microbenchmark of decoding and frame building of generated --rows page')
+    parser.add_argument('--session', action='store_true',
+                        help='per-request latency with and without keep-alive session (use with --latency 0)')
+    parser.add_argument('--sinks', nargs='*', default=None, choices=['csv', 'parquet', 'xlsx'],
+                        help='write time and size of --rows generated rows by output sinks (default all)')
+    parser.add_argument('--compact', action='store_true',
+                        help='bytes per row of --rows generated rows with default and compact dtypes')
+    parser.add_argument('--rows', type=int, default=None, help='rows of generated data of microbenchmarks')
+    parser.add_argument('--json', default=None, help='path to save results as json')
+    args = parser.parse_args()
+    if args.compact:
+        results = run_compact(rows=args.rows or 50000)
+    elif args.sinks is not None:
+        results = run_sinks(rows=args.rows or 200000, formats=tuple(args.sinks) or ('csv', 'parquet', 'xlsx'))
+    elif args.session:
+        results = run_session(latency=args.latency)
+    elif args.decode:
+        results = run_decode(rows=args.rows or 5000)
+    elif args.items:
+        results = run_items(skus=args.skus, latency=args.latency, workers=tuple(args.workers))
+    else:
+        results = run(total=args.total, latency=args.latency, error_rate=args.error_rate, months=args.months,
+                      skus=args.skus, workers=tuple(args.workers), output=args.output, memory=args.memory)
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf8') as f:
+            json.dump(results, f, indent=1)
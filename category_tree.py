@@ -0,0 +1,72 @@
+import pandas as pd
+
+
+def leaf_paths(paths, parent):
+    """
+        Find leaf categories of the subtree: paths under parent which have no children.
+        Args:
+            paths (list): all category paths of the marketplace ('Дом/Кухня/Посуда').
+            parent (str): path of subtree root.
+
+        Returns:
+            leaves (list): sorted leaf paths, [parent] if parent has no children, [] if parent is unknown.
+    """
+    subtree = {path for path in paths if path == parent or path.startswith(parent + '/')}
+    if not subtree:
+        return []
+    # every proper prefix of a path is a category with children
+    parents = set()
+    for path in subtree:
+        parts = path.split('/')
+        for level in range(1, len(parts)):
+            parents.add('/'.join(parts[:level]))
+    return sorted(subtree - parents)
+
+
+def tree_nodes(leaves, parent):
+    """
+        Get all nodes of the subtree from parent down to the leaves.
+        Args:
+            leaves (list): leaf paths under parent.
+            parent (str): path of subtree root.
+
+        Returns:
+            nodes (list): sorted paths of parent, intermediate categories and leaves.
+    """
+    depth = parent.count('/') + 1
+    nodes = {parent}
+    for leaf in leaves:
+        parts = leaf.split('/')
+        for level in range(depth, len(parts) + 1):
+            nodes.add('/'.join(parts[:level]))
+    return sorted(nodes)
+
+
+def aggregate_tree(frame, parent, value_columns=('revenue', 'sales'), key='id'):
+    """
+        Compute aggregates of every node of the subtree from loaded leaf data, so parent categories don't have to
+        be loaded. Product listed in several leaves is counted once in their common parents.
+        Args:
+            frame (pd.Dataframe): leaf data with path (leaf path), window (end date of the window), key and value
+                columns.
+            parent (str): path of subtree root.
+            value_columns (tuple): columns to sum.
+            key (str): product id column.
+
+        Returns:
+            aggregates (pd.Dataframe): path, level, leaf, window, sums of value columns and sku (number of
+                products) for every node and window.
+    """
+    value_columns = [col for col in value_columns if col in frame.columns]
+    leaves = list(frame['path'].unique())
+    results = []
+    for node in tree_nodes(leaves, parent):
+        members = [path for path in leaves if path == node or path.startswith(node + '/')]
+        part = frame[frame['path'].isin(members)].drop_duplicates(subset=['window', key])
+        aggregates = part.groupby('window', sort=True).agg(
+            **{col: (col, 'sum') for col in value_columns}, sku=(key, 'count')).reset_index()
+        aggregates.insert(0, 'path', node)
+        aggregates.insert(1, 'level', node.count('/'))
+        aggregates.insert(2, 'leaf', node in leaves)
+        results.append(aggregates)
+    return pd.concat(results, ignore_index=True)
@@ -0,0 +1,77 @@
+import os
+import gzip
+import json
+import shutil
+import hashlib
+import threading
+from manifest import Manifest
+
+
+class Checkpoint:
+    """
+        Spill directory with loaded pages of one load target. Every page is written atomically and recorded in the
+        manifest, so interrupted loading with the same arguments continues from the first page which is not loaded.
+    """
+
+    def __init__(self, directory, target):
+        """
+            Args:
+                directory (str): root directory of checkpoints.
+                target (str): load target key, e.g. 'wb/category/Дом/Кухня 2022-04-01 2023-03-01'.
+        """
+        self.target = target
+        self.directory = os.path.join(directory, hashlib.sha1(target.encode('utf8')).hexdigest())
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        self.manifest = Manifest(os.path.join(self.directory, 'manifest.json'))
+        self.done = self.manifest.get(target)
+        self._lock = threading.Lock()
+
+    def _file(self, unit):
+        """Get spill file path of the unit"""
+        return os.path.join(self.directory, unit.replace(' ', '_') + '.json.gz')
+
+    def load(self, d1, d2, startRow):
+        """
+            Get saved page.
+            Args:
+                d1 (str): start date of the window.
+                d2 (str): end date of the window.
+                startRow (int): first row of the page.
+
+            Returns:
+                data (list), total (int): saved rows and total rows of the window, None if page is not saved.
+        """
+        unit = d1 + ' ' + d2 + ' ' + str(startRow)
+        with self._lock:
+            if unit not in self.done:
+                return None
+        with gzip.open(self._file(unit), 'rt', encoding='utf8') as f:
+            page = json.load(f)
+        return page['data'], page['total']
+
+    def save(self, d1, d2, startRow, data, total):
+        """
+            Save loaded page and record it in the manifest.
+            Args:
+                d1 (str): start date of the window.
+                d2 (str): end date of the window.
+                startRow (int): first row of the page.
+                data (list): loaded rows.
+                total (int): total rows of the window.
+
+            Returns:
+                None
+        """
+        unit = d1 + ' ' + d2 + ' ' + str(startRow)
+        file = self._file(unit)
+        with gzip.open(file + '.tmp', 'wt', encoding='utf8') as f:
+            json.dump({'data': data, 'total': total}, f, ensure_ascii=False)
+        os.replace(file + '.tmp', file)
+        self.manifest.add(self.target, unit)
+        with self._lock:
+            self.done.add(unit)
+
+    def clear(self):
+        """Remove all saved pages of the target after successful loading"""
+        shutil.rmtree(self.directory, ignore_errors=True)
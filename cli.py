@@ -0,0 +1,295 @@
+import sys
+import signal
+import argparse
+
+# Command line entry point for batch runs on headless servers:
+#     python -m cli category "Товары для животных/Для собак" 2023-01-01 2023-03-31 -d data --output parquet
+#     python -m cli brand WiMi 2023-08-01 2023-08-31 --db brand_WiMi
+#     python -m cli sku sku.csv 2023-01-01 2023-03-31 -d data --info --sales --output parquet
+#     python -m cli sync category "Дом/Кухня" 2022-01-01 2023-12-31 -d data
+#     python -m cli tree "Дом/Кухня" 2023-01-01 2023-03-31 -d data
+#     python -m cli jobs jobs.yaml --workers 8 --report run_report.json
+# Heavy modules are imported inside commands, so tkinter is never imported and SQLAlchemy only for --db.
+
+
+def _client(args):
+    """Create requ_Mpstats client from common options"""
+    from API_Mpstats import requ_Mpstats
+    cache = None
+    if args.cache is not None:
+        from response_cache import ResponseCache
+        cache = ResponseCache(args.cache, ttl=args.cache_ttl)
+    api = requ_Mpstats(request=args.marketplace, max_workers=args.workers, rate_limit=args.rate_limit,
+                       retries=args.retries, timeout=args.timeout, cache=cache, compact=args.compact)
+    if args.api_url is not None:
+        api.url = args.api_url
+    api.max_window_rows = args.max_window_rows
+    if args.tune_to_quota:
+        _tune(api)
+    return api
+
+
+def _tune(api):
+    """Tune limiter of the client to the remaining api quota of the account"""
+    remaining = api.tune_to_api_limit()
+    if remaining is not None:
+        print('Remaining API quota: ' + str(remaining) + ' requests', file=sys.stderr)
+
+
+def _on_signal(apis):
+    """Install SIGINT/SIGTERM handler which cancels running loads of the clients"""
+    def handler(signum, frame):
+        print('Cancelling...', file=sys.stderr)
+        for api in apis:
+            api.cancel()
+
+    signal.signal(signal.SIGINT, handler)
+    if hasattr(signal, 'SIGTERM'):
+        signal.signal(signal.SIGTERM, handler)
+
+
+def _save_report(metrics, args):
+    """Save run report and prometheus metrics if they are requested"""
+    if args.report is not None:
+        metrics.save(args.report)
+    if args.prometheus is not None:
+        metrics.save_prometheus(args.prometheus)
+
+
+def _run_with_client(args, load):
+    """
+        Create client, run load with it and save reports.
+        Args:
+            args (argparse.Namespace): parsed options.
+            load: function getting requ_Mpstats client.
+
+        Returns:
+            code (int): process exit code.
+    """
+    from API_Mpstats import LoadCancelled
+    api = _client(args)
+    _on_signal([api])
+    try:
+        load(api)
+    except LoadCancelled:
+        print('Cancelled', file=sys.stderr)
+        return 130
+    finally:
+        api.close()
+        _save_report(api.metrics, args)
+    return 0
+
+
+def cmd_category(args):
+    """Load category by months"""
+    return _run_with_client(args, lambda api: api.get_cat_by_dates(
+        args.path, args.start_date, args.end_date, save_directory=args.save_directory,
+        separate_files=args.separate_files, stream=args.stream, output=args.output,
+        checkpoint_directory=args.checkpoint_directory))
+
+
+def cmd_tree(args):
+    """Load all leaf categories of category and compute aggregates of the subtree"""
+    return _run_with_client(args, lambda api: api.get_tree_by_dates(
+        args.path, args.start_date, args.end_date, save_directory=args.save_directory, output=args.output))
+
+
+def cmd_brand(args):
+    """Load brand by weeks to files or to database table"""
+    if args.db is not None:
+        def load(api):
+            import db_wb
+            if args.database is not None:
+                db_wb.connect(args.database)
+            db_wb.update_brands(table_name=args.db, brand_string=args.path, startdate=args.start_date,
+                                enddate=args.end_date, wb_oz_var=args.marketplace, chunk_size=args.chunk_size,
+                                api=api, dedupe=args.dedupe)
+    else:
+        def load(api):
+            api.get_brand_by_dates(args.path, args.start_date, args.end_date, save_directory=args.save_directory,
+                                   separate_files=args.separate_files, stream=args.stream, output=args.output,
+                                   checkpoint_directory=args.checkpoint_directory)
+    return _run_with_client(args, load)
+
+
+def cmd_sku(args):
+    """Load info and/or sales of items from file or single item"""
+    if not args.info and not args.sales:
+        print('Nothing to load: use --info and/or --sales', file=sys.stderr)
+        return 2
+    return _run_with_client(args, lambda api: api.load_by_SKU(
+        args.save_directory, args.start_date, args.end_date, args.sku_list, load_info=args.info,
+        load_sales=args.sales, output=args.output))
+
+
+def cmd_sync(args):
+    """Append closed windows which are not loaded yet to csv file of the target"""
+    return _run_with_client(args, lambda api: api.sync_by_dates(
+        args.path, args.start_date, args.end_date, args.save_directory, kind=args.kind))
+
+
+def cmd_jobs(args):
+    """Run jobs from json or yaml job file with one worker pool"""
+    from scheduler import JobScheduler
+    cache = None
+    if args.cache is not None:
+        from response_cache import ResponseCache
+        cache = ResponseCache(args.cache, ttl=args.cache_ttl)
+    scheduler = JobScheduler.from_file(args.job_file, max_workers=args.workers, rate_limit=args.rate_limit,
+                                       budget=args.budget, status_file=args.status_file, cache=cache,
+                                       tune_to_quota=args.tune_to_quota)
+    # clients are created while jobs are expanded, the handler cancels all of them
+    _on_signal(_ClientsView(scheduler.apis))
+    try:
+        status = scheduler.run()
+    finally:
+        for api in scheduler.apis.values():
+            api.close()
+        _save_report(scheduler.metrics, args)
+    failed = [name for name, job in status.items() if job['status'] != 'done']
+    return 1 if failed else 0
+
+
+class _ClientsView:
+    """Iterable over current values of clients dict, clients added later are included"""
+
+    def __init__(self, apis):
+        self.apis = apis
+
+    def __iter__(self):
+        return iter(list(self.apis.values()))
+
+
+def _add_common(parser):
+    """Options of client, cache and reports shared by all commands"""
+    parser.add_argument('-m', '--marketplace', default='wb', choices=['wb', 'oz'], help='marketplace (default wb)')
+    parser.add_argument('-w', '--workers', type=int, default=4, help='requests in flight (default 4)')
+    parser.add_argument('--rate-limit', type=float, default=1.0,
+                        help='average pause between requests in seconds, 0 - no limit (default 1.0)')
+    parser.add_argument('--retries', type=int, default=5, help='retries of 429/5xx responses (default 5)')
+    parser.add_argument('--tune-to-quota', action='store_true',
+                        help='stop before the remaining api quota of the account is exhausted')
+    parser.add_argument('--timeout', type=float, default=60, help='request timeout in seconds (default 60)')
+    parser.add_argument('--cache', default=None, metavar='DIR', help='response cache directory')
+    parser.add_argument('--cache-ttl', type=float, default=3600,
+                        help='seconds to keep responses of open windows in cache (default 3600)')
+    parser.add_argument('--api-url', default=None, metavar='URL',
+                        help='base api url, e.g. of mock_server (default https://mpstats.io/api/)')
+    parser.add_argument('--max-window-rows', type=int, default=None, metavar='ROWS',
+                        help='split category windows with more rows into revenue bands (pagination limit of api)')
+    parser.add_argument('--report', default=None, metavar='FILE', help='save json run report')
+    parser.add_argument('--prometheus', default=None, metavar='FILE', help='save metrics in prometheus format')
+
+
+def _add_dates(parser):
+    parser.add_argument('start_date', help='start date, YYYY-MM-DD')
+    parser.add_argument('end_date', help='end date, YYYY-MM-DD')
+
+
+def _add_output(parser):
+    """Options of file outputs of category and brand loads"""
+    parser.add_argument('-d', '--save-directory', default='.', help='directory for result files (default .)')
+    parser.add_argument('--output', default=None, choices=['parquet', 'csv', 'xlsx'],
+                        help='write data by windows to parquet dataset, csv or xlsx file '
+                             '(default one xlsx/csv file at the end)')
+    parser.add_argument('--separate-files', action='store_true', help='save every window to separate xlsx file')
+    parser.add_argument('--stream', action='store_true', help='append every window to csv file as it is loaded')
+    parser.add_argument('--checkpoint-directory', default=None, metavar='DIR',
+                        help='save loaded pages, rerun after failure continues from the first missing page')
+    parser.add_argument('--compact', action='store_true', help='drop graph columns and use compact dtypes')
+
+
+def build_parser():
+    """
+        Make argument parser of the command line interface.
+
+        Returns:
+            parser (argparse.ArgumentParser): parser with category, tree, brand, sku, sync and jobs commands.
+    """
+    parser = argparse.ArgumentParser(prog='python -m cli', description='Load Mpstats data without GUI')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    category = commands.add_parser('category', help='load category by months')
+    category.add_argument('path', help='category as it exists on the marketplace, e.g. "Дом/Кухня"')
+    _add_dates(category)
+    _add_output(category)
+    _add_common(category)
+    category.set_defaults(func=cmd_category)
+
+    tree = commands.add_parser('tree', help='load leaf categories of category by months and aggregate subtree')
+    tree.add_argument('path', help='category as it exists on the marketplace, e.g. "Дом/Кухня"')
+    _add_dates(tree)
+    tree.add_argument('-d', '--save-directory', default='.', help='directory for result files (default .)')
+    tree.add_argument('--output', default='parquet', choices=['parquet', 'csv', 'xlsx'],
+                      help='format of leaf data (default parquet)')
+    tree.add_argument('--compact', action='store_true', help='drop graph columns and use compact dtypes')
+    _add_common(tree)
+    tree.set_defaults(func=cmd_tree)
+
+    brand = commands.add_parser('brand', help='load brand by weeks')
+    brand.add_argument('path', help='brand name as it exists on the marketplace')
+    _add_dates(brand)
+    _add_output(brand)
+    brand.add_argument('--db', default=None, metavar='TABLE', help='upsert data into database table')
+    brand.add_argument('--database', default=None, metavar='URL',
+                       help='sqlalchemy connection string (default first line of database.txt)')
+    brand.add_argument('--chunk-size', type=int, default=10000, help='rows in one database transaction')
+    brand.add_argument('--dedupe', action='store_true',
+                       help='delete duplicated (sku, date) rows of existing table before loading')
+    _add_common(brand)
+    brand.set_defaults(func=cmd_brand)
+
+    sku = commands.add_parser('sku', help='load info and sales of items')
+    sku.add_argument('sku_list', help='csv/xlsx file with sku column or single sku')
+    _add_dates(sku)
+    sku.add_argument('-d', '--save-directory', default='.', help='directory for result files (default .)')
+    sku.add_argument('--info', action='store_true', help='load current info of items')
+    sku.add_argument('--sales', action='store_true', help='load sales of items')
+    sku.add_argument('--output', default=None, choices=['parquet', 'csv'],
+                     help='save sales of all items into one resumable table (default xlsx file for every item)')
+    sku.set_defaults(compact=False)
+    _add_common(sku)
+    sku.set_defaults(func=cmd_sku)
+
+    sync = commands.add_parser('sync', help='append new closed windows of category or brand to csv file')
+    sync.add_argument('kind', choices=['category', 'brand'])
+    sync.add_argument('path', help='category or brand as it exists on the marketplace')
+    _add_dates(sync)
+    sync.add_argument('-d', '--save-directory', default='.', help='directory with result file and manifest')
+    sync.add_argument('--compact', action='store_true', help='drop graph columns and use compact dtypes')
+    _add_common(sync)
+    sync.set_defaults(func=cmd_sync)
+
+    jobs = commands.add_parser('jobs', help='run jobs from json or yaml job file (see scheduler.JobScheduler)')
+    jobs.add_argument('job_file', help='path to job file')
+    jobs.add_argument('-w', '--workers', type=int, default=8, help='requests in flight (default 8)')
+    jobs.add_argument('--rate-limit', type=float, default=1.0,
+                      help='average pause between requests in seconds, 0 - no limit (default 1.0)')
+    jobs.add_argument('--budget', type=int, default=None, help='maximal number of requests of the run')
+    jobs.add_argument('--tune-to-quota', action='store_true',
+                      help='limit the budget to the remaining api quota of the account')
+    jobs.add_argument('--status-file', default='jobs_status.json', help='json file with status of jobs')
+    jobs.add_argument('--cache', default=None, metavar='DIR', help='response cache directory')
+    jobs.add_argument('--cache-ttl', type=float, default=3600,
+                      help='seconds to keep responses of open windows in cache (default 3600)')
+    jobs.add_argument('--report', default=None, metavar='FILE', help='save json run report')
+    jobs.add_argument('--prometheus', default=None, metavar='FILE', help='save metrics in prometheus format')
+    jobs.set_defaults(func=cmd_jobs)
+    return parser
+
+
+def main(argv=None):
+    """
+        Run command line interface.
+        Args:
+            argv (list): arguments without program name, None - sys.argv.
+
+        Returns:
+            code (int): process exit code.
+    """
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+# window frequencies of date_windows
+FREQUENCIES = ('day', 'week', 'month', 'quarter')
+
+
+class Window(tuple):
+    """
+        Date window: pair of 'YYYY-MM-DD' strings (d1, d2) as used in requests, which also keeps parsed dates and
+        labels for file names and date column, so dates are not parsed and formatted again for every use.
+    """
+
+    def __new__(cls, d1, d2, start, end, label, end_label):
+        window = tuple.__new__(cls, (d1, d2))
+        # datetime.date of the first and the last day
+        window.start = start
+        window.end = end
+        # 'dd.mm.YYYY-dd.mm.YYYY' for file names and 'dd.mm.YYYY' of the last day for date column
+        window.label = label
+        window.end_label = end_label
+        return window
+
+    def __getnewargs__(self):
+        return self[0], self[1], self.start, self.end, self.label, self.end_label
+
+    @property
+    def days(self):
+        """Number of days in the window"""
+        return (self.end - self.start).days + 1
+
+
+def date_windows(start_date, end_date, freq='month', size=1, rolling=False, clip_end=False):
+    """
+        Create windows covering dates from start to end. Window bounds are computed for all windows at once with
+        pandas date ranges.
+        Args:
+            start_date (str): start date, YYYY-MM-DD.
+            end_date (str): end date, YYYY-MM-DD.
+            freq (str): 'day', 'week', 'month' or 'quarter'.
+            size (int): number of days, weeks, months or quarters in one window (e.g. freq='day', size=10 for
+                10-day windows).
+            rolling (bool): if true windows start from start_date (15.01-14.02, ...), else they are aligned to
+                calendar: months and quarters start from the first day, weeks from monday, first window contains
+                start_date. Day windows always start from start_date.
+            clip_end (bool): if true the last window ends at end_date, else it is complete.
+
+        Returns:
+            windows (list): list of Window, empty if end_date is before start_date.
+    """
+    if freq not in FREQUENCIES:
+        raise ValueError('Unknown window frequency: ' + str(freq))
+    if size < 1:
+        raise ValueError('Window size must be positive')
+    start = pd.Timestamp(start_date)
+    end = pd.Timestamp(end_date)
+    if end < start:
+        return []
+    if freq in ('day', 'week'):
+        days = size if freq == 'day' else 7 * size
+        if freq == 'week' and not rolling:
+            start = start - pd.Timedelta(days=start.weekday())
+        starts = pd.date_range(start, end, freq=pd.Timedelta(days=days))
+        ends = starts + pd.Timedelta(days=days - 1)
+    else:
+        months = size if freq == 'month' else 3 * size
+        if not rolling:
+            start = start.to_period('Q' if freq == 'quarter' else 'M').start_time
+        # one more window start gives the end of the last window
+        periods = pd.period_range(start.to_period('M'), periods=(end.year - start.year) * 12 + end.month -
+                                  start.month + months + 1, freq='M')[::months]
+        # day of month of rolling windows is kept, short months end at their last day (31.01 -> 28.02 -> 31.03)
+        day = np.minimum(start.day, np.asarray(periods.days_in_month)) - 1
+        bounds = periods.start_time + pd.to_timedelta(day, unit='D')
+        starts = bounds[:-1]
+        ends = bounds[1:] - pd.Timedelta(days=1)
+        keep = starts <= end
+        starts = starts[keep]
+        ends = ends[keep]
+    if clip_end:
+        ends = ends.where(ends <= end, end)
+    # numpy formats datetime64[D] as YYYY-MM-DD in one pass
+    d1 = np.asarray(starts, dtype='datetime64[D]').astype(str).tolist()
+    d2 = np.asarray(ends, dtype='datetime64[D]').astype(str).tolist()
+    windows = []
+    for day1, day2, start, end in zip(d1, d2, starts.date.tolist(), ends.date.tolist()):
+        end_label = day_label(day2)
+        windows.append(Window(day1, day2, start, end, day_label(day1) + '-' + end_label, end_label))
+    return windows
+
+
+def day_label(day):
+    """
+        Convert date to label of file names and date column.
+        Args:
+            day (str): date, YYYY-MM-DD.
+
+        Returns:
+            label (str): date as dd.mm.YYYY.
+    """
+    return day[8:10] + '.' + day[5:7] + '.' + day[0:4]
+
+
+def period_label(start_date, end_date):
+    """
+        Make label of the period for file names.
+        Args:
+            start_date (str): start date, YYYY-MM-DD.
+            end_date (str): end date, YYYY-MM-DD.
+
+        Returns:
+            label (str): 'dd.mm.YYYY-dd.mm.YYYY'.
+    """
+    return day_label(start_date) + '-' + day_label(end_date)
@@ -1,24 +1,56 @@
 import datetime
 from datetime import datetime
 import sys
+import io
+import time
 from API_Mpstats import requ_Mpstats
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine, insert, select, exists, inspect,delete
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy import Column, Integer, Float, String, DATETIME, Date, MetaData, Table, text, DDL, BigInteger
 import pandas as pd
 import sqlalchemy
 import numpy as np
 
-# creating a database connection from a file
-with open('database.txt', 'r') as file:
-    conn_string = file.readline().strip()
-
-engine = create_engine(conn_string)
-Session = sessionmaker(bind=engine)
+# database connection is created on first use (see get_engine), so importing the module doesn't need database.txt
+engine = None
+Session = None
 metadata = MetaData()
 
 
+def connect(conn_string=None):
+    """
+    Function for creating the database connection used by all functions of the module.
+
+    Args:
+        conn_string (string): sqlalchemy connection string, None - first line of database.txt.
+
+    Returns:
+        Engine: database engine.
+    """
+    global engine, Session
+    if conn_string is None:
+        # creating a database connection from a file
+        with open('database.txt', 'r') as file:
+            conn_string = file.readline().strip()
+    engine = create_engine(conn_string)
+    Session = sessionmaker(bind=engine)
+    return engine
+
+
+def get_engine():
+    """
+    Function for getting the database engine, connection from database.txt is created on first call.
+
+    Returns:
+        Engine: database engine.
+    """
+    if engine is None:
+        connect()
+    return engine
+
+
 # session = Session()
 
 
@@ -33,9 +65,9 @@ def create_table(table_name, frame):
     Returns:
         Table: Table object with name table_name.
     """
-    inspector = inspect(engine)
+    inspector = inspect(get_engine())
     if table_name in inspector.get_table_names():
-        table = Table(table_name, metadata, autoload_with=engine)
+        table = Table(table_name, metadata, autoload_with=get_engine())
         db_columns = table.columns.keys()
         frame_columns = frame.columns
         new_columns = set(frame_columns) - set(db_columns)
@@ -47,7 +79,7 @@ def create_table(table_name, frame):
                 table.append_column(Column(name, data_type, primary_key=True,autoincrement=True))
             else:
                 table.append_column(Column(name, data_type))
-        metadata.create_all(engine)
+        metadata.create_all(get_engine())
     return table
 
 
@@ -61,7 +93,7 @@ def create_colums(frame=pd.DataFrame()):
     Returns:
         columns_dict (dict): dict of column_names and data types.
     """
-    columns_dict = {'id': BigInteger}
+    columns_dict = {'id': BigInteger().with_variant(Integer, 'sqlite')}
     for col, dtype in frame.dtypes.items():
         if dtype == 'int64':
             columns_dict[col] = Integer
@@ -74,7 +106,151 @@ def create_colums(frame=pd.DataFrame()):
     return columns_dict
 
 
-def update_brands(table_name='brand_name',brand_string='', startdate='2021-03-01', enddate='2021-03-01',wb_oz_var=None):
+def bulk_upsert(table, frame, key_columns=('sku', 'date'), chunk_size=10000, dedupe=False):
+    """
+    Function for bulk loading of dataframe into table with update of existing rows by natural key. PostgreSQL
+    loads every chunk with COPY into a staging table and one INSERT ... ON CONFLICT DO UPDATE, SQLite (local
+    testing) uses executemany of INSERT ... ON CONFLICT DO UPDATE. Other databases are loaded row by row with
+    merge_rows.
+
+    Args:
+        table (Table): target table.
+        frame (pd.Dataframe): data to load, columns absent in the table are skipped.
+        key_columns (tuple): natural key columns, unique index is created on them if needed.
+        chunk_size (int): number of rows loaded in one transaction.
+        dedupe (bool): tables filled row by row can already contain several rows with the same key, so the
+            unique index can't be created. If true older duplicates are deleted (row with the largest id is kept),
+            else ValueError is raised.
+
+    Returns:
+        rows (int): number of loaded rows.
+    """
+    dialect = get_engine().dialect.name
+    if dialect not in ('postgresql', 'sqlite'):
+        merge_rows(table, frame)
+        return frame.shape[0]
+    columns = [col for col in frame.columns if col in table.columns.keys() and col != 'id']
+    frame = frame[columns].drop_duplicates(subset=list(key_columns), keep='last')
+    for col in frame.columns:
+        if frame[col].dtype == object:
+            # lists and dicts from api can't be stored in String columns as is
+            frame[col] = frame[col].map(lambda value: str(value) if isinstance(value, (list, dict)) else value)
+        elif frame[col].dtype.kind == 'f' and isinstance(table.columns[col].type, Integer) and \
+                (frame[col].dropna() % 1 == 0).all():
+            # integer columns with missing values are float in pandas, COPY doesn't accept '12.0' for integer
+            frame[col] = frame[col].astype('Int64')
+
+    with get_engine().begin() as connection:
+        _remove_duplicates(connection, table, key_columns, dedupe)
+        connection.execute(text('CREATE UNIQUE INDEX IF NOT EXISTS "{0}_key" ON "{0}" ({1})'.format(
+            table.name, ', '.join('"' + col + '"' for col in key_columns))))
+
+    start = time.perf_counter()
+    for index in range(0, frame.shape[0], chunk_size):
+        chunk = frame.iloc[index:index + chunk_size]
+        if dialect == 'postgresql':
+            _copy_upsert(table, chunk, columns, key_columns)
+        else:
+            _insert_upsert(table, chunk, columns, key_columns)
+    elapsed = time.perf_counter() - start
+    print(str(frame.shape[0]) + ' rows loaded in ' + str(round(elapsed, 2)) + ' s, ' +
+          str(int(frame.shape[0] / elapsed if elapsed > 0 else 0)) + ' rows/s')
+    return frame.shape[0]
+
+
+def _remove_duplicates(connection, table, key_columns, dedupe):
+    """
+    Check that existing rows of the table are unique by natural key before creation of the unique index.
+
+    Args:
+        connection (Connection): database connection in transaction.
+        table (Table): target table.
+        key_columns (tuple): natural key columns.
+        dedupe (bool): if true older duplicates are deleted, else ValueError is raised.
+
+    Returns:
+        None
+    """
+    index_name = table.name + '_key'
+    if any(index['name'] == index_name for index in inspect(connection).get_indexes(table.name)):
+        return
+    key_list = ', '.join('"' + col + '"' for col in key_columns)
+    duplicates = connection.execute(text('SELECT {1}, COUNT(*) FROM "{0}" GROUP BY {1} HAVING COUNT(*) > 1'.format(
+        table.name, key_list))).fetchall()
+    if not duplicates:
+        return
+    if not dedupe or 'id' not in table.columns.keys():
+        raise ValueError('Table ' + table.name + ' has ' + str(len(duplicates)) + ' duplicated keys (' +
+                         ', '.join(key_columns) + '), e.g. ' + str(tuple(duplicates[0][:-1])) +
+                         ', unique index for bulk loading can\'t be created. Use dedupe=True to keep the last '
+                         'row of every key or bulk=False to load row by row')
+    deleted = connection.execute(text('DELETE FROM "{0}" WHERE "id" NOT IN (SELECT MAX("id") FROM "{0}" '
+                                      'GROUP BY {1})'.format(table.name, key_list))).rowcount
+    print(str(deleted) + ' duplicated rows are deleted from ' + table.name)
+
+
+def _copy_upsert(table, chunk, columns, key_columns):
+    """
+    Load chunk into PostgreSQL table through COPY into temporary staging table and INSERT ... ON CONFLICT.
+
+    Args:
+        table (Table): target table.
+        chunk (pd.Dataframe): data to load.
+        columns (list): columns to load.
+        key_columns (tuple): natural key columns.
+
+    Returns:
+        None
+    """
+    buffer = io.StringIO()
+    chunk.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    column_list = ', '.join('"' + col + '"' for col in columns)
+    key_list = ', '.join('"' + col + '"' for col in key_columns)
+    update_list = ', '.join('"{0}" = EXCLUDED."{0}"'.format(col) for col in columns if col not in key_columns)
+    if update_list:
+        conflict = 'DO UPDATE SET ' + update_list
+    else:
+        conflict = 'DO NOTHING'
+    connection = get_engine().raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute('CREATE TEMP TABLE mpstats_staging ON COMMIT DROP AS SELECT {0} FROM "{1}" WITH NO DATA'.format(
+            column_list, table.name))
+        cursor.copy_expert('COPY mpstats_staging ({0}) FROM STDIN WITH (FORMAT csv)'.format(column_list), buffer)
+        cursor.execute('INSERT INTO "{0}" ({1}) SELECT {1} FROM mpstats_staging ON CONFLICT ({2}) {3}'.format(
+            table.name, column_list, key_list, conflict))
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def _insert_upsert(table, chunk, columns, key_columns):
+    """
+    Load chunk into SQLite table with executemany of INSERT ... ON CONFLICT.
+
+    Args:
+        table (Table): target table.
+        chunk (pd.Dataframe): data to load.
+        columns (list): columns to load.
+        key_columns (tuple): natural key columns.
+
+    Returns:
+        None
+    """
+    statement = sqlite_insert(table)
+    update = {col: statement.excluded[col] for col in columns if col not in key_columns}
+    if update:
+        statement = statement.on_conflict_do_update(index_elements=list(key_columns), set_=update)
+    else:
+        statement = statement.on_conflict_do_nothing(index_elements=list(key_columns))
+    records = chunk.astype(object).where(chunk.notna(), None).to_dict('records')
+    with get_engine().begin() as connection:
+        connection.execute(statement, records)
+
+
+def update_brands(table_name='brand_name',brand_string='', startdate='2021-03-01', enddate='2021-03-01',wb_oz_var=None,
+                  bulk=True, chunk_size=10000, api=None, dedupe=False):
     """
     Function for updating a table of the "brand_name" type with data from the api service from start to end date.
 
@@ -83,6 +259,11 @@ def update_brands(table_name='brand_name',brand_string='', startdate='2021-03-01
         brand_string (string): link for api request.
         startdate (string): start date.
         enddate (string): end date.
+        bulk (bool): if true data is loaded with bulk_upsert by (sku, date) key, else row by row with session.merge.
+        chunk_size (int): number of rows loaded in one transaction by bulk_upsert.
+        api (requ_Mpstats): client to load data with (e.g. with progress callback), None - new client of wb_oz_var.
+        dedupe (bool): if true duplicated (sku, date) rows of existing table are deleted before bulk loading, else
+            bulk loading into such table raises ValueError.
 
     Returns:
         None
@@ -91,7 +272,10 @@ def update_brands(table_name='brand_name',brand_string='', startdate='2021-03-01
 
     if wb_oz_var is None:
         wb_oz_var='wb'
-    requ = requ_Mpstats(request=wb_oz_var)
+    if api is None:
+        requ = requ_Mpstats(request=wb_oz_var)
+    else:
+        requ = api
 
     # transform strings into datetime
     date1 = datetime.strptime(startdate, "%Y-%m-%d")
@@ -104,32 +288,49 @@ def update_brands(table_name='brand_name',brand_string='', startdate='2021-03-01
     else:
         data = requ.get_brand_by_dates(start_date=startdate, end_date=enddate, brand_string=brand_string, db_connect=True)
     brands = create_table(table_name, data)
+    if bulk:
+        bulk_upsert(brands, data, chunk_size=chunk_size, dedupe=dedupe)
+        return
+    merge_rows(brands, data)
+
+
+def merge_rows(table, frame):
+    """
+    Function for loading of dataframe into table row by row with session.merge by primary key, works with any
+    database.
+
+    Args:
+        table (Table): target table.
+        frame (pd.Dataframe): data to load, columns absent in the table are skipped.
+
+    Returns:
+        errors_list (list): ids of rows which were not loaded.
+    """
     Base = sqlalchemy.orm.declarative_base()
     errors_list = []
 
-    class Brands(Base):
+    class Rows(Base):
         # base class for sqlalchemy to secure transactions
-        __tablename__ = table_name
-        __table__ = brands
+        __table__ = table
 
+    get_engine()
     session = Session()
 
-    with engine.connect() as connection:
-        # prepare data for uploading
-        # data=data.drop('items.serial_num',axis=1)
-        data1 = data.to_dict('records')
-
-        # update or upload data in tabl.,e
-        for row in data1:
-            try:
-                brands = Brands(**row)
-                session.merge(brands)
-            except Exception as e:
-                errors_list.append(row['id'])
-                print(e)
-                continue
+    # prepare data for uploading
+    data1 = frame[[col for col in frame.columns if col in table.columns.keys()]].to_dict('records')
+
+    # update or upload data in table
+    for row in data1:
+        try:
+            rows = Rows(**row)
+            session.merge(rows)
+        except Exception as e:
+            errors_list.append(row.get('id'))
+            print(e)
+            continue
     session.commit()
     session.close()
+    return errors_list
 
 
 
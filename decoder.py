@@ -0,0 +1,86 @@
+import json
+import pandas as pd
+
+# fastest available json decoder: orjson, msgspec or standard json
+try:
+    import orjson
+
+    def loads(content):
+        """
+            Decode json response body.
+            Args:
+                content (bytes or str): response body.
+
+            Returns:
+                decoded json object.
+        """
+        return orjson.loads(content)
+except ImportError:
+    try:
+        import msgspec
+
+        _decoder = msgspec.json.Decoder()
+
+        def loads(content):
+            """
+                Decode json response body.
+                Args:
+                    content (bytes or str): response body.
+
+                Returns:
+                    decoded json object.
+            """
+            if isinstance(content, str):
+                content = content.encode('utf8')
+            return _decoder.decode(content)
+    except ImportError:
+        def loads(content):
+            """
+                Decode json response body.
+                Args:
+                    content (bytes or str): response body.
+
+                Returns:
+                    decoded json object.
+            """
+            return json.loads(content)
+
+
+def _flatten(record, prefix, flat):
+    """Put values of nested dicts into flat dict with 'parent.child' keys"""
+    for key, value in record.items():
+        if isinstance(value, dict):
+            _flatten(value, prefix + key + '.', flat)
+        else:
+            flat[prefix + key] = value
+    return flat
+
+
+def records_to_frame(records):
+    """
+        Flatten api records straight into columns of the frame. Result is the same as pd.json_normalize(records)
+        (nested dicts become 'parent.child' columns), but columns are built as lists without per-record frames.
+        Args:
+            records (list): list of dicts from api response.
+
+        Returns:
+            frame (pd.Dataframe): frame of records.
+    """
+    if not records:
+        return pd.DataFrame()
+    flat_records = []
+    for record in records:
+        for value in record.values():
+            if isinstance(value, dict):
+                record = _flatten(record, '', {})
+                break
+        flat_records.append(record)
+    columns = dict.fromkeys(flat_records[0])
+    first_keys = flat_records[0].keys()
+    for record in flat_records:
+        # most records have the same keys, comparing key views is much faster than checking every key
+        if record.keys() != first_keys:
+            for key in record:
+                if key not in columns:
+                    columns[key] = None
+    return pd.DataFrame({key: [record.get(key) for record in flat_records] for key in columns})
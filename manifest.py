@@ -0,0 +1,104 @@
+import os
+import json
+import threading
+
+
+class Manifest:
+    """JSON file with completed units (date windows, pages) of every load target, saved after each change"""
+
+    def __init__(self, file):
+        """
+            Args:
+                file (str): path to manifest file. Created on first save if it does not exist.
+        """
+        self.file = file
+        self._lock = threading.Lock()
+        if os.path.isfile(file):
+            with open(file, 'r', encoding='utf8') as f:
+                self.data = json.load(f)
+        else:
+            self.data = {}
+
+    def get(self, target):
+        """
+            Get completed units of the target.
+            Args:
+                target (str): load target key, e.g. 'wb/category/Дом/Кухня'.
+
+            Returns:
+                units (set): set of completed unit keys.
+        """
+        with self._lock:
+            return set(self.data.get(target, []))
+
+    def add(self, target, unit):
+        """
+            Mark unit of the target as completed and save manifest atomically.
+            Args:
+                target (str): load target key.
+                unit (str): completed unit key, e.g. '2023-03-01 2023-03-31'.
+
+            Returns:
+                None
+        """
+        self.add_many(target, [unit])
+
+    def add_many(self, target, units, offset=None):
+        """
+            Mark several units of the target as completed and save manifest once.
+            Args:
+                target (str): load target key.
+                units (list): completed unit keys.
+                offset (int): position of the output after the units (e.g. size of appended csv file), saved in
+                    the same write as the units, see get_offset. None to keep the previous one.
+
+            Returns:
+                None
+        """
+        with self._lock:
+            completed = self.data.setdefault(target, [])
+            known = set(completed)
+            for unit in units:
+                if unit not in known:
+                    completed.append(unit)
+                    known.add(unit)
+            if offset is not None:
+                self.data[target + '#offset'] = [offset]
+            self._save()
+
+    def get_offset(self, target):
+        """
+            Get output position saved with the last completed units of the target.
+            Args:
+                target (str): load target key.
+
+            Returns:
+                offset (int): saved position or None.
+        """
+        with self._lock:
+            values = self.data.get(target + '#offset')
+            return values[0] if values else None
+
+    def remove(self, target):
+        """
+            Forget all completed units of the target.
+            Args:
+                target (str): load target key.
+
+            Returns:
+                None
+        """
+        with self._lock:
+            offset = self.data.pop(target + '#offset', None)
+            if self.data.pop(target, None) is not None or offset is not None:
+                self._save()
+
+    def _save(self):
+        """Write manifest to temporary file and replace the old one"""
+        directory = os.path.dirname(self.file)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        temp_file = self.file + '.tmp'
+        with open(temp_file, 'w', encoding='utf8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=1)
+        os.replace(temp_file, self.file)
@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+# upper bounds of request latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class RunMetrics:
+    """
+        Thread-safe collector of request and processing metrics of one run: request counts, statuses, bytes,
+        latency histograms, retries, cache hits and coalesced requests by endpoint, rows per page, time spent in
+        network, parsing and writing, requests and bytes by target (category or brand path). Phase times are
+        summed over all threads, so with several workers they can be larger than wall time.
+
+        Usage:
+            api = requ_Mpstats(max_workers=8)
+            api.get_cat_by_dates('Дом/Кухня', '2023-01-01', '2023-03-31', output='parquet')
+            api.metrics.save('run_report.json')
+            api.metrics.save_prometheus('mpstats.prom')
+    """
+
+    def __init__(self):
+        self.started = datetime.now()
+        self._start = time.perf_counter()
+        self.endpoints = {}
+        self.phases = {}
+        self.targets = {}
+        self._lock = threading.Lock()
+
+    def _endpoint(self, endpoint):
+        """Get metrics dict of the endpoint, must be called under the lock"""
+        if endpoint not in self.endpoints:
+            self.endpoints[endpoint] = {'requests': 0, 'statuses': {}, 'errors': 0, 'retries': 0, 'cache_hits': 0,
+                                        'coalesced': 0, 'bytes': 0, 'latency_sum': 0.0, 'latency_max': 0.0,
+                                        'latency_buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+                                        'pages': 0, 'rows': 0, 'rows_max': 0}
+        return self.endpoints[endpoint]
+
+    def request(self, endpoint, status, seconds, size=0, target=None):
+        """
+            Record one sent request.
+            Args:
+                endpoint (str): endpoint name, e.g. 'wb/get/category'.
+                status (int): http status, None for connection errors and timeouts.
+                seconds (float): latency of the request.
+                size (int): size of response body in bytes.
+                target (str): marketplace and category or brand path of the request ('wb/Дом/Кухня'), None if
+                    request has no target.
+
+            Returns:
+                None
+        """
+        with self._lock:
+            metrics = self._endpoint(endpoint)
+            metrics['requests'] = metrics['requests'] + 1
+            if status is None:
+                metrics['errors'] = metrics['errors'] + 1
+            else:
+                metrics['statuses'][str(status)] = metrics['statuses'].get(str(status), 0) + 1
+            metrics['bytes'] = metrics['bytes'] + size
+            metrics['latency_sum'] = metrics['latency_sum'] + seconds
+            metrics['latency_max'] = max(metrics['latency_max'], seconds)
+            bucket = 0
+            while bucket < len(LATENCY_BUCKETS) and seconds > LATENCY_BUCKETS[bucket]:
+                bucket = bucket + 1
+            metrics['latency_buckets'][bucket] = metrics['latency_buckets'][bucket] + 1
+            if target is not None:
+                cost = self.targets.setdefault(target, {'requests': 0, 'bytes': 0})
+                cost['requests'] = cost['requests'] + 1
+                cost['bytes'] = cost['bytes'] + size
+
+    def retry(self, endpoint):
+        """Record retry of the request to the endpoint"""
+        with self._lock:
+            metrics = self._endpoint(endpoint)
+            metrics['retries'] = metrics['retries'] + 1
+
+    def cache_hit(self, endpoint):
+        """Record response of the endpoint taken from the response cache"""
+        with self._lock:
+            metrics = self._endpoint(endpoint)
+            metrics['cache_hits'] = metrics['cache_hits'] + 1
+
+    def coalesced(self, endpoint):
+        """Record request of the endpoint answered by identical request in flight (see single_flight)"""
+        with self._lock:
+            metrics = self._endpoint(endpoint)
+            metrics['coalesced'] = metrics['coalesced'] + 1
+
+    def page(self, endpoint, rows):
+        """Record number of rows in the loaded page of the endpoint"""
+        with self._lock:
+            metrics = self._endpoint(endpoint)
+            metrics['pages'] = metrics['pages'] + 1
+            metrics['rows'] = metrics['rows'] + rows
+            metrics['rows_max'] = max(metrics['rows_max'], rows)
+
+    def add_time(self, phase, seconds):
+        """Add seconds to the phase ('network', 'parse', 'write' or any other name)"""
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, phase):
+        """
+            Context manager measuring time of the block into the phase.
+            Args:
+                phase (str): phase name.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.perf_counter() - start)
+
+    def report(self):
+        """
+            Make machine-readable run report.
+
+            Returns:
+                report (dict): run start, wall seconds, totals, metrics by endpoint, phases and targets.
+        """
+        with self._lock:
+            endpoints = {}
+            for endpoint, metrics in self.endpoints.items():
+                metrics = dict(metrics, statuses=dict(metrics['statuses']),
+                               latency_buckets=dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ['inf'],
+                                                        metrics['latency_buckets'])))
+                metrics['latency_mean'] = metrics['latency_sum'] / metrics['requests'] if metrics['requests'] \
+                    else None
+                metrics['rows_per_page'] = metrics['rows'] / metrics['pages'] if metrics['pages'] else None
+                endpoints[endpoint] = metrics
+            return {'started': self.started.isoformat(timespec='seconds'),
+                    'seconds': time.perf_counter() - self._start,
+                    'requests': sum(metrics['requests'] for metrics in endpoints.values()),
+                    'retries': sum(metrics['retries'] for metrics in endpoints.values()),
+                    'bytes': sum(metrics['bytes'] for metrics in endpoints.values()),
+                    'endpoints': endpoints,
+                    'phases': dict(self.phases),
+                    'targets': {target: dict(cost) for target, cost in self.targets.items()}}
+
+    def save(self, file):
+        """
+            Save run report to json file.
+            Args:
+                file (str): path to json file.
+
+            Returns:
+                report (dict): saved report.
+        """
+        report = self.report()
+        temp_file = file + '.tmp'
+        with open(temp_file, 'w', encoding='utf8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+        os.replace(temp_file, file)
+        return report
+
+    def prometheus(self):
+        """
+            Make metrics in Prometheus text exposition format.
+
+            Returns:
+                text (str): metrics text.
+        """
+        report = self.report()
+        endpoints = [('endpoint="' + _escape(endpoint) + '"', metrics)
+                     for endpoint, metrics in report['endpoints'].items()]
+        # samples of one metric must go together after its TYPE line
+        lines = ['# TYPE mpstats_requests_total counter']
+        for label, metrics in endpoints:
+            for status, count in metrics['statuses'].items():
+                lines.append('mpstats_requests_total{' + label + ',status="' + status + '"} ' + str(count))
+            if metrics['errors']:
+                lines.append('mpstats_requests_total{' + label + ',status="error"} ' + str(metrics['errors']))
+        for name, key in (('retries', 'retries'), ('cache_hits', 'cache_hits'), ('coalesced', 'coalesced'),
+                          ('response_bytes', 'bytes'), ('rows', 'rows')):
+            lines.append('# TYPE mpstats_' + name + '_total counter')
+            for label, metrics in endpoints:
+                lines.append('mpstats_' + name + '_total{' + label + '} ' + str(metrics[key]))
+        lines.append('# TYPE mpstats_request_seconds histogram')
+        for label, metrics in endpoints:
+            cumulative = 0
+            for bound, count in metrics['latency_buckets'].items():
+                cumulative = cumulative + count
+                bound = '+Inf' if bound == 'inf' else bound
+                lines.append('mpstats_request_seconds_bucket{' + label + ',le="' + bound + '"} ' + str(cumulative))
+            lines.append('mpstats_request_seconds_sum{' + label + '} ' + repr(metrics['latency_sum']))
+            lines.append('mpstats_request_seconds_count{' + label + '} ' + str(metrics['requests']))
+        lines.append('# TYPE mpstats_phase_seconds_total counter')
+        for phase, seconds in report['phases'].items():
+            lines.append('mpstats_phase_seconds_total{phase="' + _escape(phase) + '"} ' + repr(seconds))
+        lines.append('# TYPE mpstats_target_requests_total counter')
+        for target, cost in report['targets'].items():
+            lines.append('mpstats_target_requests_total{target="' + _escape(target) + '"} ' +
+                         str(cost['requests']))
+        return '\n'.join(lines) + '\n'
+
+    def save_prometheus(self, file):
+        """
+            Save metrics in Prometheus text format, e.g. for textfile collector of node_exporter.
+            Args:
+                file (str): path to .prom file.
+
+            Returns:
+                None
+        """
+        temp_file = file + '.tmp'
+        with open(temp_file, 'w', encoding='utf8') as f:
+            f.write(self.prometheus())
+        os.replace(temp_file, file)
+
+
+def _escape(value):
+    """Escape label value for Prometheus text format"""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,243 @@
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Request handler of the stand-in server, settings are taken from server.mock"""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b'', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method):
+        mock = self.server.mock
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        endpoint = mock.endpoint(url.path)
+        mock.count(endpoint)
+        if mock.latency:
+            time.sleep(mock.latency)
+        if endpoint is None:
+            return self._send(404, b'{"message": "not found"}')
+        if mock.error_rate and mock.random.random() < mock.error_rate:
+            mock.count('429')
+            return self._send(429, b'{"message": "too many requests"}', {'Retry-After': str(mock.retry_after)})
+        self._send(200, mock.content(endpoint, url.path, query, body))
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+
+class MockMpstats:
+    """
+        Local stand-in of Mpstats api for offline runs and benchmarks. Emulates /get/category, /get/brand,
+        /get/items/batch, /get/item/{sku}/sales, /get/categories and user/report_api_limit with generated data.
+
+        Usage:
+            with MockMpstats(total=20000, latency=0.05) as mock:
+                api = requ_Mpstats(rate_limit=0)
+                api.url = mock.url
+    """
+
+    def __init__(self, port=0, total=12000, latency=0.0, error_rate=0.0, retry_after=0.1, graph_points=30,
+                 seed=0):
+        """
+            Args:
+                port (int): port to listen, 0 - any free port.
+                total (int): number of rows in every category or brand window (pagination total).
+                latency (float): delay of every response in seconds.
+                error_rate (float): share of requests answered with 429 and Retry-After header.
+                retry_after (float): Retry-After value of 429 responses in seconds.
+                graph_points (int): length of graph lists in category and brand rows (payload size).
+                seed (int): random seed of 429 injection.
+        """
+        self.total = total
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.graph_points = graph_points
+        self.random = random.Random(seed)
+        self.counts = {}
+        # ids of every items/batch request in order of arrival
+        self.item_batches = []
+        self._pages = {}
+        # category tree of /get/categories
+        self.categories = ['Bench', 'Bench/Category', 'Bench/Tree', 'Bench/Tree/Leaf 1', 'Bench/Tree/Leaf 2',
+                           'Bench/Tree/Sub', 'Bench/Tree/Sub/Leaf 3', 'Bench/Tree/Sub/Leaf 4']
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), _Handler)
+        self.server.daemon_threads = True
+        self.server.mock = self
+        self.thread = None
+
+    @property
+    def url(self):
+        """Base api url of the server for requ_Mpstats.url"""
+        return 'http://127.0.0.1:' + str(self.server.server_address[1]) + '/api/'
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        """Start server in background thread"""
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop server"""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, endpoint):
+        """Count request to the endpoint"""
+        with self._lock:
+            self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+
+    def endpoint(self, path):
+        """
+            Get endpoint name of request path.
+            Args:
+                path (str): request path.
+
+            Returns:
+                endpoint (str): 'category', 'brand', 'items', 'sales', 'limit', 'categories' or None for unknown
+                    path.
+        """
+        if path.endswith('/get/category'):
+            return 'category'
+        elif path.endswith('/get/brand'):
+            return 'brand'
+        elif path.endswith('/get/items/batch'):
+            return 'items'
+        elif re.search(r'/get/item/\d+/sales$', path):
+            return 'sales'
+        elif path.endswith('/user/report_api_limit'):
+            return 'limit'
+        elif path.endswith('/get/categories'):
+            return 'categories'
+        return None
+
+    def content(self, endpoint, path, query, body):
+        """
+            Make encoded response body. Category and brand pages don't depend on the window and are encoded once,
+            so the server doesn't take cpu time from the client in benchmarks.
+
+            Returns:
+                content (bytes): response body.
+        """
+        if endpoint in ('category', 'brand'):
+            key = (query.get('path', ''), body.get('startRow', 0), body.get('endRow', 5000),
+                   json.dumps(body.get('filterModel'), sort_keys=True), json.dumps(body.get('sortModel')))
+            if key not in self._pages:
+                self._pages[key] = self._encode(self.response(endpoint, path, query, body))
+            return self._pages[key]
+        return self._encode(self.response(endpoint, path, query, body))
+
+    @staticmethod
+    def _encode(result):
+        """Encode response json"""
+        return json.dumps(result, ensure_ascii=False).encode('utf8')
+
+    def response(self, endpoint, path, query, body):
+        """Make response json of the endpoint"""
+        if endpoint in ('category', 'brand'):
+            start = body.get('startRow', 0)
+            end = min(body.get('endRow', 5000), self.total)
+            # products of different paths partly overlap, like products listed in several categories
+            offset = sum(query.get('path', '').encode('utf8')) % 7 * (self.total // 10)
+            band = (body.get('filterModel') or {}).get('revenue')
+            if not body.get('sortModel') and band is None:
+                return {'total': self.total, 'data': [self._row(i + offset) for i in range(start, end)]}
+            # revenue desc order (rows without revenue first) and revenue inRange (bounds excluded), equals and
+            # blank filters of category requests
+            numbers = sorted(range(offset, offset + self.total), reverse=True,
+                             key=lambda i: (self._revenue(i) is None, self._revenue(i) or 0))
+            if band is not None:
+                numbers = [i for i in numbers if self._in_band(self._revenue(i), band)]
+            return {'total': len(numbers), 'data': [self._row(i) for i in numbers[start:body.get('endRow', 5000)]]}
+        elif endpoint == 'items':
+            with self._lock:
+                self.item_batches.append(list(body.get('ids', [])))
+            return [{'id': sku, 'name': 'Item ' + str(sku), 'brand': 'Brand ' + str(sku % 97),
+                     'photos': [{'f': 'https://example.com/' + str(sku) + '.jpg'}]}
+                    for sku in map(int, body.get('ids', []))]
+        elif endpoint == 'sales':
+            sku = int(re.search(r'/get/item/(\d+)/sales$', path).group(1))
+            day = datetime.strptime(query['d1'], '%Y-%m-%d')
+            last_day = datetime.strptime(query['d2'], '%Y-%m-%d')
+            rows = []
+            while day <= last_day:
+                rows.append({'data': day.strftime('%Y-%m-%d'), 'sales': (sku + day.day) % 17,
+                             'balance': (sku * 7 + day.day) % 300, 'price': 100 + sku % 900})
+                day = day + timedelta(days=1)
+            return rows
+        elif endpoint == 'categories':
+            return [{'url': '/catalog/' + str(number), 'name': path.split('/')[-1], 'path': path}
+                    for number, path in enumerate(self.categories)]
+        return {'limit': 100000, 'used': sum(self.counts.values())}
+
+    @staticmethod
+    def _revenue(i):
+        """Revenue of generated product row number i, tests may replace it on the instance"""
+        return (i % 500) * (100 + i % 4900)
+
+    @staticmethod
+    def _in_band(revenue, band):
+        """Check revenue against number filter of the request"""
+        if band['type'] == 'blank':
+            return revenue is None
+        if revenue is None:
+            return False
+        if band['type'] == 'equals':
+            return revenue == band['filter']
+        return band['filter'] < revenue < band['filterTo']
+
+    def _row(self, i):
+        """Generated product row number i"""
+        graph = [(i + point) % 31 for point in range(self.graph_points)]
+        return {'id': 10000000 + i, 'name': 'Product ' + str(i), 'brand': 'Brand ' + str(i % 97),
+                'seller': 'Seller ' + str(i % 389), 'category': 'Category/Subcategory ' + str(i % 13),
+                'price': 100 + i % 4900, 'final_price': 90 + i % 4500, 'rating': 4 + (i % 10) / 10,
+                'comments': i % 2000, 'sales': i % 500, 'revenue': self._revenue(i),
+                'balance': i % 1000, 'graph': graph, 'stocks_graph': graph, 'price_graph': graph,
+                'category_graph': graph, 'product_visibility_graph': graph}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in of Mpstats api')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--total', type=int, default=12000, help='rows in every category/brand window')
+    parser.add_argument('--latency', type=float, default=0.0, help='delay of every response, seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of 429 responses')
+    parser.add_argument('--graph-points', type=int, default=30, help='length of graph lists in rows')
+    args = parser.parse_args()
+    mock = MockMpstats(port=args.port, total=args.total, latency=args.latency, error_rate=args.error_rate,
+                       graph_points=args.graph_points)
+    print('Mock Mpstats api on ' + mock.url)
+    mock.server.serve_forever()
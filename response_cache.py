@@ -0,0 +1,114 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+from datetime import date
+
+
+class ResponseCache:
+    """On-disk cache of Mpstats api responses with LRU eviction by size"""
+
+    def __init__(self, directory='mpstats_cache', max_size=2 * 1024 ** 3, ttl=3600):
+        """
+            Args:
+                directory (str): path to cache directory.
+                max_size (int): maximal size of cache files in bytes, least recently used files are removed first.
+                ttl (int): lifetime in seconds of responses for windows touching today or the future.
+                    Responses for closed past windows never expire.
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self.size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)
+                        if name.endswith('.json.gz'))
+
+    def _file(self, key):
+        """
+            Get cache file path for the request key.
+            Args:
+                key (dict): request parameters (marketplace, endpoint, path, dates, rows, filter and sort models).
+
+            Returns:
+                path (str): path to cache file.
+        """
+        digest = hashlib.sha1(json.dumps(key, sort_keys=True, ensure_ascii=False).encode('utf8')).hexdigest()
+        return os.path.join(self.directory, digest + '.json.gz')
+
+    def get(self, key, d2):
+        """
+            Get cached response body.
+            Args:
+                key (dict): request parameters.
+                d2 (str): end date of the request window.
+
+            Returns:
+                content (bytes): response body or None if there is no valid cached response.
+        """
+        file = self._file(key)
+        try:
+            modified = os.path.getmtime(file)
+            if d2 >= date.today().isoformat() and time.time() - modified > self.ttl:
+                content = None
+            else:
+                with gzip.open(file, 'rb') as f:
+                    content = f.read()
+                # access time is kept in atime for LRU eviction, mtime stays the time of loading
+                os.utime(file, (time.time(), modified))
+        except OSError:
+            content = None
+        with self._lock:
+            if content is None:
+                self.misses = self.misses + 1
+            else:
+                self.hits = self.hits + 1
+        return content
+
+    def set(self, key, content):
+        """
+            Save response body to cache and evict least recently used files if cache is too large.
+            Args:
+                key (dict): request parameters.
+                content (bytes): response body.
+
+            Returns:
+                None
+        """
+        file = self._file(key)
+        temp_file = file + '.' + str(threading.get_ident()) + '.tmp'
+        with gzip.open(temp_file, 'wb') as f:
+            f.write(content)
+        with self._lock:
+            if os.path.exists(file):
+                self.size = self.size - os.path.getsize(file)
+            os.replace(temp_file, file)
+            self.size = self.size + os.path.getsize(file)
+            if self.size > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        """Remove least recently used files until cache size is below max_size"""
+        files = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                 if name.endswith('.json.gz')]
+        files.sort(key=os.path.getatime)
+        for file in files:
+            if self.size <= self.max_size:
+                break
+            self.size = self.size - os.path.getsize(file)
+            os.remove(file)
+
+    def stats(self):
+        """
+            Get cache statistics.
+
+            Returns:
+                stats (dict): hits, misses and size of cache in bytes.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': self.size}
@@ -0,0 +1,270 @@
+import os
+import json
+import heapq
+import threading
+from date_windows import period_label
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from API_Mpstats import requ_Mpstats, TokenBucket
+from metrics import RunMetrics
+from sinks import open_sink
+
+
+class _Target:
+    """Loading state of one (job, target, marketplace): windows, loaded pages and output sink"""
+
+    def __init__(self, job, kind, path, marketplace, dates, sink):
+        self.job = job
+        self.kind = kind
+        self.path = path
+        self.marketplace = marketplace
+        self.dates = dates
+        self.sink = sink
+        self.pages = {}
+        # number of pages left to load for every window, None until the first page is loaded
+        self.left = [None] * len(dates)
+        # loaded windows which are not written yet
+        self.loaded = set()
+        self.next_window = 0
+        self.written = 0
+        self.rows = 0
+        self.requests = 0
+        self.error = None
+
+
+class JobScheduler:
+    """
+        Scheduler of several category and brand loads. Jobs (targets x marketplaces x date range) are expanded
+        into (target, window, page) tasks, which are executed by one worker pool under one api limiter. Pages of
+        started windows go before first pages of new windows (pages of cheap windows with less pages first), so
+        only few windows are open at once and every window is written as soon as it is loaded. Recent windows
+        are started first for sinks which accept any order (parquet), windows of ordered sinks (csv, xlsx) are
+        started in date order, so they are written without waiting for older windows. Status of every job is
+        saved to the status file.
+
+        Job file example (json or yaml):
+            {"jobs": [{"name": "dogs", "kind": "category", "targets": ["Товары для животных/Для собак/Игрушки"],
+                       "marketplaces": ["wb", "oz"], "start_date": "2022-04-01", "end_date": "2023-03-31",
+                       "output": "parquet", "save_directory": "data"}]}
+    """
+
+    def __init__(self, jobs, max_workers=8, rate_limit=1.0, budget=None, status_file='jobs_status.json',
+                 cache=None, report_file=None, tune_to_quota=False):
+        """
+            Args:
+                jobs (list): list of job dicts (name, kind, targets, marketplaces, start_date, end_date, output,
+                    save_directory).
+                max_workers (int): number of requests in flight.
+                rate_limit (float): average pause between requests in seconds for all jobs together.
+                budget (int): maximal number of requests for the run (api quota), None - unlimited.
+                status_file (str): path to json file with status of jobs.
+                cache (ResponseCache): response cache for all requests, None to disable.
+                report_file (str): path to json run report with request and timing metrics of all jobs, None to
+                    skip the report (metrics are still available in self.metrics).
+                tune_to_quota (bool): if true the budget is limited to the remaining api quota of the account at
+                    the start of the run (see requ_Mpstats.tune_to_api_limit).
+        """
+        self.jobs = jobs
+        self.max_workers = max_workers
+        self.limiter = TokenBucket(rate=1 / rate_limit if rate_limit else 0, capacity=max_workers, budget=budget)
+        self.status_file = status_file
+        self.cache = cache
+        self.report_file = report_file
+        self.tune_to_quota = tune_to_quota
+        self.metrics = RunMetrics()
+        self.apis = {}
+        self.status = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, file, **kwargs):
+        """
+            Create scheduler from json or yaml job file.
+            Args:
+                file (str): path to job file.
+                **kwargs: other JobScheduler parameters.
+
+            Returns:
+                scheduler (JobScheduler): scheduler of the jobs.
+        """
+        with open(file, 'r', encoding='utf8') as f:
+            if os.path.splitext(file)[1] in ('.yaml', '.yml'):
+                import yaml
+                config = yaml.safe_load(f)
+            else:
+                config = json.load(f)
+        return cls(config['jobs'], **kwargs)
+
+    def _api(self, marketplace):
+        """Get api client of the marketplace, all clients share one limiter, cache and metrics"""
+        if marketplace not in self.apis:
+            self.apis[marketplace] = requ_Mpstats(request=marketplace, max_workers=self.max_workers,
+                                                  limiter=self.limiter, cache=self.cache, metrics=self.metrics)
+        return self.apis[marketplace]
+
+    def _expand(self):
+        """
+            Expand jobs into loading targets.
+
+            Returns:
+                targets (list): list of _Target.
+        """
+        targets = []
+        for number, job in enumerate(self.jobs):
+            name = job.get('name', 'job' + str(number))
+            job['name'] = name
+            kind = job.get('kind', 'category')
+            save_directory = job.get('save_directory', '.')
+            if not os.path.exists(save_directory):
+                os.makedirs(save_directory)
+            save_date = period_label(job['start_date'], job['end_date'])
+            self.status[name] = {'status': 'pending', 'targets': {}}
+            for marketplace in job.get('marketplaces', ['wb']):
+                api = self._api(marketplace)
+                if kind == 'category':
+                    dates = api._date_list(start_date=job['start_date'], end_date=job['end_date'])
+                else:
+                    dates = api._date_list(start_date=job['start_date'], end_date=job['end_date'], interval=6)
+                for path in job['targets']:
+                    if kind == 'category':
+                        file_name = api._category_name(path)
+                    else:
+                        file_name = path
+                    save_path = save_directory + '/' + file_name + ' ' + marketplace + ' ' + save_date
+                    sink = open_sink(job.get('output', 'parquet'), save_path, marketplace=marketplace)
+                    targets.append(_Target(name, kind, path, marketplace, dates, sink))
+                    self.status[name]['targets'][marketplace + '/' + path] = {
+                        'status': 'pending', 'windows': len(dates), 'windows_done': 0, 'rows': 0, 'requests': 0}
+        return targets
+
+    def run(self):
+        """
+            Execute all jobs and save their status.
+
+            Returns:
+                status (dict): status of every job and target.
+        """
+        targets = self._expand()
+        if self.tune_to_quota and self.apis:
+            # all clients share the limiter and the account quota
+            remaining = next(iter(self.apis.values())).tune_to_api_limit()
+            if remaining is not None:
+                print('Remaining API quota: ' + str(remaining) + ' requests')
+        heap = []
+        sequence = 0
+        for target in targets:
+            for n, window in enumerate(target.dates):
+                # first pages go after pages of started windows, recent windows first if the sink takes any order
+                heapq.heappush(heap, (1, 1, self._recency(target, n), sequence, target, n, 0))
+                sequence = sequence + 1
+        for name in self.status:
+            self.status[name]['status'] = 'running'
+        self._save_status()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {}
+            while heap or futures:
+                while heap and len(futures) < self.max_workers:
+                    _, _, _, _, target, n, startRow = heapq.heappop(heap)
+                    if target.error is not None:
+                        continue
+                    api = self._api(target.marketplace)
+                    d1, d2 = target.dates[n]
+                    future = executor.submit(api._page_request, target.kind, d1, d2, target.path, startRow,
+                                             startRow + api.page_size)
+                    futures[future] = (target, n, startRow)
+                if not futures:
+                    break
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    target, n, startRow = futures.pop(future)
+                    target.requests = target.requests + 1
+                    # request and write errors fail only their target, other targets go on
+                    try:
+                        data, total = future.result()
+                        if target.error is not None:
+                            continue
+                        target.pages[(n, startRow)] = data
+                        if startRow == 0:
+                            page_size = self._api(target.marketplace).page_size
+                            next_rows = range(page_size, total, page_size)
+                            target.left[n] = len(next_rows)
+                            for next_row in next_rows:
+                                heapq.heappush(heap, (0, len(next_rows), self._recency(target, n), sequence,
+                                                      target, n, next_row))
+                                sequence = sequence + 1
+                        else:
+                            target.left[n] = target.left[n] - 1
+                        if target.left[n] == 0:
+                            target.loaded.add(n)
+                            self._write_ready(target)
+                    except Exception as e:
+                        if target.error is None:
+                            self._fail(target, e)
+
+        for target in targets:
+            if target.error is None:
+                try:
+                    target.sink.close()
+                except Exception as e:
+                    self._fail(target, e)
+        for name, job_status in self.status.items():
+            statuses = [status['status'] for status in job_status['targets'].values()]
+            job_status['status'] = 'failed' if 'failed' in statuses else 'done'
+        self._save_status()
+        if self.report_file is not None:
+            self.metrics.save(self.report_file)
+        return self.status
+
+    @staticmethod
+    def _recency(target, n):
+        """Priority of window n of the target: recent windows first, oldest first for ordered sinks"""
+        if target.sink.ordered:
+            return target.dates[n].end.toordinal()
+        return -target.dates[n].end.toordinal()
+
+    def _write_ready(self, target):
+        """Write loaded windows of the target to its sink (in date order if the sink requires it) and update status"""
+        api = self._api(target.marketplace)
+        if target.sink.ordered:
+            ready = []
+            while target.next_window in target.loaded:
+                ready.append(target.next_window)
+                target.next_window = target.next_window + 1
+        else:
+            ready = sorted(target.loaded)
+        for n in ready:
+            target.loaded.discard(n)
+            frame = api._pop_window(target.kind, target.pages, n, target.dates[n][1])
+            with self.metrics.timer('write'):
+                target.sink.write(frame, target.dates[n], 0)
+            target.rows = target.rows + frame.shape[0]
+            target.written = target.written + 1
+        status = self.status[target.job]['targets'][target.marketplace + '/' + target.path]
+        status['windows_done'] = target.written
+        status['rows'] = target.rows
+        status['requests'] = target.requests
+        if target.written == len(target.dates):
+            status['status'] = 'done'
+            print(target.job + ': ' + target.marketplace + '/' + target.path + ' Done!')
+        else:
+            status['status'] = 'running'
+        self._save_status()
+
+    def _fail(self, target, error):
+        """Mark the target as failed, its remaining tasks are skipped"""
+        target.error = error
+        target.pages = {}
+        status = self.status[target.job]['targets'][target.marketplace + '/' + target.path]
+        status['status'] = 'failed'
+        status['error'] = repr(error)
+        status['requests'] = target.requests
+        print(target.job + ': ' + target.marketplace + '/' + target.path + ' failed: ' + repr(error))
+        self._save_status()
+
+    def _save_status(self):
+        """Write status of jobs to temporary file and replace the status file"""
+        with self._lock:
+            temp_file = self.status_file + '.tmp'
+            with open(temp_file, 'w', encoding='utf8') as f:
+                json.dump(self.status, f, ensure_ascii=False, indent=1)
+            os.replace(temp_file, self.status_file)
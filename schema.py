@@ -0,0 +1,113 @@
+import pandas as pd
+
+
+def is_dropped(column):
+    """
+        Check if api column is not needed in results: graph columns (daily series) and group columns.
+        Args:
+            column (str): column name.
+
+        Returns:
+            bool: true if column should be dropped.
+    """
+    return column.endswith('graph') or 'group' in column
+
+
+def prune_records(records):
+    """
+        Remove unwanted keys from api records before they are flattened into frame.
+        Args:
+            records (list): list of dicts from api response.
+
+        Returns:
+            records (list): list of dicts without graph and group keys.
+    """
+    if not records:
+        return records
+    dropped = [key for key in records[0] if is_dropped(key)]
+    if not dropped:
+        return records
+    return [{key: value for key, value in record.items() if not is_dropped(key)} for record in records]
+
+
+def compact_frame(frame, categorical_ratio=0.5, downcast=False):
+    """
+        Reduce memory of api frame: repeated strings are converted to categoricals. Numbers are downcast only
+        with downcast, because the smallest type depends on values of the frame and pages or windows of one
+        result written separately (e.g. to parquet) must have the same types.
+        Args:
+            frame (pd.Dataframe): frame of api data.
+            categorical_ratio (float): string column becomes categorical if share of unique values is lower.
+            downcast (bool): downcast numbers (see downcast_frame). Default False
+
+        Returns:
+            frame (pd.Dataframe): frame with compact dtypes.
+    """
+    frame = frame.drop(columns=[col for col in frame.columns if is_dropped(col)])
+    rows = frame.shape[0]
+    if rows == 0:
+        return frame
+    for col in frame.columns:
+        series = frame[col]
+        if pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            try:
+                unique = series.nunique(dropna=True)
+            except TypeError:
+                # lists and dicts can't be categorical
+                continue
+            if unique < rows * categorical_ratio:
+                frame[col] = series.astype('category')
+    if downcast:
+        frame = downcast_frame(frame)
+    return frame
+
+
+def downcast_frame(frame):
+    """
+        Downcast numbers of the whole result: integers to the smallest type, floats to float32 if no precision is
+        lost. Must be called once on complete data, not on pages or windows.
+        Args:
+            frame (pd.Dataframe): frame of api data.
+
+        Returns:
+            frame (pd.Dataframe): frame with downcast numeric columns.
+    """
+    for col in frame.columns:
+        series = frame[col]
+        if pd.api.types.is_bool_dtype(series):
+            continue
+        elif pd.api.types.is_integer_dtype(series):
+            frame[col] = pd.to_numeric(series, downcast='integer')
+        elif pd.api.types.is_float_dtype(series):
+            compact = series.astype('float32')
+            if ((compact.astype('float64') == series) | series.isna()).all():
+                frame[col] = compact
+    return frame
+
+
+def concat_frames(frames, downcast=False):
+    """
+        Concatenate frames keeping categorical columns categorical (categories are united before concat).
+        Args:
+            frames (list): list of frames.
+            downcast (bool): downcast numbers of the result once (see downcast_frame). Default False
+
+        Returns:
+            frame (pd.Dataframe): concatenated frame.
+    """
+    categorical = {}
+    for frame in frames:
+        for col in frame.columns:
+            if isinstance(frame[col].dtype, pd.CategoricalDtype):
+                categorical.setdefault(col, []).append(frame[col].cat.categories)
+    for col, categories in categorical.items():
+        united = categories[0]
+        for other in categories[1:]:
+            united = united.union(other)
+        for frame in frames:
+            if col in frame.columns and isinstance(frame[col].dtype, pd.CategoricalDtype):
+                frame[col] = frame[col].cat.set_categories(united)
+    frame = pd.concat(frames, sort=False, axis=0, ignore_index=True)
+    if downcast:
+        frame = downcast_frame(frame)
+    return frame
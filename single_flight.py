@@ -0,0 +1,152 @@
+import os
+import time
+import hashlib
+import threading
+
+
+class _Call:
+    """Request in flight: followers wait for the event and take result or error of the leader"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+        Coalescing of identical requests: while a request with some key is executed, other threads asking for the
+        same key wait for it and get its result instead of sending the request again. With lock_directory
+        identical requests of several processes are also executed one at a time (lock file per key), so together
+        with a shared ResponseCache the second process finds the response in cache instead of loading it again.
+
+        Usage:
+            flight = SingleFlight()
+            result, shared = flight.do(key, lambda: load(key))
+    """
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, lock_directory=None, stale=600, poll=0.1):
+        """
+            Args:
+                lock_directory (str): directory for lock files of cross-process coalescing, None - only in-process.
+                stale (float): age in seconds after which lock file is considered left by a crashed process.
+                poll (float): pause in seconds between checks of busy lock file.
+        """
+        self.lock_directory = lock_directory
+        self.stale = stale
+        self.poll = poll
+        self.calls = {}
+        self.executed = 0
+        self.shared = 0
+        self._lock = threading.Lock()
+        if lock_directory is not None and not os.path.exists(lock_directory):
+            os.makedirs(lock_directory, exist_ok=True)
+
+    @classmethod
+    def default(cls):
+        """Get in-process instance shared by all clients which don't get their own"""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    def do(self, key, function, retry_on=(), cross_process=True):
+        """
+            Execute function once for all concurrent calls with the same key.
+            Args:
+                key (str): request key, identical requests must have equal keys.
+                function: function without arguments executing the request.
+                retry_on (tuple): exception types of the leader which are not shared, followers execute the request
+                    themselves instead (e.g. cancellation of the leader's load).
+                cross_process (bool): take lock file of the key if lock_directory is set. Default True
+
+            Returns:
+                result, shared (bool): result of the function and true if it was taken from another call.
+        """
+        while True:
+            with self._lock:
+                call = self.calls.get(key)
+                if call is None:
+                    call = _Call()
+                    self.calls[key] = call
+                    leader = True
+                else:
+                    leader = False
+            if leader:
+                return self._lead(key, call, function, cross_process), False
+            call.event.wait()
+            if call.error is None:
+                with self._lock:
+                    self.shared = self.shared + 1
+                return call.result, True
+            if not isinstance(call.error, retry_on):
+                raise call.error
+
+    def _lead(self, key, call, function, cross_process):
+        """Execute function for the call under lock file and pass its result or error to the followers"""
+        try:
+            lock_file = None
+            if cross_process:
+                lock_file = self._acquire_file(key)
+            try:
+                call.result = function()
+            finally:
+                self._release_file(lock_file)
+            with self._lock:
+                self.executed = self.executed + 1
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self.calls[key]
+            call.event.set()
+
+    def _acquire_file(self, key):
+        """
+            Create lock file of the key, waiting while it is held by another process.
+
+            Returns:
+                lock_file (str): path of created lock file, None without lock_directory.
+        """
+        if self.lock_directory is None:
+            return None
+        lock_file = os.path.join(self.lock_directory, hashlib.sha1(key.encode('utf8')).hexdigest() + '.lock')
+        while True:
+            try:
+                descriptor = os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock_file) > self.stale:
+                        os.remove(lock_file)
+                        continue
+                except OSError:
+                    # lock file is removed by its owner right now
+                    continue
+                time.sleep(self.poll)
+                continue
+            os.write(descriptor, str(os.getpid()).encode())
+            os.close(descriptor)
+            return lock_file
+
+    def _release_file(self, lock_file):
+        """Remove lock file"""
+        if lock_file is not None:
+            try:
+                os.remove(lock_file)
+            except OSError:
+                pass
+
+    def stats(self):
+        """
+            Get coalescing statistics.
+
+            Returns:
+                stats (dict): number of executed calls, calls answered by another call and calls in flight.
+        """
+        with self._lock:
+            return {'executed': self.executed, 'shared': self.shared, 'in_flight': len(self.calls)}
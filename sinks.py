@@ -0,0 +1,309 @@
+import os
+import json
+import pandas as pd
+
+
+class CsvSink:
+    """Output sink appending frames to one csv file. Columns of the first frame are used for the whole file"""
+    # frames must be written in date order
+    ordered = True
+
+    def __init__(self, file, append=False, size=None):
+        """
+            Args:
+                file (str): path to result csv file.
+                append (bool): if true frames are appended to existing file with its columns, else existing file
+                    is overwritten. Default False
+                size (int): with append, existing file is cut to this size first, so rows written after the last
+                    committed size (e.g. by interrupted run) are dropped. None to keep the whole file.
+        """
+        self.file = file
+        self.columns = None
+        self.rows = 0
+        if append and size is not None and os.path.isfile(file) and os.path.getsize(file) > size:
+            with open(file, 'r+b') as f:
+                f.truncate(size)
+        if append and os.path.isfile(file):
+            self.columns = list(pd.read_csv(file, sep=';', encoding='utf-8-sig', nrows=0).columns)
+
+    def write(self, frame, window=None, part=0):
+        """
+            Append frame to the file.
+            Args:
+                frame (pd.Dataframe): loaded data.
+                window (tuple): pair of dates of the data.
+                part (int): first row of the data in the window.
+
+            Returns:
+                None
+        """
+        if frame.shape[0] == 0:
+            return
+        if self.columns is None:
+            self.columns = list(frame.columns)
+            frame.to_csv(self.file, sep=';', encoding='utf-8-sig', index=False)
+        else:
+            frame.reindex(columns=self.columns).to_csv(self.file, sep=';', encoding='utf-8', index=False, mode='a',
+                                                       header=False)
+        self.rows = self.rows + frame.shape[0]
+
+    def close(self):
+        """Nothing to finish, every frame is already in the file"""
+        pass
+
+
+class ExcelSink:
+    """Output sink collecting frames and saving them into one xlsx file on close (openpyxl can't append)"""
+    ordered = True
+
+    def __init__(self, file):
+        """
+            Args:
+                file (str): path to result xlsx file.
+        """
+        self.file = file
+        self.frames = []
+        self.rows = 0
+
+    def write(self, frame, window=None, part=0):
+        """
+            Add frame to the file data.
+            Args:
+                frame (pd.Dataframe): loaded data.
+                window (tuple): pair of dates of the data.
+                part (int): first row of the data in the window.
+
+            Returns:
+                None
+        """
+        if frame.shape[0] == 0:
+            return
+        self.frames.append(frame)
+        self.rows = self.rows + frame.shape[0]
+
+    def close(self):
+        """Save collected frames to the file"""
+        if self.frames:
+            pd.concat(self.frames, sort=False, axis=0, ignore_index=True).to_excel(self.file, engine='openpyxl')
+        self.frames = []
+
+
+class ShardedCsvSink:
+    """
+        Output sink streaming frames into numbered csv shards: save_path_1.csv, save_path_2.csv, ... New shard is
+        started when the current one reaches max_rows or max_bytes, frames are split between shards if needed.
+        Every shard has header with columns of the first frame. Shards are listed in json manifest
+        save_path shards.json (file, rows, bytes, first and last window), which is updated on every new shard
+        and on close. Shards of previous runs beyond the new ones are removed on close. Only current chunk of rows
+        is held in memory.
+    """
+    ordered = True
+
+    def __init__(self, save_path, max_rows=1000000, max_bytes=None, chunk_rows=10000):
+        """
+            Args:
+                save_path (str): path of the result without extension.
+                max_rows (int): maximal number of rows in one shard (xlsx limit is 1048576 rows).
+                max_bytes (int): maximal size of one shard in bytes, None - no limit.
+                chunk_rows (int): number of rows rendered to csv at once.
+        """
+        self.save_path = save_path
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.chunk_rows = chunk_rows
+        self.manifest_file = save_path + ' shards.json'
+        self.columns = None
+        self.rows = 0
+        self.shards = []
+        self._handle = None
+
+    def _open_shard(self):
+        """Close current shard and start the next one with header"""
+        self._close_shard()
+        file = self.save_path + '_' + str(len(self.shards) + 1) + '.csv'
+        self._handle = open(file, 'wb')
+        header = pd.DataFrame(columns=self.columns).to_csv(sep=';', index=False)
+        self._handle.write(header.encode('utf-8-sig'))
+        self.shards.append({'file': os.path.basename(file), 'rows': 0, 'bytes': self._handle.tell(),
+                            'first_window': None, 'last_window': None})
+        self._save_manifest(complete=False)
+
+    def _close_shard(self):
+        """Close file of current shard"""
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def write(self, frame, window=None, part=0):
+        """
+            Append frame to current shard, starting new shards when it is full.
+            Args:
+                frame (pd.Dataframe): loaded data.
+                window (tuple): pair of dates of the data.
+                part (int): first row of the data in the window.
+
+            Returns:
+                None
+        """
+        if frame.shape[0] == 0:
+            return
+        if self.columns is None:
+            self.columns = list(frame.columns)
+        else:
+            frame = frame.reindex(columns=self.columns)
+        start = 0
+        while start < frame.shape[0]:
+            if self._handle is None or self.shards[-1]['rows'] >= self.max_rows:
+                self._open_shard()
+            shard = self.shards[-1]
+            chunk = frame.iloc[start:start + min(self.chunk_rows, self.max_rows - shard['rows'])]
+            content = chunk.to_csv(sep=';', index=False, header=False).encode('utf-8')
+            if self.max_bytes is not None and shard['rows'] and shard['bytes'] + len(content) > self.max_bytes:
+                self._open_shard()
+                shard = self.shards[-1]
+            self._handle.write(content)
+            shard['rows'] = shard['rows'] + chunk.shape[0]
+            shard['bytes'] = shard['bytes'] + len(content)
+            if window is not None:
+                name = window[0] + '_' + window[1]
+                if shard['first_window'] is None:
+                    shard['first_window'] = name
+                shard['last_window'] = name
+            start = start + chunk.shape[0]
+        self.rows = self.rows + frame.shape[0]
+
+    def close(self):
+        """Close current shard, remove shards left by previous runs and save complete manifest"""
+        self._close_shard()
+        # previous run to the same path could write more shards, they are not part of this result
+        n = len(self.shards) + 1
+        while os.path.exists(self.save_path + '_' + str(n) + '.csv'):
+            os.remove(self.save_path + '_' + str(n) + '.csv')
+            n = n + 1
+        if self.shards:
+            self._save_manifest(complete=True)
+        elif os.path.exists(self.manifest_file):
+            os.remove(self.manifest_file)
+
+    def _save_manifest(self, complete):
+        """Save list of shards to the manifest file, complete is false while shards are written"""
+        manifest = {'complete': complete, 'rows': sum(shard['rows'] for shard in self.shards),
+                    'columns': self.columns, 'shards': self.shards}
+        temp_file = self.manifest_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(temp_file, self.manifest_file)
+
+
+class ParquetSink:
+    """
+        Output sink writing every page into parquet dataset partitioned by marketplace and date window:
+        directory/marketplace=wb/window=2023-03-01_2023-03-31/part-00000.parquet. Requires pyarrow.
+        Arrow schema is fixed by the first page and later pages are cast to it, so all parts of the dataset have
+        the same types. Columns which are empty (null type) or narrower in earlier pages are promoted by later
+        pages, parts written before the promotion are cast to the final schema on close.
+    """
+    # pages can be written in any order
+    ordered = False
+
+    def __init__(self, directory, marketplace='wb', compression='snappy'):
+        """
+            Args:
+                directory (str): root directory of the dataset.
+                marketplace (str): marketplace partition value ('wb' or 'oz').
+                compression (str): parquet compression codec.
+        """
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('ParquetSink requires pyarrow, install it with: pip install pyarrow')
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.directory = directory
+        self.marketplace = marketplace
+        self.compression = compression
+        self.schema = None
+        # schema of every written part file
+        self.parts = {}
+        self.rows = 0
+
+    def _table(self, frame):
+        """
+            Convert frame to arrow table of the dataset schema, promoting the schema if needed.
+            Args:
+                frame (pd.Dataframe): loaded data.
+
+            Returns:
+                table (pyarrow.Table): table with self.schema.
+        """
+        table = self._pa.Table.from_pandas(frame, preserve_index=False)
+        table = table.replace_schema_metadata(None)
+        if self.schema is None:
+            self.schema = table.schema
+            return table
+        schema = self._pa.unify_schemas([self.schema, table.schema], promote_options='permissive')
+        if not schema.equals(self.schema):
+            self.schema = schema
+        return self._conform(table)
+
+    def _conform(self, table):
+        """Cast table to self.schema, missing columns are filled with nulls"""
+        columns = []
+        for field in self.schema:
+            if field.name in table.column_names:
+                columns.append(table.column(field.name).cast(field.type))
+            else:
+                columns.append(self._pa.nulls(table.num_rows, field.type))
+        return self._pa.Table.from_arrays(columns, schema=self.schema)
+
+    def write(self, frame, window, part=0):
+        """
+            Write frame as one part file of the window partition.
+            Args:
+                frame (pd.Dataframe): loaded data.
+                window (tuple): pair of dates of the data.
+                part (int): first row of the data in the window, used for part file name.
+
+            Returns:
+                None
+        """
+        if frame.shape[0] == 0:
+            return
+        folder = os.path.join(self.directory, 'marketplace=' + self.marketplace,
+                              'window=' + window[0] + '_' + window[1])
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        table = self._table(frame)
+        file = os.path.join(folder, 'part-%08d.parquet' % part)
+        self._pq.write_table(table, file, compression=self.compression)
+        self.parts[file] = table.schema
+        self.rows = self.rows + frame.shape[0]
+
+    def close(self):
+        """Cast parts written before schema promotion to the final schema"""
+        for file, schema in self.parts.items():
+            if not schema.equals(self.schema):
+                table = self._conform(self._pq.read_table(file, partitioning=None))
+                self._pq.write_table(table, file, compression=self.compression)
+                self.parts[file] = self.schema
+
+
+def open_sink(output, save_path, marketplace='wb'):
+    """
+        Create output sink by format name.
+        Args:
+            output (str): 'parquet', 'csv' or 'xlsx'.
+            save_path (str): path of the result without extension (directory for parquet).
+            marketplace (str): marketplace of loaded data.
+
+        Returns:
+            sink: output sink.
+    """
+    if output == 'parquet':
+        return ParquetSink(save_path, marketplace=marketplace)
+    elif output == 'csv':
+        return CsvSink(save_path + '.csv')
+    elif output == 'xlsx':
+        return ExcelSink(save_path + '.xlsx')
+    raise ValueError('Unknown output format: ' + str(output))
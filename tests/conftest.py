@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pytest
+
+# modules of the package are top-level modules of the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from API_Mpstats import requ_Mpstats
+from mock_server import MockMpstats
+from single_flight import SingleFlight
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Temporary working directory with token.txt, requ_Mpstats reads the token from the working directory"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'token.txt').write_text('test-token', encoding='utf8')
+    return tmp_path
+
+
+@pytest.fixture
+def mock():
+    """Local stand-in of the api, modules override the fixture for other server settings"""
+    with MockMpstats() as server:
+        yield server
+
+
+@pytest.fixture
+def make_client(workdir):
+    """Factory of clients of a mock server without rate limit and with own SingleFlight, clients are closed after
+    the test: make_client(mock, max_workers=2, **other requ_Mpstats parameters)"""
+    clients = []
+
+    def make(server, max_workers=4, **kwargs):
+        kwargs.setdefault('single_flight', SingleFlight())
+        client = requ_Mpstats(max_workers=max_workers, rate_limit=0, **kwargs)
+        client.url = server.url
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+@pytest.fixture
+def api(mock, make_client):
+    """Client of the mock server"""
+    return make_client(mock)
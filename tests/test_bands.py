@@ -0,0 +1,53 @@
+import pytest
+
+from mock_server import MockMpstats
+
+
+@pytest.fixture
+def mock():
+    with MockMpstats(total=3000, graph_points=1) as server:
+        yield server
+
+
+def load_ids(api, max_window_rows):
+    """Ids of all rows of one monthly window loaded by pages or by revenue bands"""
+    api.max_window_rows = max_window_rows
+    dates = api._date_list('2023-01-01', '2023-01-31')
+    ids = []
+    for n, startRow, data, last in api._iter_loaded_pages('category', 'Bench/Category', dates):
+        ids.extend(row['id'] for row in data)
+    return sorted(ids)
+
+
+def test_banded_load_equals_unsplit_load(api, capsys):
+    api.page_size = 500
+    ids = load_ids(api, None)
+    assert len(ids) == 3000
+    assert load_ids(api, 400) == ids
+    bands = api._plan_bands('category', '2023-01-01', '2023-01-31', 'Bench/Category', 3000, 2500000)
+    assert sum(count for low, high, count in bands) == 3000
+    assert all(count <= 400 or high - low <= 1 for low, high, count in bands)
+    assert 'not loaded' not in capsys.readouterr().out
+
+
+def test_rows_without_revenue_and_on_bounds_are_loaded(mock, api, capsys):
+    # every tenth row has no revenue, rows without revenue go first, so the first page gives no top revenue;
+    # odd revenues end with .5 and some of them are on bisection bounds
+    mock._revenue = lambda i: None if i % 10 == 0 else (i % 500) * 1.5
+    api.page_size = 200
+    ids = load_ids(api, None)
+    assert len(ids) == 3000
+    assert load_ids(api, 400) == ids
+    bands = api._plan_bands('category', '2023-01-01', '2023-01-31', 'Bench/Category', 3000, None)
+    assert (None, None, 300) in bands
+    assert any(low == high for low, high, count in bands if low is not None)
+    assert sum(count for low, high, count in bands) == 3000
+    assert 'not loaded' not in capsys.readouterr().out
+
+
+def test_rows_outside_bands_are_reported(mock, api, capsys):
+    mock._revenue = lambda i: -1 if i % 100 == 0 else i % 500
+    api.max_window_rows = 400
+    bands = api._plan_bands('category', '2023-01-01', '2023-01-31', 'Bench/Category', 3000, 499)
+    assert sum(count for low, high, count in bands) == 3000 - 30
+    assert '30 rows of Bench/Category 2023-01-01 - 2023-01-31 are not in revenue bands' in capsys.readouterr().out
@@ -0,0 +1,123 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from date_windows import date_windows, day_label, period_label
+
+
+def legacy_date_list(start_date, end_date, interval=32):
+    """_date_list before date_windows module, reference for months (32) and weeks (6)"""
+    dates = []
+    current_date = datetime.strptime(start_date, '%Y-%m-%d')
+    end_date = datetime.strptime(end_date, '%Y-%m-%d')
+    while current_date <= end_date:
+        if interval == 32:
+            first_day = datetime(current_date.year, current_date.month, 1)
+            last_day = datetime(current_date.year, current_date.month, 1) + timedelta(days=32)
+            last_day = last_day.replace(day=1) - timedelta(days=1)
+            dates.append((first_day.strftime('%Y-%m-%d'), last_day.strftime('%Y-%m-%d')))
+            current_date = last_day + timedelta(days=1)
+        elif interval == 6:
+            week_start = current_date - timedelta(days=current_date.weekday())
+            week_end = week_start + timedelta(days=6)
+            if week_end > end_date:
+                week_end = end_date
+            dates.append((week_start.strftime('%Y-%m-%d'), week_end.strftime('%Y-%m-%d')))
+            current_date = week_end + timedelta(days=1)
+    return dates
+
+
+def pairs(windows):
+    return [tuple(window) for window in windows]
+
+
+def test_months_over_year_rollover():
+    assert pairs(date_windows('2023-11-15', '2024-02-10', 'month')) == [
+        ('2023-11-01', '2023-11-30'), ('2023-12-01', '2023-12-31'), ('2024-01-01', '2024-01-31'),
+        ('2024-02-01', '2024-02-29')]
+
+
+def test_month_clip_end():
+    assert pairs(date_windows('2023-12-05', '2024-01-10', 'month', clip_end=True)) == [
+        ('2023-12-01', '2023-12-31'), ('2024-01-01', '2024-01-10')]
+
+
+def test_quarters():
+    assert pairs(date_windows('2023-11-15', '2024-04-01', 'quarter')) == [
+        ('2023-10-01', '2023-12-31'), ('2024-01-01', '2024-03-31'), ('2024-04-01', '2024-06-30')]
+
+
+def test_rolling_months_from_31st():
+    assert pairs(date_windows('2023-01-31', '2023-04-01', 'month', rolling=True)) == [
+        ('2023-01-31', '2023-02-27'), ('2023-02-28', '2023-03-30'), ('2023-03-31', '2023-04-29')]
+
+
+def test_leap_day():
+    assert pairs(date_windows('2024-02-29', '2024-03-01', 'day')) == [
+        ('2024-02-29', '2024-02-29'), ('2024-03-01', '2024-03-01')]
+    assert pairs(date_windows('2024-02-29', '2025-03-01', 'month', size=12, rolling=True)) == [
+        ('2024-02-29', '2025-02-27'), ('2025-02-28', '2026-02-27')]
+    assert pairs(date_windows('2023-02-01', '2023-02-28', 'month')) == [('2023-02-01', '2023-02-28')]
+
+
+def test_weeks_over_year_rollover():
+    assert pairs(date_windows('2023-12-27', '2024-01-09', 'week', clip_end=True)) == [
+        ('2023-12-25', '2023-12-31'), ('2024-01-01', '2024-01-07'), ('2024-01-08', '2024-01-09')]
+
+
+def test_n_day_windows():
+    assert pairs(date_windows('2023-12-25', '2024-01-20', 'day', size=10, clip_end=True)) == [
+        ('2023-12-25', '2024-01-03'), ('2024-01-04', '2024-01-13'), ('2024-01-14', '2024-01-20')]
+
+
+def test_empty_and_invalid():
+    assert date_windows('2024-01-02', '2024-01-01') == []
+    with pytest.raises(ValueError):
+        date_windows('2024-01-01', '2024-02-01', 'year')
+    with pytest.raises(ValueError):
+        date_windows('2024-01-01', '2024-02-01', size=0)
+
+
+def test_labels():
+    window = date_windows('2023-12-05', '2023-12-06', 'month')[0]
+    assert window.label == '01.12.2023-31.12.2023'
+    assert window.end_label == '31.12.2023'
+    assert window.start == date(2023, 12, 1) and window.end == date(2023, 12, 31)
+    assert window.days == 31
+    assert day_label('2024-02-29') == '29.02.2024'
+    assert period_label('2023-01-01', '2023-03-31') == '01.01.2023-31.03.2023'
+
+
+@pytest.mark.parametrize('freq', ['day', 'week', 'month', 'quarter'])
+@pytest.mark.parametrize('size', [1, 2, 5])
+@pytest.mark.parametrize('rolling', [False, True])
+def test_windows_are_contiguous_and_cover_range(freq, size, rolling):
+    for start, end in [('2023-01-31', '2024-03-02'), ('2023-12-31', '2024-01-01'), ('2024-02-29', '2024-12-31')]:
+        windows = date_windows(start, end, freq, size, rolling)
+        assert windows[0].start <= date.fromisoformat(start)
+        assert windows[-1].start <= date.fromisoformat(end) <= windows[-1].end
+        if rolling or freq == 'day':
+            assert windows[0][0] == start
+        for previous, window in zip(windows, windows[1:]):
+            assert (window.start - previous.end).days == 1
+            assert window.start <= window.end
+
+
+def test_equal_to_legacy_date_list():
+    starts = [date(2019, 12, 1) + timedelta(days=day) for day in range(0, 1600, 37)]
+    for start in starts:
+        for length in (0, 1, 6, 27, 29, 31, 59, 92, 366, 400):
+            start_date = start.isoformat()
+            end_date = (start + timedelta(days=length)).isoformat()
+            assert pairs(date_windows(start_date, end_date, 'month')) == legacy_date_list(start_date, end_date, 32)
+            assert pairs(date_windows(start_date, end_date, 'week', clip_end=True)) == \
+                legacy_date_list(start_date, end_date, 6)
+
+
+def test_date_list_uses_windows(workdir):
+    from API_Mpstats import requ_Mpstats
+    api = requ_Mpstats()
+    assert pairs(api._date_list('2023-12-15', '2024-02-10')) == legacy_date_list('2023-12-15', '2024-02-10', 32)
+    assert pairs(api._date_list('2023-12-15', '2024-02-10', interval=6)) == \
+        legacy_date_list('2023-12-15', '2024-02-10', 6)
+    api.close()
@@ -0,0 +1,105 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip('sqlalchemy')
+
+import db_wb
+
+
+@pytest.fixture
+def table(tmp_path):
+    db_wb.connect('sqlite:///' + str(tmp_path / 'test.db'))
+    db_wb.metadata.clear()
+    frame = pd.DataFrame({'sku': [1, 1, 2], 'date': ['01.03.2023', '01.03.2023', '01.03.2023'],
+                          'sales': [5, 7, 3]})
+    table = db_wb.create_table('brand_test', frame)
+    # old table filled row by row without unique key
+    with db_wb.get_engine().begin() as connection:
+        connection.execute(table.insert(), frame.to_dict('records'))
+    yield table
+    db_wb.get_engine().dispose()
+    db_wb.metadata.clear()
+
+
+def read(table):
+    with db_wb.get_engine().connect() as connection:
+        return pd.read_sql('SELECT sku, date, sales FROM ' + table.name + ' ORDER BY sku', connection)
+
+
+def test_bulk_upsert_duplicates_raise_clear_error(table):
+    new = pd.DataFrame({'sku': [2], 'date': ['01.03.2023'], 'sales': [4]})
+    with pytest.raises(ValueError, match='duplicated keys'):
+        db_wb.bulk_upsert(table, new)
+    assert read(table)['sales'].tolist() == [5, 7, 3]
+
+
+def test_bulk_upsert_dedupe_keeps_last_row(table):
+    new = pd.DataFrame({'sku': [2, 3], 'date': ['01.03.2023', '01.03.2023'], 'sales': [4, 1]})
+    assert db_wb.bulk_upsert(table, new, dedupe=True) == 2
+    assert read(table).values.tolist() == [[1, '01.03.2023', 7], [2, '01.03.2023', 4], [3, '01.03.2023', 1]]
+    # index exists now, next load doesn't check duplicates again
+    assert db_wb.bulk_upsert(table, new.assign(sales=[6, 2])) == 2
+    assert read(table)['sales'].tolist() == [7, 6, 2]
+
+
+class FakeCursor:
+    """Cursor of fake PostgreSQL connection, keeps csv sent by COPY"""
+
+    def __init__(self, copies):
+        self.copies = copies
+
+    def execute(self, statement):
+        pass
+
+    def copy_expert(self, statement, buffer):
+        self.copies.append(buffer.read())
+
+
+class FakeConnection:
+    def __init__(self, copies):
+        self.copies = copies
+
+    def cursor(self):
+        return FakeCursor(self.copies)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class DialectEngine:
+    """SQLite engine reporting another dialect, raw connections of postgresql record COPY data"""
+
+    def __init__(self, engine, name):
+        self.engine = engine
+        self.dialect = type('Dialect', (), {'name': name})()
+        self.copies = []
+
+    def begin(self):
+        return self.engine.begin()
+
+    def connect(self):
+        return self.engine.connect()
+
+    def raw_connection(self):
+        return FakeConnection(self.copies)
+
+
+def test_copy_writes_integers_with_missing_values_without_decimals(table, monkeypatch):
+    engine = DialectEngine(db_wb.get_engine(), 'postgresql')
+    monkeypatch.setattr(db_wb, 'get_engine', lambda: engine)
+    new = pd.DataFrame({'sku': [4, 5], 'date': ['01.03.2023', '01.03.2023'], 'sales': [12, None]})
+    assert new['sales'].dtype == 'float64'
+    assert db_wb.bulk_upsert(table, new, dedupe=True) == 2
+    assert engine.copies == ['4,01.03.2023,12\n5,01.03.2023,\n']
+
+
+def test_other_databases_are_merged_row_by_row(table, monkeypatch):
+    engine = DialectEngine(db_wb.get_engine(), 'mssql')
+    monkeypatch.setattr(db_wb, 'get_engine', lambda: engine)
+    new = pd.DataFrame({'id': [10], 'sku': [4], 'date': ['01.03.2023'], 'sales': [1], 'unknown': ['x']})
+    assert db_wb.bulk_upsert(table, new) == 1
+    assert read(table)['sku'].tolist() == [1, 1, 2, 4]
+    assert engine.copies == []
@@ -0,0 +1,110 @@
+import threading
+import time
+from email.utils import formatdate
+
+import pytest
+import requests
+
+from API_Mpstats import requ_Mpstats, TokenBucket, LoadCancelled
+from mock_server import MockMpstats
+
+
+def test_requests_are_recorded_in_metrics_not_printed(api, capsys):
+    api._get_sku_info([1, 2])
+    api._get_sku_info([3])
+    assert capsys.readouterr().out == ''
+    statuses = api.metrics.report()['endpoints']['wb/get/items/batch']['statuses']
+    assert statuses == {'200': 2}
+
+
+def test_429_responses_are_retried(make_client):
+    with MockMpstats(error_rate=0.5, retry_after=0.01, seed=1) as server:
+        api = make_client(server, retries=20)
+        info = api.load_sku_info(list(range(1, 1001)))
+    assert sorted(info['id']) == list(range(1, 1001))
+    endpoint = api.metrics.report()['endpoints']['wb/get/items/batch']
+    assert endpoint['statuses']['429'] == endpoint['retries'] > 0
+    assert endpoint['statuses']['200'] == 5
+
+
+def test_retry_after_is_respected_and_last_error_raised(make_client):
+    with MockMpstats(error_rate=1.0, retry_after=0.2) as server:
+        api = make_client(server, retries=2, backoff=0)
+        start = time.perf_counter()
+        with pytest.raises(requests.HTTPError):
+            api._get_sku_info([1])
+        seconds = time.perf_counter() - start
+    # two pauses of Retry-After, backoff is 0
+    assert 0.4 <= seconds < 2
+    assert api.metrics.report()['endpoints']['wb/get/items/batch']['statuses'] == {'429': 3}
+
+
+def test_connection_errors_are_retried_with_backoff(workdir):
+    api = requ_Mpstats(rate_limit=0, retries=2, backoff=0.05, timeout=1)
+    # nothing listens on the port of stopped server
+    with MockMpstats() as server:
+        api.url = server.url
+    start = time.perf_counter()
+    with pytest.raises(requests.ConnectionError):
+        api.get_api_limit()
+    seconds = time.perf_counter() - start
+    api.close()
+    # exponential pauses 0.05 and 0.1 with jitter up to the same value
+    assert 0.15 <= seconds < 1
+    endpoint = api.metrics.report()['endpoints']['user/report_api_limit']
+    assert endpoint['errors'] == 3 and endpoint['retries'] == 2
+
+
+def test_budget_exhaustion_stops_requests(mock, make_client):
+    api = make_client(mock, limiter=TokenBucket(rate=0, budget=2))
+    api._get_sku_info([1])
+    api._get_sku_info([2])
+    with pytest.raises(RuntimeError, match='quota is exhausted'):
+        api._get_sku_info([3])
+    assert mock.counts['items'] == 2
+
+
+def test_cancel_interrupts_retry_pause(make_client):
+    with MockMpstats(error_rate=1.0, retry_after=30) as server:
+        api = make_client(server)
+        threading.Timer(0.2, api.cancel).start()
+        start = time.perf_counter()
+        with pytest.raises(LoadCancelled):
+            api._get_sku_info([1])
+    assert time.perf_counter() - start < 5
+
+
+class Response:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+def test_retry_after_header_formats(api):
+    assert api._retry_after(None) is None
+    assert api._retry_after(Response({})) is None
+    assert api._retry_after(Response({'Retry-After': '2.5'})) == 2.5
+    assert 8 < api._retry_after(Response({'Retry-After': formatdate(time.time() + 10, usegmt=True)})) <= 10
+    assert api._retry_after(Response({'Retry-After': 'soon'})) is None
+
+
+def test_tune_to_api_limit(mock, make_client):
+    api = make_client(mock, limiter=TokenBucket(rate=10, budget=None))
+    remaining = api.tune_to_api_limit(period=36000)
+    # the limit request is counted as used by the mock
+    assert remaining == 100000 - 1
+    assert api.limiter.budget == remaining
+    assert api.limiter.rate == remaining / 36000
+    # higher rate of the quota doesn't raise the rate of the limiter
+    api.tune_to_api_limit(period=1)
+    assert api.limiter.rate == remaining / 36000
+    # smaller budget is kept, the limit request takes one request of it
+    api.limiter.budget = 5
+    api.tune_to_api_limit()
+    assert api.limiter.budget == 4
+
+
+def test_remaining_quota_formats():
+    assert requ_Mpstats._remaining_quota({'limit': 100, 'used': 30}) == 70
+    assert requ_Mpstats._remaining_quota({'remaining': 12}) == 12
+    assert requ_Mpstats._remaining_quota([{'limit': 100, 'used': 95}, {'remaining': 50}]) == 5
+    assert requ_Mpstats._remaining_quota({'message': 'error'}) is None
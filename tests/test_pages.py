@@ -0,0 +1,72 @@
+import pytest
+
+from mock_server import MockMpstats
+
+
+@pytest.fixture
+def mock():
+    with MockMpstats(total=3000, latency=0.02) as server:
+        yield server
+
+
+@pytest.fixture
+def api(mock, make_client):
+    return make_client(mock, max_workers=2)
+
+
+def test_failed_page_stops_queued_pages(api, monkeypatch):
+    sent = []
+    page_request = api._page_request
+
+    def failing_request(kind, d1, d2, path, startRow, endRow, band=None):
+        sent.append(d1)
+        if d1 == '2023-03-01':
+            raise RuntimeError('Mpstats API quota is exhausted')
+        return page_request(kind, d1, d2, path, startRow, endRow, band)
+
+    monkeypatch.setattr(api, '_page_request', failing_request)
+    dates = api._date_list('2023-01-01', '2024-12-31')
+    with pytest.raises(RuntimeError):
+        for page in api._iter_loaded_pages('category', 'Bench/Category', dates):
+            pass
+    # windows after the failed one are not requested, only pages already running finish
+    assert len(sent) < 3 + api.max_workers + 1
+
+
+def test_closed_generator_stops_queued_pages(api, monkeypatch):
+    sent = []
+    page_request = api._page_request
+
+    def counting_request(*args):
+        sent.append(args)
+        return page_request(*args)
+
+    monkeypatch.setattr(api, '_page_request', counting_request)
+    dates = api._date_list('2023-01-01', '2024-12-31')
+    pages = api._iter_loaded_pages('category', 'Bench/Category', dates)
+    next(pages)
+    pages.close()
+    assert len(sent) < len(dates)
+
+
+def test_pages_of_started_windows_go_first(make_client):
+    with MockMpstats(total=1500, graph_points=1) as server:
+        api = make_client(server, max_workers=4)
+        api.page_size = 500
+        dates = api._date_list('2022-01-01', '2023-12-31')
+        # pages are held until their window and all windows before it are loaded, like _iter_windows does
+        buffered = {}
+        loaded = set()
+        next_window = 0
+        peak = 0
+        for n, startRow, data, last in api._iter_loaded_pages('category', 'Bench/Category', dates):
+            buffered[n] = buffered.get(n, 0) + len(data)
+            if last:
+                loaded.add(n)
+            peak = max(peak, sum(buffered.values()))
+            while next_window in loaded:
+                buffered.pop(next_window)
+                next_window = next_window + 1
+    assert next_window == len(dates)
+    # no more than max_workers windows of 1500 rows are open at once, not the whole history
+    assert peak <= api.max_workers * 1500
@@ -0,0 +1,95 @@
+import json
+
+import sinks
+from mock_server import MockMpstats
+from scheduler import JobScheduler
+
+
+def test_write_error_fails_only_its_target(workdir, make_client, monkeypatch):
+    tmp_path = workdir
+    write = sinks.CsvSink.write
+
+    def failing_write(self, frame, window=None, part=0):
+        if 'Broken' in self.file:
+            raise OSError('No space left on device')
+        return write(self, frame, window, part)
+
+    monkeypatch.setattr(sinks.CsvSink, 'write', failing_write)
+    jobs = [{'name': 'job', 'kind': 'category', 'targets': ['Bench/Category', 'Bench/Broken'],
+             'start_date': '2023-01-01', 'end_date': '2023-02-28', 'output': 'csv',
+             'save_directory': str(tmp_path / 'data')}]
+    with MockMpstats(total=3000) as mock:
+        scheduler = JobScheduler(jobs, max_workers=2, rate_limit=0, status_file=str(tmp_path / 'status.json'))
+        scheduler.apis['wb'] = make_client(mock, max_workers=2, limiter=scheduler.limiter,
+                                           metrics=scheduler.metrics)
+        status = scheduler.run()
+
+    targets = status['job']['targets']
+    assert targets['wb/Bench/Category']['status'] == 'done'
+    assert targets['wb/Bench/Broken']['status'] == 'failed'
+    assert 'No space left' in targets['wb/Bench/Broken']['error']
+    assert status['job']['status'] == 'failed'
+    with open(str(tmp_path / 'status.json'), encoding='utf8') as f:
+        assert json.load(f) == status
+
+
+def run_jobs(workdir, make_client, output, months=6):
+    """Run one category job against mock with 3 pages in every window, returns requested (window, row) and status"""
+    jobs = [{'name': 'job', 'kind': 'category', 'targets': ['Bench/Category'], 'start_date': '2023-01-01',
+             'end_date': '2023-%02d-28' % months, 'output': output, 'save_directory': str(workdir / 'data')}]
+    requests = []
+    with MockMpstats(total=1500, graph_points=1) as mock:
+        scheduler = JobScheduler(jobs, max_workers=2, rate_limit=0, status_file=str(workdir / 'status.json'))
+        api = make_client(mock, max_workers=2, limiter=scheduler.limiter, metrics=scheduler.metrics)
+        api.page_size = 500
+        page_request = api._page_request
+
+        def recording_request(kind, d1, d2, path, startRow, endRow, band=None):
+            requests.append((d1, startRow))
+            return page_request(kind, d1, d2, path, startRow, endRow, band)
+
+        api._page_request = recording_request
+        scheduler.apis['wb'] = api
+        status = scheduler.run()
+    return requests, status
+
+
+def max_open_windows(requests):
+    """Largest number of windows which are started and not completely requested (3 pages each)"""
+    counts = {}
+    largest = 0
+    for d1, startRow in requests:
+        counts[d1] = counts.get(d1, 0) + 1
+        largest = max(largest, sum(1 for count in counts.values() if count < 3))
+    return largest
+
+
+def test_pages_of_started_windows_go_before_new_windows(workdir, make_client):
+    requests, status = run_jobs(workdir, make_client, 'parquet')
+    assert status['job']['targets']['wb/Bench/Category']['status'] == 'done'
+    assert len(requests) == 6 * 3
+    # recent windows first for parquet, second pages come before first pages of all other windows
+    assert requests[0] == ('2023-06-01', 0)
+    assert max_open_windows(requests) <= 2
+
+
+def test_ordered_sink_windows_start_in_date_order(workdir, make_client):
+    requests, status = run_jobs(workdir, make_client, 'csv')
+    assert status['job']['targets']['wb/Bench/Category']['rows'] == 6 * 1500
+    first_pages = [d1 for d1, startRow in requests if startRow == 0]
+    assert first_pages == sorted(first_pages)
+    assert max_open_windows(requests) <= 2
+
+
+def test_tune_to_quota_limits_budget(workdir, make_client):
+    jobs = [{'name': 'job', 'kind': 'category', 'targets': ['Bench/Category'], 'start_date': '2023-01-01',
+             'end_date': '2023-01-31', 'output': 'csv', 'save_directory': str(workdir / 'data')}]
+    with MockMpstats(total=1500, graph_points=1) as mock:
+        scheduler = JobScheduler(jobs, max_workers=2, rate_limit=0, budget=10 ** 6,
+                                 status_file=str(workdir / 'status.json'), tune_to_quota=True)
+        scheduler.apis['wb'] = make_client(mock, max_workers=2, limiter=scheduler.limiter,
+                                           metrics=scheduler.metrics)
+        status = scheduler.run()
+    assert status['job']['status'] == 'done'
+    # remaining quota of the mock after the limit request, minus one page request of the window
+    assert scheduler.limiter.budget == 100000 - 1 - 1
@@ -0,0 +1,38 @@
+import pandas as pd
+import pytest
+
+from schema import compact_frame, concat_frames
+
+
+def _page(start, stop, revenue):
+    rows = range(start, stop)
+    return pd.DataFrame({'id': list(rows), 'revenue': [revenue] * len(rows), 'brand': ['Brand'] * len(rows),
+                         'rating': [4.5] * len(rows), 'graph': [[1, 2]] * len(rows)})
+
+
+def test_compact_pages_have_same_numeric_types():
+    small = compact_frame(_page(0, 10, 100))
+    large = compact_frame(_page(10, 20, 100000))
+    assert 'graph' not in small.columns
+    assert small['brand'].dtype == 'category'
+    for col in ('id', 'revenue', 'rating'):
+        assert small[col].dtype == large[col].dtype
+
+
+def test_concat_frames_downcasts_once():
+    frame = concat_frames([compact_frame(_page(0, 10, 100)), compact_frame(_page(10, 20, 100000))], downcast=True)
+    assert frame['revenue'].dtype == 'int32'
+    assert frame['rating'].dtype == 'float32'
+    assert frame['revenue'].max() == 100000
+
+
+def test_compact_pages_read_back_from_parquet(tmp_path):
+    pytest.importorskip('pyarrow')
+    from sinks import ParquetSink
+    sink = ParquetSink(str(tmp_path / 'data'))
+    sink.write(compact_frame(_page(0, 10, 100)), ('2023-01-01', '2023-01-31'), 0)
+    sink.write(compact_frame(_page(10, 20, 100000)), ('2023-01-01', '2023-01-31'), 5000)
+    sink.close()
+    frame = pd.read_parquet(str(tmp_path / 'data'))
+    assert frame.shape[0] == 20
+    assert frame['revenue'].max() == 100000
@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+
+import pytest
+
+from API_Mpstats import LoadCancelled
+from mock_server import MockMpstats
+from single_flight import SingleFlight
+
+
+def run_together(flight, key, function, callers=5, retry_on=()):
+    """Start the leader, then other callers of the same key while the leader is running"""
+    started = threading.Event()
+    release = threading.Event()
+    results = [None] * callers
+
+    def blocking():
+        started.set()
+        release.wait(5)
+        return function()
+
+    def call(number, target):
+        try:
+            results[number] = flight.do(key, target, retry_on=retry_on)
+        except BaseException as e:
+            results[number] = e
+
+    threads = [threading.Thread(target=call, args=(0, blocking))]
+    threads[0].start()
+    started.wait(5)
+    for number in range(1, callers):
+        threads.append(threading.Thread(target=call, args=(number, function)))
+        threads[-1].start()
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def test_followers_share_result_of_leader():
+    flight = SingleFlight()
+    calls = []
+    results = run_together(flight, 'page', lambda: calls.append(1) or {'data': [1]})
+    assert len(calls) == 1
+    assert results[0] == ({'data': [1]}, False)
+    assert results[1:] == [({'data': [1]}, True)] * 4
+    assert flight.stats() == {'executed': 1, 'shared': 4, 'in_flight': 0}
+
+
+def test_leader_error_is_raised_by_followers_and_not_kept():
+    flight = SingleFlight()
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise ValueError('bad response')
+
+    results = run_together(flight, 'page', failing)
+    assert len(calls) == 1
+    assert all(isinstance(result, ValueError) for result in results)
+    # next call executes the request again
+    assert flight.do('page', lambda: 'ok') == ('ok', False)
+
+
+def test_followers_retry_after_cancelled_leader():
+    flight = SingleFlight()
+    calls = []
+
+    def load():
+        calls.append(1)
+        if len(calls) == 1:
+            raise LoadCancelled('Loading is cancelled')
+        time.sleep(0.2)
+        return 'page'
+
+    results = run_together(flight, 'page', load, retry_on=(LoadCancelled,))
+    assert isinstance(results[0], LoadCancelled)
+    # one follower becomes the next leader, the others share its result
+    assert len(calls) == 2
+    assert sorted(shared for result, shared in results[1:]) == [False, True, True, True]
+    assert all(result == 'page' for result, shared in results[1:])
+
+
+def test_stale_lock_file_is_removed(tmp_path):
+    flight = SingleFlight(lock_directory=str(tmp_path), stale=60, poll=0.01)
+    lock_file = flight._acquire_file('page')
+    # lock file of a crashed process
+    os.utime(lock_file, (time.time() - 120, time.time() - 120))
+    start = time.perf_counter()
+    assert flight.do('page', lambda: 'loaded') == ('loaded', False)
+    assert time.perf_counter() - start < 1
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_lock_file_of_other_process_is_waited_for(tmp_path):
+    first = SingleFlight(lock_directory=str(tmp_path), poll=0.01)
+    second = SingleFlight(lock_directory=str(tmp_path), poll=0.01)
+    running = []
+    overlaps = []
+
+    def load():
+        running.append(1)
+        overlaps.append(len(running))
+        time.sleep(0.1)
+        running.pop()
+        return 'page'
+
+    threads = [threading.Thread(target=flight.do, args=('page', load)) for flight in (first, second)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    # instances of two processes don't share results, but execute the request one at a time
+    assert overlaps == [1, 1]
+    assert os.listdir(str(tmp_path)) == []
+
+
+@pytest.mark.parametrize('token, requests', [('test-token', 1), ('other-token', 2)])
+def test_clients_share_pages_only_with_same_token(make_client, token, requests):
+    flight = SingleFlight()
+    with MockMpstats(total=100, latency=0.2, graph_points=1) as server:
+        clients = [make_client(server, single_flight=flight) for _ in range(2)]
+        clients[1].headers = dict(clients[1].headers, **{'X-Mpstats-TOKEN': token})
+        results = [None, None]
+
+        def load(number):
+            results[number] = clients[number]._page_request('category', '2023-01-01', '2023-01-31',
+                                                            'Bench/Category', 0, 100)
+
+        threads = [threading.Thread(target=load, args=(number,)) for number in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+    assert results[0][1] == results[1][1] == 100
+    assert server.counts['category'] == requests
@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+from sinks import ParquetSink, ShardedCsvSink
+
+pytest.importorskip('pyarrow')
+
+
+def test_parquet_pages_with_empty_columns_read_back(tmp_path):
+    sink = ParquetSink(str(tmp_path / 'data'))
+    window = ('2023-01-01', '2023-01-31')
+    # short page where optional field is empty, then full pages with floats and with missing values
+    sink.write(pd.DataFrame({'id': [1, 2], 'rating': [None, None]}), window, 0)
+    sink.write(pd.DataFrame({'id': [3, 4], 'rating': [4.5, 4.9]}), window, 5000)
+    sink.write(pd.DataFrame({'id': [5, 6], 'rating': [3.0, None], 'extra': ['a', 'b']}),
+               ('2023-02-01', '2023-02-28'), 0)
+    sink.close()
+
+    frame = pd.read_parquet(str(tmp_path / 'data'))
+    assert sorted(frame['id']) == [1, 2, 3, 4, 5, 6]
+    assert pd.api.types.is_float_dtype(frame['rating'])
+    assert frame['rating'].notna().sum() == 3
+    assert frame['extra'].notna().sum() == 2
+
+
+def test_parquet_integer_pages_promoted_to_float(tmp_path):
+    sink = ParquetSink(str(tmp_path / 'data'))
+    window = ('2023-01-01', '2023-01-31')
+    sink.write(pd.DataFrame({'id': [1], 'sales': [10]}), window, 0)
+    sink.write(pd.DataFrame({'id': [2], 'sales': [None]}), window, 5000)
+    sink.close()
+
+    frame = pd.read_parquet(str(tmp_path / 'data')).sort_values('id')
+    assert frame['sales'].tolist()[0] == 10
+    assert pd.isna(frame['sales'].tolist()[1])
+
+
+def test_sharded_csv_removes_stale_shards(tmp_path):
+    save_path = str(tmp_path / 'result')
+    frame = pd.DataFrame({'id': range(25), 'name': ['item'] * 25})
+    sink = ShardedCsvSink(save_path, max_rows=5)
+    sink.write(frame, ('2023-01-01', '2023-01-31'))
+    sink.close()
+    assert sorted(path.name for path in tmp_path.glob('result_*.csv')) == ['result_%d.csv' % n for n in range(1, 6)]
+
+    sink = ShardedCsvSink(save_path, max_rows=10)
+    sink.write(frame.iloc[:12], ('2023-01-01', '2023-01-31'))
+    sink.close()
+    assert sorted(path.name for path in tmp_path.glob('result_*.csv')) == ['result_1.csv', 'result_2.csv']
+    shards = [pd.read_csv(tmp_path / name, sep=';', encoding='utf-8-sig') for name in ('result_1.csv', 'result_2.csv')]
+    assert pd.concat(shards)['id'].tolist() == list(range(12))
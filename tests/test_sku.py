@@ -0,0 +1,88 @@
+import gc
+import weakref
+
+import pandas as pd
+import pytest
+
+from manifest import Manifest
+
+def test_sku_sales_frames_are_released_after_yield(api):
+    frames = []
+    items = []
+    alive = []
+    for sku, frame in api._iter_sku_sales(list(range(1, 101)), '2023-01-01', '2023-01-10'):
+        items.append(sku)
+        frames.append(weakref.ref(frame))
+        del frame
+        gc.collect()
+        alive.append(sum(ref() is not None for ref in frames))
+    assert sorted(items) == list(range(1, 101))
+    # frames of consumed items are not kept by the generator while loading goes on
+    assert max(alive) <= 1
+
+
+def test_load_by_sku_returns_info_and_sales_with_db_connect(api, tmp_path):
+    info, sales = api.load_by_SKU(str(tmp_path), '2023-01-01', '2023-01-10', '12345', load_info=True,
+                                  load_sales=True, db_connect=True)
+    assert [str(sku) for sku in info['id']] == ['12345']
+    assert [str(sku) for sku in sales['sku'].unique()] == ['12345']
+    assert sales.shape[0] == 10
+
+    info, sales = api.load_by_SKU(str(tmp_path), '2023-01-01', '2023-01-10', '12345', load_sales=True,
+                                  db_connect=True)
+    assert info is None
+    assert sales.shape[0] == 10
+
+
+def test_plan_batches_keeps_order_and_removes_duplicates(api):
+    batches = api._plan_batches([3, 1, 3, 2] + list(range(10, 410)))
+    assert [len(batch) for batch in batches] == [200, 200, 3]
+    assert batches[0][:3] == [3, 1, 2]
+    assert sum(batches, []) == list(dict.fromkeys([3, 1, 3, 2] + list(range(10, 410))))
+
+
+def test_load_sku_info_requests_every_sku_once(api, mock):
+    api.info_batch_size = 200
+    sku_list = list(range(1, 1051)) + list(range(1, 101))
+    frame = api.load_sku_info(sku_list)
+    sent = [sku for batch in mock.item_batches for sku in batch]
+    assert sorted(sent) == list(range(1, 1051))
+    assert max(len(batch) for batch in mock.item_batches) <= 200
+    assert sorted(frame['id']) == list(range(1, 1051))
+
+
+def test_resumed_csv_sales_have_no_duplicates_after_crash(api, tmp_path, monkeypatch):
+    save_path = str(tmp_path / 'sales')
+    manifest = Manifest(save_path + '_manifest.json')
+    add_many = manifest.add_many
+    calls = []
+
+    def crashing_add_many(target, units, offset=None):
+        calls.append(units)
+        if len(calls) == 2:
+            # process dies after the second batch is written, before the manifest is saved
+            raise KeyboardInterrupt
+        add_many(target, units, offset)
+
+    monkeypatch.setattr(manifest, 'add_many', crashing_add_many)
+    with pytest.raises(KeyboardInterrupt):
+        api.load_sales(list(range(1, 31)), '2023-01-01', '2023-01-05', save_path, output='csv', batch_size=10,
+                       manifest=manifest)
+    api.load_sales(list(range(1, 31)), '2023-01-01', '2023-01-05', save_path, output='csv', batch_size=10,
+                   manifest=Manifest(save_path + '_manifest.json'))
+    frame = pd.read_csv(save_path + '.csv', sep=';', encoding='utf-8-sig')
+    assert frame.shape[0] == 30 * 5
+    assert sorted(frame['sku'].unique()) == list(range(1, 31))
+    assert not frame.duplicated(['sku', 'data']).any()
+
+
+def test_sales_are_saved_in_sales_subdirectory(api, tmp_path):
+    save_directory = str(tmp_path / 'out')
+    api.load_by_SKU(save_directory, '2023-01-01', '2023-01-10', '12345', load_sales=True, output='csv')
+    assert (tmp_path / 'out' / 'sales' / 'sales 2023-01-01-2023-01-10.csv').is_file()
+    assert sorted(path.name for path in tmp_path.iterdir() if path.name.startswith('out')) == ['out']
+
+
+def test_token_is_not_printed(mock, make_client, capsys):
+    make_client(mock)
+    assert 'test-token' not in capsys.readouterr().out